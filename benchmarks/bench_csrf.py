@@ -0,0 +1,53 @@
+"""
+Compare CSRF token extraction from the imgbox.com landing page
+
+    $ python benchmarks/bench_csrf.py [NUMBER]
+"""
+
+import os
+import sys
+import timeit
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_PATH)
+
+from pyimgbox import _html  # noqa: E402  isort:skip
+
+# Roughly the shape of https://imgbox.com/
+HEAD = (
+    '<!DOCTYPE html>\n<html lang="en">\n<head>\n'
+    '<meta charset="utf-8">\n'
+    '<title>imgbox - fast, simple image host</title>\n'
+    + ''.join(f'<meta name="meta{i}" content="{"x" * 40}">\n' for i in range(20))
+    + '<meta name="csrf-param" content="authenticity_token" />\n'
+    '<meta name="csrf-token" content="4xBpS6Tq3bJ6m1u2Xk1fQz9yL0vD7aR8sW5eN2cH4gK=" />\n'
+    + ''.join(f'<link rel="stylesheet" href="/assets/{i}.css">\n' for i in range(10))
+    + ''.join(f'<script src="/assets/{i}.js"></script>\n' for i in range(10))
+    + '</head>\n'
+)
+BODY = (
+    '<body>\n'
+    + ''.join(f'<div class="row"><a href="/{i}">Link {i}</a><p>{"Lorem ipsum " * 10}</p></div>\n'
+              for i in range(300))
+    + '</body>\n</html>\n'
+)
+PAGE = HEAD + BODY
+
+
+def main(number):
+    assert _html._find_csrf_token_bs4(PAGE) == _html.find_csrf_token(HEAD)
+    results = (
+        ('BeautifulSoup, full page', lambda: _html._find_csrf_token_bs4(PAGE)),
+        ('BeautifulSoup, head only', lambda: _html._find_csrf_token_bs4(HEAD)),
+        ('find_csrf_token, head only', lambda: _html.find_csrf_token(HEAD)),
+    )
+    print(f'Page size: {len(PAGE)} characters, head: {len(HEAD)} characters')
+    baseline = None
+    for name, func in results:
+        seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+        baseline = baseline or seconds
+        print(f'{name:>28}: {seconds * 1e6:10.1f} µs  ({baseline / seconds:6.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
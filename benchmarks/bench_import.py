@@ -0,0 +1,66 @@
+"""
+Measure how long "import pyimgbox" takes with `python -X importtime`
+
+    $ python benchmarks/bench_import.py [--budget MILLISECONDS] [--repeat N]
+
+Exit with status 1 if the fastest import takes longer than the budget.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+_IMPORTTIME_REGEX = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$')
+
+
+def measure(statement='import pyimgbox'):
+    """
+    Return cumulative import time of `statement` in microseconds and a list of
+    (cumulative microseconds, module name) tuples of modules imported by it
+    """
+    env = dict(os.environ)
+    project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (project_path, env.get('PYTHONPATH')) if p)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    modules = []
+    total = 0
+    in_pyimgbox = False
+    for line in reversed(proc.stderr.splitlines()):
+        match = _IMPORTTIME_REGEX.search(line)
+        if match:
+            cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+            if name == 'pyimgbox' and indent == 1:
+                total = cumulative
+                in_pyimgbox = True
+            elif in_pyimgbox and indent > 1:
+                modules.append((cumulative, name))
+            else:
+                in_pyimgbox = False
+    return total, modules
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--budget', type=float, default=50, help='Milliseconds')
+    argparser.add_argument('--repeat', type=int, default=5)
+    args = argparser.parse_args()
+
+    results = [measure() for _ in range(args.repeat)]
+    total, modules = min(results)
+    for cumulative, name in sorted(modules, reverse=True)[:10]:
+        print(f'{cumulative / 1000:8.2f} ms  {name}')
+    print(f'{total / 1000:8.2f} ms  pyimgbox (budget: {args.budget:.2f} ms)')
+    if total / 1000 > args.budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
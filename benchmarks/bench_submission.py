@@ -0,0 +1,98 @@
+"""
+Compare memory usage and construction time of Submission objects with the
+previous implementation, which didn't intern gallery URLs and had an instance
+__dict__
+
+    $ python benchmarks/bench_submission.py [NUMBER]
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_PATH)
+
+from pyimgbox import Submission  # noqa: E402  isort:skip
+
+
+class DictSubmission(dict):
+    # Submission before gallery URLs were interned
+    def __init__(self, **kwargs):
+        values = {
+            'success': None,
+            'error': None,
+            'filepath': None,
+            'filename': None,
+            'image_url': None,
+            'thumbnail_url': None,
+            'web_url': None,
+            'gallery_url': None,
+            'edit_url': None,
+            'cached': False,
+        }
+        for k in kwargs:
+            assert k in values, f'Unknown key: {k!r}'
+
+        if not kwargs.get('error'):
+            for k in ('filepath', 'image_url', 'thumbnail_url',
+                      'web_url', 'gallery_url', 'edit_url'):
+                assert k in kwargs, f'Missing key: {k!r}'
+
+        values.update(kwargs)
+
+        if values.get('filepath'):
+            values['filename'] = os.path.basename(values['filepath'])
+        values['success'] = not bool(values.get('error'))
+
+        super().__init__(values)
+
+
+def make_submissions(cls, number):
+    # Like Gallery._upload_images(), which formats the gallery URLs for every
+    # request
+    return [
+        cls(
+            filepath=f'path/to/images/{i:06d}.jpg',
+            image_url=f'https://images2.imgbox.com/ab/cd/{i:08x}_o.jpg',
+            thumbnail_url=f'https://thumbs2.imgbox.com/ab/cd/{i:08x}_t.jpg',
+            web_url=f'https://imgbox.com/{i:08x}',
+            gallery_url='https://imgbox.com/g/{}'.format('aBcDeFgHiJ'),
+            edit_url='https://imgbox.com/upload/edit/{}/{}'.format('123456789', 'aBcDeFgHiJkLmNoP'),
+        )
+        for i in range(number)
+    ]
+
+
+def measure_memory(cls, number):
+    # Return bytes allocated by `number` instances of `cls` (including
+    # strings)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        submissions = make_submissions(cls, number)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del submissions
+    return after - before
+
+
+def main(number):
+    assert make_submissions(Submission, 1)[0] == make_submissions(DictSubmission, 1)[0]
+    print(f'{number} submissions:')
+    baseline_memory = baseline_seconds = None
+    for name, cls in (('old', DictSubmission), ('new', Submission)):
+        memory = measure_memory(cls, number)
+        seconds = min(timeit.repeat(lambda: make_submissions(cls, number), number=1, repeat=5))
+        baseline_memory = baseline_memory or memory
+        baseline_seconds = baseline_seconds or seconds
+        print(f'{name:>6}: {memory / 1048576:8.1f} MiB ({memory / number:6.0f} bytes each, '
+              f'{baseline_memory / memory:4.1f}x)  '
+              f'{seconds * 1e3:8.1f} ms ({seconds / number * 1e6:5.2f} µs each, '
+              f'{baseline_seconds / seconds:4.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,182 @@
+"""
+Measure upload throughput of Gallery.add() against a local mock server
+
+    $ python benchmarks/bench_upload.py [--files N] [--size KIB] [--concurrency N,N,...,auto]
+                                        [--batch-size N] [--latency SECONDS]
+                                        [--bandwidth BYTES] [--error-rate FRACTION]
+                                        [--retries N]
+
+The mock server (benchmarks/mockserver.py) runs in a separate process so it
+doesn't compete with the client for the GIL. Nothing is sent to imgbox.com.
+
+For each concurrency ("auto" uses an Autotuner), files per second, megabytes
+per second, median and 99th percentile upload latency, peak RSS and the
+maximum number of open file descriptors are reported.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+PROJECT_PATH = os.path.dirname(BENCHMARKS_PATH)
+sys.path[:0] = [PROJECT_PATH, BENCHMARKS_PATH]
+
+import mockserver  # noqa: E402  isort:skip
+import pyimgbox  # noqa: E402  isort:skip
+
+
+def make_jpeg(size, width=1920, height=1080):
+    """Return `size` bytes that look like a JPEG image"""
+    header = (
+        b'\xff\xd8'  # Start of image
+        + b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, height, width, 3)
+        + b'\x01\x22\x00\x02\x11\x01\x03\x11\x01'  # Baseline frame
+    )
+    footer = b'\xff\xd9'  # End of image
+    # Fill with comment segments (maximum segment length is 65535)
+    padding = b''
+    remaining = size - len(header) - len(footer)
+    while remaining > 4:
+        length = min(65535, remaining - 2)
+        padding += b'\xff\xfe' + struct.pack('>H', length) + os.urandom(length - 2)
+        remaining -= length + 2
+    return header + padding + b'\x00' * remaining + footer
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def count_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+class LatencyObserver(pyimgbox.Observer):
+    def __init__(self):
+        self.uploads = []
+
+    def operation(self, operation):
+        if operation.name == 'upload':
+            self.uploads.append(operation.duration)
+
+
+async def run(url, filepaths, concurrency, batch_size, retries):
+    observer = LatencyObserver()
+    max_fds = count_fds()
+
+    async def sample_fds():
+        nonlocal max_fds
+        while True:
+            await asyncio.sleep(0.01)
+            fds = count_fds()
+            if fds is not None:
+                max_fds = max(max_fds, fds)
+
+    sampler = asyncio.ensure_future(sample_fds())
+    session = pyimgbox.Session(
+        transport=mockserver.RedirectTransport(url),
+        retry=pyimgbox.RetryPolicy(max_attempts=retries + 1, backoff=0.05),
+        observer=observer,
+    )
+    errors = 0
+    start = time.monotonic()
+    try:
+        async with session:
+            autotune = pyimgbox.Autotuner() if concurrency == 'auto' else None
+            async with pyimgbox.Gallery(session=session, autotune=autotune) as gallery:
+                async for submission in gallery.add(filepaths, concurrency=None if autotune else concurrency,
+                                                    batch_size=batch_size):
+                    if not submission['success']:
+                        errors += 1
+    finally:
+        elapsed = time.monotonic() - start
+        sampler.cancel()
+    return {
+        'concurrency': f'auto:{autotune.concurrency}' if autotune else concurrency,
+        'elapsed': elapsed,
+        'errors': errors,
+        'latencies': observer.uploads,
+        'max_fds': max_fds,
+    }
+
+
+def start_server(args):
+    proc = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BENCHMARKS_PATH, 'mockserver.py'),
+            '--latency', str(args.latency),
+            '--error-rate', str(args.error_rate),
+            *(('--bandwidth', str(args.bandwidth)) if args.bandwidth else ()),
+        ],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    url = proc.stdout.readline().strip()
+    return proc, url
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--files', type=int, default=200)
+    argparser.add_argument('--size', type=int, default=512, help='KiB per file')
+    argparser.add_argument('--concurrency', default='1,4,16,auto',
+                           help='Comma-separated numbers or "auto" to use an Autotuner')
+    argparser.add_argument('--batch-size', type=int, default=1)
+    argparser.add_argument('--latency', type=float, default=0.02, help='Seconds')
+    argparser.add_argument('--bandwidth', type=float, default=None, help='Bytes per second per connection')
+    argparser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests')
+    argparser.add_argument('--retries', type=int, default=0)
+    args = argparser.parse_args()
+
+    proc, url = start_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepaths = []
+            for i in range(args.files):
+                filepath = os.path.join(tmpdir, f'{i}.jpg')
+                with open(filepath, 'wb') as f:
+                    f.write(make_jpeg(args.size * 1024))
+                filepaths.append(filepath)
+            total_bytes = sum(os.path.getsize(fp) for fp in filepaths)
+
+            print(f'{args.files} files, {total_bytes / 1e6:.1f} MB, server: {url}')
+            print(f'{"concurrency":>11}  {"files/s":>8}  {"MB/s":>8}  {"p50 ms":>8}  '
+                  f'{"p99 ms":>8}  {"errors":>6}  {"RSS MiB":>8}  {"FDs":>5}')
+            for concurrency in (c if c == 'auto' else int(c) for c in args.concurrency.split(',')):
+                result = asyncio.run(run(url, filepaths, concurrency, args.batch_size, args.retries))
+                elapsed = result['elapsed']
+                latencies = result['latencies']
+                # ru_maxrss is KiB on Linux and bytes on macOS
+                rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                rss_mib = rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+                print(
+                    f'{result["concurrency"]:>11}  '
+                    f'{args.files / elapsed:>8.1f}  '
+                    f'{total_bytes / 1e6 / elapsed:>8.1f}  '
+                    f'{percentile(latencies, 50) * 1000:>8.1f}  '
+                    f'{percentile(latencies, 99) * 1000:>8.1f}  '
+                    f'{result["errors"]:>6}  '
+                    f'{rss_mib:>8.1f}  '
+                    f'{result["max_fds"] if result["max_fds"] is not None else "?":>5}'
+                )
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    main()
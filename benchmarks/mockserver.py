@@ -0,0 +1,256 @@
+"""
+Local stand-in for imgbox.com
+
+    $ python benchmarks/mockserver.py [--port PORT] [--latency SECONDS]
+                                      [--bandwidth BYTES] [--error-rate FRACTION]
+
+Implements "/", "/ajax/token/generate" and "/upload/process" with HTTP/1.1
+keep-alive. Use RedirectTransport to send requests for imgbox.com to it:
+
+>>> transport = RedirectTransport('http://127.0.0.1:1234')
+>>> async with pyimgbox.Session(transport=transport) as session:
+>>>     async with pyimgbox.Gallery(session=session) as gallery:
+>>>         ...
+
+Only the standard library is needed to run the server.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+
+CSRF_TOKEN = 'mock-csrf-token'
+CSRF_TOKEN_HEADER = b'x-csrf-token'
+
+_FILENAME_MARKER = b'; filename="'
+_CHUNK_SIZE = 65536
+
+
+class MockServer:
+    """
+    Local HTTP server that behaves like imgbox.com
+
+    latency: Seconds to wait after receiving a request before responding
+    bandwidth: Maximum number of request body bytes read per second per
+               connection or None
+    error_rate: Fraction of requests (0 to 1) that get an `error_status`
+                response
+    error_status: HTTP status code of injected errors
+    """
+
+    def __init__(self, latency=0, bandwidth=None, error_rate=0, error_status=503):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.files = 0
+        self.bytes_received = 0
+        self._server = None
+        self._gallery_count = 0
+
+    @property
+    def url(self):
+        """URL of the server, e.g. "http://127.0.0.1:1234" """
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Listen on `host` and `port` (0 picks a free port)"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+
+    async def close(self):
+        """Stop listening and close connections"""
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.partition(b':')
+                    headers[name.strip().lower()] = value.strip()
+
+                files = await self._read_body(reader, int(headers.get(b'content-length', 0)))
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status, response_headers, body = self._respond(method, path, headers, files)
+                keep_alive = headers.get(b'connection', b'').lower() != b'close'
+                self._write_response(writer, status, response_headers, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            # Client closed the connection, e.g. because it cancelled an
+            # upload
+            pass
+        finally:
+            writer.close()
+
+    async def _read_body(self, reader, length):
+        # Read request body and return the number of uploaded files in it
+        files = 0
+        tail = b''
+        remaining = length
+        while remaining > 0:
+            chunk = await reader.readexactly(min(_CHUNK_SIZE, remaining))
+            remaining -= len(chunk)
+            self.bytes_received += len(chunk)
+            # Find markers that are split between two chunks; `tail` is too
+            # short to contain a whole marker, so nothing is counted twice
+            data = tail + chunk
+            files += data.count(_FILENAME_MARKER)
+            tail = data[-(len(_FILENAME_MARKER) - 1):]
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+        return files
+
+    def _respond(self, method, path, headers, files):
+        # Return status, headers and body
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return self.error_status, {}, b'Injected error'
+
+        if method == 'GET' and path == '/':
+            return 200, {'Set-Cookie': 'session=mock-session; Path=/'}, (
+                '<!DOCTYPE html><html><head>'
+                '<title>imgbox</title>'
+                f'<meta content="{CSRF_TOKEN}" name="csrf-token" />'
+                '</head><body>' + 'x' * 10000 + '</body></html>'
+            ).encode('utf-8')
+
+        elif path.startswith('/ajax/token/generate') or path.startswith('/upload/process'):
+            if method != 'POST':
+                return 405, {}, b'Method not allowed'
+            elif headers.get(CSRF_TOKEN_HEADER) != CSRF_TOKEN.encode('ascii'):
+                return 403, {}, b'Invalid CSRF token'
+            elif path.startswith('/ajax/token/generate'):
+                self._gallery_count += 1
+                return self._json({
+                    'token_id': self._gallery_count,
+                    'token_secret': os.urandom(8).hex(),
+                    'gallery_id': f'gallery{self._gallery_count}',
+                    'gallery_secret': os.urandom(8).hex(),
+                })
+            else:
+                if files < 1:
+                    return 400, {}, b'No files'
+                self.files += files
+                return self._json({'files': [
+                    {
+                        'original_url': f'https://images.example.org/{self.files - i}.jpg',
+                        'thumbnail_url': f'https://thumbs.example.org/{self.files - i}.jpg',
+                        'url': f'https://imgbox.example.org/{self.files - i}',
+                    }
+                    for i in reversed(range(files))
+                ]})
+
+        return 404, {}, b'Not found'
+
+    def _json(self, obj):
+        return 200, {'Content-Type': 'application/json'}, json.dumps(obj).encode('utf-8')
+
+    def _write_response(self, writer, status, headers, body, keep_alive):
+        lines = [f'HTTP/1.1 {status} Mock']
+        headers = {
+            'Content-Type': 'text/html; charset=utf-8',
+            **headers,
+            'Content-Length': str(len(body)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+        }
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+
+class RedirectTransport:
+    """
+    httpx transport that sends all requests to `url`
+
+    Keyword arguments are passed to httpx.AsyncHTTPTransport.
+    """
+
+    def __init__(self, url, **kwargs):
+        import httpx
+        self._httpx = httpx
+        self._url = httpx.URL(url)
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        # Don't change the original request so cookies are stored for the
+        # original domain
+        redirected = self._httpx.Request(
+            method=request.method,
+            url=request.url.copy_with(
+                scheme=self._url.scheme,
+                host=self._url.host,
+                port=self._url.port,
+            ),
+            headers=request.headers,
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+        return await self._transport.handle_async_request(redirected)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+async def serve(port, **kwargs):
+    server = MockServer(**kwargs)
+    await server.start(port=port)
+    try:
+        print(server.url, flush=True)
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--port', type=int, default=0)
+    argparser.add_argument('--latency', type=float, default=0, help='Seconds')
+    argparser.add_argument('--bandwidth', type=float, default=None, help='Bytes per second')
+    argparser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests')
+    argparser.add_argument('--error-status', type=int, default=503)
+    args = argparser.parse_args()
+    try:
+        asyncio.run(serve(
+            port=args.port,
+            latency=args.latency,
+            bandwidth=args.bandwidth,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
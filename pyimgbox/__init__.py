@@ -2,6 +2,42 @@ __version__ = '1.0.5'
 __author__ = 'plotski'
 __author_email__ = 'plotski@example.org'
 
+from ._autotune import Autotuner  # noqa: F401
 from ._const import MAX_FILE_SIZE  # noqa: F401
-from ._gallery import Gallery  # noqa: F401
+from ._journal import Journal  # noqa: F401
+from ._observer import Observer, Operation, RequestTiming  # noqa: F401
+from ._progress import FileProgress, Progress  # noqa: F401
 from ._submission import Submission  # noqa: F401
+from ._tokencache import TokenCache  # noqa: F401
+
+# Network-related classes and DedupCache are imported on first access to keep
+# "import pyimgbox" fast (asyncio, httpx, sqlite3, etc take a while to import)
+_lazy_attributes = {
+    'BulkUploader': '._bulk',
+    'DedupCache': '._dedup',
+    'DrainResult': '._gallery',
+    'Gallery': '._gallery',
+    'ManifestEntry': '._bulk',
+    'RateLimiter': '._ratelimit',
+    'RetryPolicy': '._http',
+    'Session': '._http',
+    'ShardedGallery': '._shard',
+    'Shrinker': '._shrink',
+    'SyncGallery': '._sync',
+    'Timeouts': '._http',
+    'read_manifest': '._bulk',
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        import importlib
+        module = importlib.import_module(_lazy_attributes[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
@@ -0,0 +1,123 @@
+"""
+Upload images listed in a manifest and write one JSON object per image
+
+    $ python -m pyimgbox MANIFEST [--format jsonl|csv] [--output FILE]
+                                  [--concurrency N] [--title TITLE] [--adult]
+                                  [--thumb-width PIXELS] [--dedup FILE]
+                                  [--drain-timeout SECONDS]
+
+See pyimgbox.read_manifest() for the manifest format. Submissions are written
+as soon as each upload is finished, not in manifest order.
+
+On SIGTERM or SIGINT, no more uploads are started and in-flight uploads may
+finish for up to --drain-timeout seconds before they are cancelled. A second
+signal cancels them immediately.
+
+Exit with status 1 if any upload failed or if uploading was interrupted.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import signal
+import sys
+
+from . import _bulk, _dedup
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pyimgbox', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('manifest', help='Path to manifest file or "-" for stdin')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default=None,
+                        help='Manifest format (default: "csv" for *.csv files, "jsonl" otherwise)')
+    parser.add_argument('--output', '-o', default='-', help='Path to output file or "-" for stdout')
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help='Maximum number of simultaneous uploads')
+    parser.add_argument('--title', default=None, help='Default gallery title')
+    parser.add_argument('--adult', action='store_true', help='Images are for adults only by default')
+    parser.add_argument('--thumb-width', type=int, default=100, help='Default thumbnail width in pixels')
+    parser.add_argument('--dedup', default=None, help='Path to SQLite database of uploaded images')
+    parser.add_argument('--drain-timeout', type=float, default=10,
+                        help='Seconds in-flight uploads may take after SIGTERM or SIGINT before they are cancelled')
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = 'csv' if args.manifest.lower().endswith('.csv') else 'jsonl'
+    return args
+
+
+def _open(filepath, mode, stdio):
+    if filepath == '-':
+        return contextlib.nullcontext(stdio)
+    else:
+        return open(filepath, mode, newline='')
+
+
+async def run(args):
+    with _open(args.manifest, 'r', sys.stdin) as manifest:
+        with _open(args.output, 'w', sys.stdout) as output:
+            entries = _bulk.read_manifest(
+                manifest,
+                format=args.format,
+                title=args.title,
+                adult=args.adult,
+                thumb_width=args.thumb_width,
+            )
+            # Share one database connection between all galleries
+            dedup = _dedup.DedupCache(args.dedup) if args.dedup else None
+            try:
+                async with _bulk.BulkUploader(concurrency=args.concurrency, dedup=dedup) as uploader:
+                    async with _drain_on_signal(uploader, args.drain_timeout) as interrupted:
+                        succeeded, failed = await _bulk.write_jsonl(uploader.run(entries), output)
+                    return succeeded, failed, bool(interrupted)
+            finally:
+                if dedup is not None:
+                    dedup.close()
+
+
+@contextlib.asynccontextmanager
+async def _drain_on_signal(uploader, timeout):
+    # Drain `uploader` on the first SIGTERM or SIGINT and cancel its uploads on
+    # the second one; yield list of received signals
+    loop = asyncio.get_event_loop()
+    received = []
+    tasks = []
+
+    def handle(signum):
+        received.append(signum)
+        if len(received) == 1:
+            print(f'Received {signal.Signals(signum).name}, waiting up to {timeout:g} seconds '
+                  'for in-flight uploads', file=sys.stderr)
+            tasks.append(asyncio.ensure_future(uploader.drain(timeout)))
+        else:
+            print(f'Received {signal.Signals(signum).name}, cancelling in-flight uploads', file=sys.stderr)
+            tasks.append(asyncio.ensure_future(uploader.cancel()))
+
+    signums = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, handle, signum)
+        except (NotImplementedError, RuntimeError):
+            # Not supported on this platform or not in the main thread
+            continue
+        signums.append(signum)
+    try:
+        yield received
+    finally:
+        for signum in signums:
+            loop.remove_signal_handler(signum)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    try:
+        succeeded, failed, interrupted = asyncio.run(run(args))
+    except (OSError, ValueError) as e:
+        print(f'{e}', file=sys.stderr)
+        return 1
+    print(f'Uploaded {succeeded} images, {failed} failed', file=sys.stderr)
+    return 1 if failed or interrupted else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import time
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+
+class Autotuner:
+    """
+    Adjust the number of simultaneous uploads to maximize throughput
+
+    Pass an instance to Gallery to make add() ignore its `concurrency` and use
+    the `concurrency` of this object instead, which changes while images are
+    uploaded.
+
+    Uploads are measured in windows. A window ends when as many uploads have
+    finished as are currently allowed to run at the same time (but no fewer
+    than `min_samples`). At the end of each window, throughput (uploaded bytes
+    per second) is compared to the previous window:
+
+    - If too many uploads failed (more than `max_error_rate`) or if uploads
+      took longer than `max_latency` seconds on average, concurrency is
+      multiplied by `decrease` (multiplicative decrease).
+    - If throughput went up by at least `tolerance` (relative), concurrency is
+      changed by one more in the same direction as before.
+    - Otherwise the last change didn't help, and concurrency is changed by one
+      in the other direction.
+
+    This settles around the concurrency where adding more uploads doesn't
+    increase throughput anymore and backs off quickly if the server
+    struggles.
+
+    initial: Concurrency before anything is measured
+    minimum, maximum: Limits for concurrency
+    min_samples: Minimum number of uploads per window
+    max_error_rate: Highest fraction of failed uploads in a window that is
+                    not considered a problem
+    max_latency: Number of seconds after which an upload is considered slow
+                 or None
+    decrease: Factor concurrency is multiplied with if uploads fail or are
+              slow
+    tolerance: Relative throughput change that is considered noise
+    """
+
+    def __init__(self, initial=2, minimum=1, maximum=32, min_samples=2,
+                 max_error_rate=0.0, max_latency=None, decrease=0.5, tolerance=0.05):
+        if not isinstance(minimum, int) or minimum < 1:
+            raise ValueError(f'Invalid minimum: {minimum!r}')
+        if not isinstance(maximum, int) or maximum < minimum:
+            raise ValueError(f'Invalid maximum: {maximum!r}')
+        if not isinstance(initial, int) or not minimum <= initial <= maximum:
+            raise ValueError(f'Invalid initial: {initial!r}')
+        if not isinstance(min_samples, int) or min_samples < 1:
+            raise ValueError(f'Invalid min_samples: {min_samples!r}')
+        if not 0 <= max_error_rate < 1:
+            raise ValueError(f'Invalid max_error_rate: {max_error_rate!r}')
+        if not 0 < decrease < 1:
+            raise ValueError(f'Invalid decrease: {decrease!r}')
+        if not tolerance >= 0:
+            raise ValueError(f'Invalid tolerance: {tolerance!r}')
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self._concurrency = initial
+        self._direction = 1
+        self._throughput = None
+        self._previous_throughput = None
+        self._start_window()
+
+    @property
+    def concurrency(self):
+        """Current number of simultaneous uploads"""
+        return self._concurrency
+
+    @property
+    def throughput(self):
+        """Bytes per second in the last complete window or None"""
+        return self._throughput
+
+    def report(self, duration, bytes_sent, error=None):
+        """
+        Measure finished upload
+
+        duration: Number of seconds the upload took
+        bytes_sent: Number of bytes that were uploaded
+        error: ConnectionError or None if the upload succeeded
+        """
+        self._samples += 1
+        self._bytes += bytes_sent
+        self._duration += duration
+        if error is not None:
+            self._errors += 1
+        if self._samples >= max(self.min_samples, self._concurrency):
+            self._end_window()
+
+    def _start_window(self):
+        self._window_start = time.monotonic()
+        self._samples = 0
+        self._errors = 0
+        self._bytes = 0
+        self._duration = 0.0
+
+    def _end_window(self):
+        elapsed = time.monotonic() - self._window_start
+        throughput = self._bytes / elapsed if elapsed > 0 else 0.0
+        error_rate = self._errors / self._samples
+        latency = self._duration / self._samples
+        self._throughput = throughput
+
+        if error_rate > self.max_error_rate:
+            self._back_off(f'{error_rate * 100:.0f} % of uploads failed')
+        elif self.max_latency is not None and latency > self.max_latency:
+            self._back_off(f'Uploads took {latency:.3f} seconds')
+        else:
+            previous = self._previous_throughput
+            if previous is not None and throughput < previous * (1 + self.tolerance):
+                # Last step didn't help; go back
+                self._direction = -self._direction
+            self._step(self._concurrency + self._direction,
+                       f'{throughput / 1048576:.2f} MiB/s (before: '
+                       f'{(previous or 0) / 1048576:.2f} MiB/s)')
+            self._previous_throughput = throughput
+        self._start_window()
+
+    def _back_off(self, reason):
+        # Start climbing again from the new concurrency
+        self._direction = 1
+        self._previous_throughput = None
+        self._step(int(self._concurrency * self.decrease), reason)
+
+    def _step(self, concurrency, reason):
+        concurrency = min(self.maximum, max(self.minimum, concurrency))
+        if concurrency in (self.minimum, self.maximum):
+            # Don't keep pushing against a limit
+            self._direction = 1 if concurrency == self.minimum else -1
+        if concurrency != self._concurrency:
+            log.debug('Changing concurrency from %d to %d: %s', self._concurrency, concurrency, reason)
+            self._concurrency = concurrency
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'concurrency={self._concurrency!r}, '
+            f'minimum={self.minimum!r}, '
+            f'maximum={self.maximum!r})'
+        )
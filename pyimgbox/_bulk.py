@@ -0,0 +1,246 @@
+import asyncio
+import collections
+import csv
+import json
+
+from . import _http, _pool, _utils
+from ._gallery import DrainResult, Gallery
+from ._submission import Submission
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+ManifestEntry = collections.namedtuple('ManifestEntry', ('filepath', 'title', 'adult', 'thumb_width'))
+ManifestEntry.__doc__ = """
+One image from a manifest
+
+filepath: Path to image file
+title: Name of the gallery or None
+adult: Whether the gallery is for adults only
+thumb_width: Thumbnail width in pixels
+"""
+
+_TRUE_STRINGS = ('1', 'true', 'yes', 'y')
+_FALSE_STRINGS = ('0', 'false', 'no', 'n')
+
+
+def read_manifest(fileobj, format='jsonl', title=None, adult=False, thumb_width=100):
+    """
+    Read image files and gallery properties from manifest
+
+    fileobj: Text file object
+    format: "jsonl" for one JSON object per line or "csv" for comma-separated
+            values with a header line
+    title, adult, thumb_width: Default values for missing or empty fields
+
+    Each JSON object or CSV row must have a "path" field. The fields "title",
+    "adult" and "thumb_width" are optional.
+
+    Lines are read only when the next entry is requested.
+
+    Raise ValueError if `format` is unknown or if a line is invalid.
+
+    Yield ManifestEntry objects.
+    """
+    if format == 'jsonl':
+        records = _read_jsonl(fileobj)
+    elif format == 'csv':
+        records = _read_csv(fileobj)
+    else:
+        raise ValueError(f'Unknown manifest format: {format!r}')
+
+    defaults = {'title': title, 'adult': adult, 'thumb_width': thumb_width}
+    for line_number, record in records:
+        try:
+            yield _make_entry(record, defaults)
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f'Invalid manifest line {line_number}: {e}') from e
+
+
+def _read_jsonl(fileobj):
+    for line_number, line in enumerate(fileobj, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'Invalid manifest line {line_number}: {e}') from e
+
+def _read_csv(fileobj):
+    reader = csv.DictReader(fileobj)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _make_entry(record, defaults):
+    if not isinstance(record, dict):
+        raise TypeError(f'Not an object: {record!r}')
+    filepath = record['path']
+    if not filepath or not isinstance(filepath, str):
+        raise ValueError(f'Invalid path: {filepath!r}')
+
+    title = record.get('title')
+    if title in (None, ''):
+        title = defaults['title']
+
+    adult = record.get('adult')
+    if adult in (None, ''):
+        adult = defaults['adult']
+    elif isinstance(adult, str):
+        if adult.strip().lower() in _TRUE_STRINGS:
+            adult = True
+        elif adult.strip().lower() in _FALSE_STRINGS:
+            adult = False
+        else:
+            raise ValueError(f'Invalid adult: {adult!r}')
+    adult = bool(adult)
+
+    thumb_width = record.get('thumb_width')
+    if thumb_width in (None, ''):
+        thumb_width = defaults['thumb_width']
+    thumb_width = int(thumb_width)
+
+    return ManifestEntry(filepath, title, adult, thumb_width)
+
+
+class BulkUploader:
+    """
+    Upload images from a manifest to one or more galleries
+
+    Entries with the same title, adult flag and thumbnail width are uploaded to
+    the same gallery. All galleries share one session.
+
+    concurrency: Maximum number of simultaneous uploads across all galleries
+    session: Session instance or None to use a private session that is closed
+             by close()
+    gallery_options: Other keyword arguments for Gallery, e.g. "square_thumbs"
+                     or "dedup"
+
+    >>> async with pyimgbox.BulkUploader(concurrency=4) as uploader:
+    >>>     with open("manifest.jsonl") as f:
+    >>>         async for submission in uploader.run(pyimgbox.read_manifest(f)):
+    >>>             print(submission)
+    """
+
+    def __init__(self, concurrency=1, session=None, **gallery_options):
+        self.concurrency = concurrency
+        if session is None:
+            self._session = _http.Session()
+            self._owns_session = True
+        else:
+            self._session = session
+            self._owns_session = False
+        self._gallery_options = gallery_options
+        self._galleries = {}
+        self._closing = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Cancel in-flight uploads and close all galleries and the private session"""
+        for gallery in self._galleries.values():
+            await gallery.close()
+        if self._owns_session:
+            await self._session.close()
+
+    async def drain(self, timeout=None):
+        """
+        Stop requesting entries and wait for in-flight uploads to finish
+
+        timeout: See Gallery.drain()
+
+        run() ends after the submissions of in-flight uploads are yielded.
+
+        Return DrainResult of all galleries.
+        """
+        self._closing = True
+        return _merge(await asyncio.gather(*(g.drain(timeout) for g in self._galleries.values())))
+
+    async def cancel(self):
+        """
+        Stop requesting entries and cancel in-flight uploads
+
+        Return DrainResult of all galleries.
+        """
+        self._closing = True
+        return _merge(await asyncio.gather(*(g.cancel() for g in self._galleries.values())))
+
+    @property
+    def concurrency(self):
+        """Maximum number of simultaneous uploads across all galleries"""
+        return self._concurrency
+
+    @concurrency.setter
+    def concurrency(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f'Invalid concurrency: {value!r}')
+        self._concurrency = value
+
+    @property
+    def galleries(self):
+        """Sequence of Gallery instances that were used so far"""
+        return tuple(self._galleries.values())
+
+    async def run(self, entries):
+        """
+        Upload images
+
+        entries: Iterable or asynchronous iterable of ManifestEntry objects;
+                 entries are only requested when an upload can start
+                 immediately
+
+        Yield Submission objects asynchronously as soon as each upload is
+        finished.
+        """
+        pool = _pool.WorkerPool(func=self._upload, concurrency=self.concurrency)
+        async for submission in pool.map(_utils.aiterate(entries, stop=lambda: self._closing)):
+            yield submission
+
+    async def _upload(self, entry):
+        if self._closing:
+            return Submission(filepath=entry.filepath, error=f'{type(self).__name__} is closed')
+        return await self._get_gallery(entry).upload(entry.filepath)
+
+    def _get_gallery(self, entry):
+        key = (entry.title, entry.adult, entry.thumb_width)
+        gallery = self._galleries.get(key)
+        if gallery is None:
+            gallery = self._galleries[key] = Gallery(
+                title=entry.title,
+                adult=entry.adult,
+                thumb_width=entry.thumb_width,
+                session=self._session,
+                **self._gallery_options,
+            )
+            log.debug('New gallery: %r', gallery)
+        return gallery
+
+
+def _merge(results):
+    return DrainResult(
+        finished=tuple(fp for result in results for fp in result.finished),
+        cancelled=tuple(fp for result in results for fp in result.cancelled),
+    )
+
+
+async def write_jsonl(submissions, fileobj):
+    """
+    Write each Submission as one line of JSON as soon as it is available
+
+    submissions: Iterable or asynchronous iterable of Submission objects
+    fileobj: Text file object
+
+    Return number of successful and failed submissions as 2-tuple.
+    """
+    succeeded = failed = 0
+    async for submission in _utils.aiterate(submissions):
+        fileobj.write(json.dumps(dict(submission)) + '\n')
+        fileobj.flush()
+        if submission['success']:
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
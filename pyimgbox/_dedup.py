@@ -0,0 +1,98 @@
+import sqlite3
+import time
+
+
+class DedupCache:
+    """
+    Local database of uploaded images to avoid uploading the same image twice
+
+    Images are identified by a hash of their content. If the same content is
+    uploaded again, the URLs of the previous upload are returned instead.
+    Note that those URLs belong to the gallery of the previous upload.
+
+    filepath: Path to SQLite database file or ":memory:"
+    max_entries: Maximum number of stored images or None; least recently used
+                 images are removed first
+    max_age: Number of seconds after which an image is removed or None
+    """
+
+    _URL_KEYS = ('image_url', 'thumbnail_url', 'web_url', 'gallery_url', 'edit_url')
+
+    def __init__(self, filepath=':memory:', max_entries=100000, max_age=None):
+        self._filepath = filepath
+        self._max_entries = max_entries
+        self._max_age = max_age
+        # The connection may be created in another thread than the event loop
+        # that uses it (e.g. SyncGallery), but it is never used concurrently
+        self._db = sqlite3.connect(filepath, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS images ('
+                'hash TEXT PRIMARY KEY, '
+                'image_url TEXT, thumbnail_url TEXT, web_url TEXT, gallery_url TEXT, edit_url TEXT, '
+                'created REAL, used REAL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS images_used ON images (used)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS images_created ON images (created)')
+
+    @property
+    def filepath(self):
+        """Path to SQLite database file or :memory:"""
+        return self._filepath
+
+    def get(self, content_hash):
+        """
+        Return dictionary with the keys "image_url", "thumbnail_url",
+        "web_url", "gallery_url" and "edit_url" or None
+        """
+        now = time.time()
+        row = self._db.execute(
+            f'SELECT {", ".join(self._URL_KEYS)}, created FROM images WHERE hash = ?',
+            (content_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        elif self._max_age is not None and now - row[-1] >= self._max_age:
+            with self._db:
+                self._db.execute('DELETE FROM images WHERE hash = ?', (content_hash,))
+            return None
+        else:
+            with self._db:
+                self._db.execute('UPDATE images SET used = ? WHERE hash = ?', (now, content_hash))
+            return dict(zip(self._URL_KEYS, row))
+
+    def add(self, content_hash, submission):
+        """Store URLs from successful Submission"""
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                f'INSERT OR REPLACE INTO images (hash, {", ".join(self._URL_KEYS)}, created, used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (content_hash, *(submission[key] for key in self._URL_KEYS), now, now),
+            )
+            self._evict(now)
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
+    def _evict(self, now):
+        if self._max_age is not None:
+            self._db.execute('DELETE FROM images WHERE created <= ?', (now - self._max_age,))
+        if self._max_entries is not None:
+            self._db.execute(
+                'DELETE FROM images WHERE hash IN '
+                '(SELECT hash FROM images ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                (self._max_entries,),
+            )
+
+    def close(self):
+        """Close database"""
+        self._db.close()
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'filepath={self._filepath!r}, '
+            f'max_entries={self._max_entries!r}, '
+            f'max_age={self._max_age!r})'
+        )
@@ -1,13 +1,27 @@
+import asyncio
+import collections
+import contextlib
+import functools
+import io
 import logging
 import os
+import time
 
-import bs4
-
-from . import _const, _http, _utils
+from . import (_const, _dedup, _html, _http, _image, _journal, _observer,
+               _pool, _progress, _schedule, _shrink, _utils)
 from ._submission import Submission
 
 log = logging.getLogger('pyimgbox')
 
+DrainResult = collections.namedtuple('DrainResult', ('finished', 'cancelled'))
+DrainResult.__doc__ = """
+Uploads that were in flight when Gallery.drain() or Gallery.cancel() was called
+
+finished: Sequence of file paths that were uploaded or failed on their own
+cancelled: Sequence of file paths that were not uploaded because their upload
+           was cancelled
+"""
+
 
 class Gallery():
     """
@@ -19,17 +33,64 @@ class Gallery():
                  supported value
     square_thumbs: True to make thumbnails square, False otherwise
     comments_enabled: Whether comments are enabled for this gallery
+    concurrency: Default maximum number of simultaneous uploads for add()
+    session: Session instance that is shared with other galleries or None to
+             use a private session that is closed by close()
+    progress: Progress instance that is updated while images are uploaded or
+              None
+    journal: Journal instance, path to journal file or None; if the journal
+             contains a gallery, images are added to that gallery and files
+             that were already uploaded are not uploaded again
+    dedup: DedupCache instance, path to SQLite database or None; images that
+           were uploaded before are not uploaded again and their previous
+           URLs are returned in a Submission with "cached" set to True
+    shrink: Shrinker instance, True to use a private Shrinker that is closed
+            by close() or None; images that are larger than MAX_FILE_SIZE are
+            recompressed or downscaled instead of rejected
+    autotune: Autotuner instance or None; add() uses its concurrency instead
+              of `concurrency`, and it is adjusted to upload throughput,
+              latency and errors while images are uploaded
     """
 
     def __init__(self, title=None, thumb_width=100, square_thumbs=False,
-                 adult=False, comments_enabled=False):
-        self._client = _http.HTTPClient()
+                 adult=False, comments_enabled=False, concurrency=1,
+                 session=None, progress=None, journal=None, dedup=None,
+                 shrink=None, autotune=None):
+        self._client = _http.HTTPClient(session=session)
+        self._progress = progress if progress is not None else _progress.Progress()
         self._gallery_token = {}
+        self._create_lock = None
+        self._unverified_csrf_token = None
+        self._uploads = {}  # In-flight _Upload instances in the order they started
+        self._closing = False
         self.title = title
         self.square_thumbs = square_thumbs
         self.thumb_width = thumb_width
         self.adult = adult
         self.comments_enabled = comments_enabled
+        self.concurrency = concurrency
+        self._autotune = autotune
+
+        if journal is not None and not isinstance(journal, _journal.Journal):
+            journal = _journal.Journal(journal)
+        self._journal = journal
+        if journal is not None and journal.gallery_token:
+            log.debug('Found gallery in journal: %s', journal.gallery_token)
+            self._gallery_token = dict(journal.gallery_token)
+
+        if dedup is not None and not isinstance(dedup, _dedup.DedupCache):
+            self._dedup = _dedup.DedupCache(dedup)
+            self._owns_dedup = True
+        else:
+            self._dedup = dedup
+            self._owns_dedup = False
+
+        if shrink is True:
+            self._shrinker = _shrink.Shrinker()
+            self._owns_shrinker = True
+        else:
+            self._shrinker = shrink or None
+            self._owns_shrinker = False
 
     async def __aenter__(self):
         return self
@@ -38,8 +99,78 @@ class Gallery():
         await self.close()
 
     async def close(self):
-        """Stop adding images to this gallery"""
+        """
+        Stop adding images to this gallery
+
+        In-flight uploads are cancelled (see cancel()). A shared session and
+        DedupCache and Shrinker instances are not closed.
+        """
+        await self.cancel()
         await self._client.close()
+        if self._journal is not None:
+            self._journal.close()
+        if self._owns_dedup:
+            self._dedup.close()
+        if self._owns_shrinker:
+            self._shrinker.close()
+
+    async def drain(self, timeout=None):
+        """
+        Stop accepting new uploads and wait for in-flight uploads to finish
+
+        timeout: Number of seconds to wait before the remaining in-flight
+                 uploads are cancelled (see cancel()) or None to wait until
+                 all of them are finished
+
+        add() stops requesting file paths and ends after the submissions of
+        in-flight uploads are yielded. Any upload that is started afterwards
+        returns a Submission with an error.
+
+        Return DrainResult.
+        """
+        self._closing = True
+        uploads = tuple(self._uploads)
+        if uploads:
+            log.debug('Waiting for %d in-flight uploads', len(uploads))
+            await asyncio.wait([upload.done for upload in uploads], timeout=timeout)
+        return await self._cancel(uploads)
+
+    async def cancel(self):
+        """
+        Stop accepting new uploads and cancel in-flight uploads
+
+        Cancelled uploads close their files and connections and return
+        Submissions with an error.
+
+        Return DrainResult.
+        """
+        self._closing = True
+        return await self._cancel(tuple(self._uploads))
+
+    async def _cancel(self, uploads):
+        pending = [upload for upload in uploads if not upload.done.done()]
+        for upload in pending:
+            log.debug('Cancelling upload: %r', upload.filepaths)
+            upload.cancelled = True
+            upload.task.cancel()
+        if pending:
+            await asyncio.wait([upload.done for upload in pending])
+        return DrainResult(
+            finished=tuple(fp for upload in uploads if not upload.cancelled for fp in upload.filepaths),
+            cancelled=tuple(fp for upload in uploads if upload.cancelled for fp in upload.filepaths),
+        )
+
+    @contextlib.contextmanager
+    def _in_flight(self, filepaths):
+        # Register upload of `filepaths` by the current task so that drain()
+        # can wait for it and cancel() can cancel it
+        upload = _Upload(asyncio.current_task(), filepaths)
+        self._uploads[upload] = None
+        try:
+            yield upload
+        finally:
+            del self._uploads[upload]
+            upload.done.set_result(None)
 
     @property
     def title(self):
@@ -110,6 +241,42 @@ class Gallery():
         else:
             self._comments_enabled = bool(value)
 
+    @property
+    def concurrency(self):
+        """Default maximum number of simultaneous uploads for add()"""
+        return self._concurrency
+
+    @concurrency.setter
+    def concurrency(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f'Invalid concurrency: {value!r}')
+        self._concurrency = value
+
+    @property
+    def autotune(self):
+        """Autotuner instance or None"""
+        return self._autotune
+
+    @property
+    def progress(self):
+        """Progress instance that is updated while images are uploaded"""
+        return self._progress
+
+    @property
+    def journal(self):
+        """Journal instance or None"""
+        return self._journal
+
+    @property
+    def dedup(self):
+        """DedupCache instance or None"""
+        return self._dedup
+
+    @property
+    def shrinker(self):
+        """Shrinker instance or None"""
+        return self._shrinker
+
     @property
     def url(self):
         """URL to gallery of thumbnails or None before create() was called"""
@@ -149,21 +316,63 @@ class Gallery():
         if self.created:
             raise RuntimeError('Gallery was already created')
 
-        # Get CSRF token from entry page
+        if self._gallery_token:
+            # Gallery exists remotely (e.g. from a journal), but we need a CSRF
+            # token to upload
+            log.debug('Reattaching to gallery: %s', self._gallery_token)
+            await self._reattach()
+        else:
+            await self._create()
+            if self._journal is not None:
+                self._journal.add_gallery(self._gallery_token)
+
+    async def _reattach(self):
+        cached = self._client.session.token_cache.get()
+        if cached:
+            # The cached CSRF token is only verified by the first upload (see
+            # _post_files())
+            log.debug('Using cached CSRF token: %s', cached['csrf_token'])
+            self._client.cookies = cached['cookies']
+            self._client.headers[_const.CSRF_TOKEN_HEADER] = cached['csrf_token']
+            self._unverified_csrf_token = cached['csrf_token']
+        else:
+            await self._get_csrf_token()
+
+    async def _create(self):
+        # Try to reuse CSRF token and cookies from a previous gallery
+        token_cache = self._client.session.token_cache
+        cached = token_cache.get()
+        if cached:
+            log.debug('Using cached CSRF token: %s', cached['csrf_token'])
+            self._client.cookies = cached['cookies']
+            self._client.headers[_const.CSRF_TOKEN_HEADER] = cached['csrf_token']
+            try:
+                await self._get_gallery_token()
+            except (ConnectionError, RuntimeError) as e:
+                log.debug('Cached CSRF token was rejected: %s', e)
+                token_cache.invalidate()
+            else:
+                return
+
+        await self._get_csrf_token()
+        await self._get_gallery_token()
+
+    async def _get_csrf_token(self):
+        # Get CSRF token from entry page; we only need the HTML head
         self._client.headers.pop(_const.CSRF_TOKEN_HEADER, None)
-        text = await self._client.get(f'https://{_const.SERVICE_DOMAIN}/')
+        with self._observe('csrf'):
+            text = await self._client.get(f'https://{_const.SERVICE_DOMAIN}/', until='</head>')
 
-        # Find <meta content="..." name="csrf-token" />
-        soup = bs4.BeautifulSoup(text, features="html.parser")
-        csrf_token = ''
-        for meta in soup.find_all('meta', {'name': 'csrf-token'}):
-            csrf_token = meta.get('content')
+            # Find <meta content="..." name="csrf-token" />
+            csrf_token = _html.find_csrf_token(text)
             log.debug('Found CSRF token: %s', csrf_token)
-        if not csrf_token:
-            raise RuntimeError("Couldn't find CSRF token in HTML head")
-        else:
-            self._client.headers[_const.CSRF_TOKEN_HEADER] = csrf_token
+            if not csrf_token:
+                raise RuntimeError("Couldn't find CSRF token in HTML head")
 
+        self._client.headers[_const.CSRF_TOKEN_HEADER] = csrf_token
+        self._client.session.token_cache.set(csrf_token, self._client.cookies)
+
+    async def _get_gallery_token(self):
         # Get token_id / token_secret + gallery_id / gallery_secret
         data = {
             'gallery': 'true',
@@ -171,46 +380,263 @@ class Gallery():
             'comments_enabled': '1' if self.comments_enabled else '0',
         }
 
-        gallery_token = await self._client.post(
-            url=_const.TOKEN_URL,
-            data=data,
-            json=True,
-        )
-        if not isinstance(gallery_token, dict):
-            raise RuntimeError(f'Not a dict: {gallery_token!r}')
-        else:
-            self._gallery_token = gallery_token
-            log.debug('Gallery token: %s', self._gallery_token)
+        with self._observe('token'):
+            gallery_token = await self._client.post(
+                url=_const.TOKEN_URL,
+                data=data,
+                json=True,
+            )
+            if not isinstance(gallery_token, dict):
+                raise RuntimeError(f'Not a dict: {gallery_token!r}')
+
+        self._gallery_token = gallery_token
+        log.debug('Gallery token: %s', self._gallery_token)
+
+    @contextlib.contextmanager
+    def _observe(self, name, filepaths=(), file_progress=None):
+        # Report duration and error of the code in the with block to the
+        # session's observer
+        observer = self._client.session.observer
+        if observer is None:
+            yield
+            return
+
+        start = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            observer.operation(_observer.Operation(
+                name=name,
+                duration=time.monotonic() - start,
+                error=error,
+                filepaths=tuple(filepaths),
+                bytes_sent=file_progress.bytes_sent if file_progress is not None else 0,
+            ))
+
+    async def _create_once(self):
+        # Multiple uploads may want to create the gallery at the same time
+        if self._create_lock is None:
+            self._create_lock = asyncio.Lock()
+        async with self._create_lock:
+            if not self.created:
+                await self.create()
 
-    def _prepare(self, *filepaths):
+    def _prepare(self, filepath):
         """
-        Return list of 3-tuples:
+        Return 3-tuple:
             (filepath,
-             3-tuple: (filepath, fileobject, error) or None,
+             2-tuple: (filename, fileobject) or None,
              error message or None)
+
+        Files larger than MAX_FILE_SIZE are not rejected if we have a
+        Shrinker.
+
+        The caller is responsible for closing the file object.
         """
-        files = []
-        for filepath in filepaths:
-            # Open file or get error message
+        # Open file or get error message
+        try:
+            fileobj = open(filepath, 'rb')
+        except OSError as e:
+            return (filepath, None, e.strerror)
+
+        # Check file size limit
+        if self._shrinker is None and os.path.getsize(filepath) > _const.MAX_FILE_SIZE:
+            fileobj.close()
+            return (filepath, None, f'File is larger than {_const.MAX_FILE_SIZE} bytes')
+
+        # Return the tuple we need for the POST request
+        filetuple = (os.path.basename(filepath), fileobj)
+        return (filepath, filetuple, None)
+
+    async def _open(self, filepath):
+        """
+        Same as _prepare(), but also make sure the file is a JPEG, PNG or GIF
+        image before anything is uploaded and shrink files that are too large
+        if we have a Shrinker
+
+        The caller is responsible for closing the file object.
+        """
+        filepath, filetuple, error = self._prepare(filepath)
+        if filetuple is not None:
             try:
-                fileobj = open(filepath, 'rb')
-            except OSError as e:
-                files.append((filepath, None, e.strerror))
-            else:
-                # Check file size limit
-                if os.path.getsize(filepath) > _const.MAX_FILE_SIZE:
-                    files.append((
-                        filepath,
-                        None,
-                        f'File is larger than {_const.MAX_FILE_SIZE} bytes'
-                    ))
-
-                # Store the tuple we need for the POST request
-                else:
-                    filetuple = (os.path.basename(filepath), fileobj)
-                    files.append((filepath, filetuple, None))
+                error = await self._check_image(filetuple[1])
+                if not error and self._shrinker is not None:
+                    filetuple, error = await self._shrink(filepath, filetuple)
+            except BaseException:
+                filetuple[1].close()
+                raise
+            if error:
+                filetuple[1].close()
+                return (filepath, None, error)
+        return (filepath, filetuple, error)
+
+    async def _check_image(self, fileobj):
+        # Return error message if `fileobj` is not a supported image or None;
+        # the header is read in another thread so that other uploads continue
+        loop = asyncio.get_event_loop()
+        try:
+            info = await loop.run_in_executor(None, _image.sniff, fileobj)
+        except ValueError as e:
+            return str(e)
+        except OSError as e:
+            return e.strerror or str(e)
+        else:
+            log.debug('Found image: %r', info)
+            return None
+
+    async def _shrink(self, filepath, filetuple):
+        # Return filetuple with image data that is small enough to upload and
+        # error message or None; the original file object is closed if it is
+        # replaced
+        size = os.path.getsize(filepath)
+        if size <= _const.MAX_FILE_SIZE:
+            return filetuple, None
+        try:
+            data = await self._shrinker.shrink(filepath)
+        except ValueError as e:
+            return filetuple, f'File is larger than {_const.MAX_FILE_SIZE} bytes: {e}'
+        except OSError as e:
+            return filetuple, e.strerror or str(e)
+        log.debug('Shrunk %s from %d to %d bytes', filepath, size, len(data))
+        filetuple[1].close()
+        return (filetuple[0], io.BytesIO(data)), None
+
+    async def _upload_file(self, filepath):
+        """
+        Open, upload and close image file
+
+        Return Submission object.
+        """
+        if self._closing:
+            return Submission(filepath=filepath, error='Gallery is closed')
+
+        with self._in_flight((filepath,)) as upload:
+            filetuple = None
+            try:
+                filepath, filetuple, error = await self._open(filepath)
+                content_hash, submission = await self._find_known_submission(filepath, filetuple)
+                if submission is not None:
+                    return submission
+
+                submission = await self._upload_image(filepath, filetuple, error)
+                if content_hash is not None and submission['success']:
+                    self._remember_submission(filepath, content_hash, submission)
+                return submission
+            except asyncio.CancelledError:
+                if not upload.cancelled:
+                    raise
+                return Submission(filepath=filepath, error='Upload cancelled')
+            finally:
+                if filetuple is not None:
+                    filetuple[1].close()
+
+    async def _upload_batch(self, filepaths):
+        """
+        Open, upload and close multiple image files with one request
+
+        Return list of Submission objects in the same order as `filepaths`.
+        """
+        if self._closing:
+            return [Submission(filepath=filepath, error='Gallery is closed') for filepath in filepaths]
 
-        return files
+        with self._in_flight(tuple(filepaths)) as upload:
+            try:
+                return await self._upload_prepared(filepaths)
+            except asyncio.CancelledError:
+                if not upload.cancelled:
+                    raise
+                return [Submission(filepath=filepath, error='Upload cancelled') for filepath in filepaths]
+
+    async def _upload_prepared(self, filepaths):
+        prepared = []
+        try:
+            for filepath in filepaths:
+                prepared.append(await self._open(filepath))
+            submissions = [None] * len(prepared)
+            pending = []
+            for i, (filepath, filetuple, error) in enumerate(prepared):
+                if error:
+                    submissions[i] = Submission(filepath=filepath, error=error)
+                else:
+                    content_hash, submission = await self._find_known_submission(filepath, filetuple)
+                    if submission is not None:
+                        submissions[i] = submission
+                    else:
+                        pending.append((i, filepath, filetuple, content_hash))
+
+            if pending:
+                uploaded = await self._upload_images([(fp, ft) for _, fp, ft, _ in pending])
+                for (i, filepath, _, content_hash), submission in zip(pending, uploaded):
+                    submissions[i] = submission
+                    if content_hash is not None and submission['success']:
+                        self._remember_submission(filepath, content_hash, submission)
+            return submissions
+        finally:
+            for _, filetuple, _ in prepared:
+                if filetuple is not None:
+                    filetuple[1].close()
+
+    async def _batch(self, filepaths, batch_size, batch_bytes):
+        # Group file paths into lists of up to `batch_size` files with a
+        # combined size of up to `batch_bytes`
+        batch = []
+        batch_size_bytes = 0
+        async for filepath in _utils.aiterate(filepaths):
+            try:
+                size = os.path.getsize(filepath)
+            except OSError:
+                # _prepare() reports the error
+                size = 0
+            if batch and (len(batch) >= batch_size or batch_size_bytes + size > batch_bytes):
+                yield batch
+                batch = []
+                batch_size_bytes = 0
+            batch.append(filepath)
+            batch_size_bytes += size
+        if batch:
+            yield batch
+
+    async def _find_known_submission(self, filepath, filetuple):
+        # Return content hash (or None) and Submission from journal or dedup
+        # cache (or None)
+        if filetuple is None or (self._journal is None and self._dedup is None):
+            return None, None
+        content_hash = await self._get_content_hash(filetuple[1])
+        return content_hash, self._get_known_submission(filepath, content_hash)
+
+    def _get_known_submission(self, filepath, content_hash):
+        # Return Submission from journal or dedup cache or None
+        if self._journal is not None:
+            submission = self._journal.get(filepath, content_hash)
+            if submission is not None:
+                log.debug('Found submission in journal: %r', submission)
+                return submission
+
+        if self._dedup is not None:
+            urls = self._dedup.get(content_hash)
+            if urls is not None:
+                submission = Submission(filepath=filepath, cached=True, **urls)
+                log.debug('Found submission in dedup cache: %r', submission)
+                if self._journal is not None:
+                    self._journal.add_submission(filepath, content_hash, submission)
+                return submission
+
+        return None
+
+    def _remember_submission(self, filepath, content_hash, submission):
+        if self._journal is not None:
+            self._journal.add_submission(filepath, content_hash, submission)
+        if self._dedup is not None:
+            self._dedup.add(content_hash, submission)
+
+    async def _get_content_hash(self, fileobj):
+        # Don't block the event loop while reading the whole file
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, _utils.get_content_hash, fileobj)
 
     async def _upload_image(self, filepath, filetuple, error):
         """
@@ -227,12 +653,25 @@ class Gallery():
             assert filetuple is None, 'Arguments "filetuple" and "error" are mutually exclusive'
             return Submission(filepath=filepath, error=error)
 
+        submissions = await self._upload_images([(filepath, filetuple)])
+        return submissions[0]
+
+    async def _upload_images(self, files):
+        """
+        Upload image files with one request
+
+        files: Sequence of (filepath, filetuple) tuples (see _upload_image())
+
+        Return list of Submission objects in the same order as `files`.
+        """
+        filepaths = [filepath for filepath, _ in files]
+
         # Auto-create gallery
         if not self.created:
             try:
-                await self.create()
+                await self._create_once()
             except ConnectionError as e:
-                return Submission(filepath=filepath, error=str(e))
+                return [Submission(filepath=filepath, error=str(e)) for filepath in filepaths]
 
         # Build request
         data = {
@@ -244,36 +683,103 @@ class Gallery():
             'thumbnail_size': str(self._thumbnail_size),
             'comments_enabled': '1' if self.comments_enabled else '0',
         }
-        files = {'files[]': filetuple}
+        files = [('files[]', filetuple) for _, filetuple in files]
 
-        # Upload image
+        # Upload images
+        file_progress = self._progress.start(filepaths[0] if len(filepaths) == 1 else tuple(filepaths))
+        start = time.monotonic()
+        error = None
+        cancelled = False
         try:
-            response = await self._client.post(
-                url=_const.PROCESS_URL,
-                data=data,
-                files=files,
-                json=True,
-            )
+            with self._observe('upload', filepaths, file_progress):
+                response = await self._post_files(
+                    data=data,
+                    files=files,
+                    progress=functools.partial(self._progress.update, file_progress),
+                )
+                log.debug('POST response: %s', response)
+                urls = self._get_urls(response, len(filepaths))
         except ConnectionError as e:
-            return Submission(filepath=filepath, error=str(e))
+            error = e
+            return [Submission(filepath=filepath, error=str(e)) for filepath in filepaths]
+        except RuntimeError as e:
+            error = e
+            raise
+        except asyncio.CancelledError:
+            # An upload that was aborted by cancel(), drain() or the caller
+            # says nothing about throughput
+            cancelled = True
+            raise
         else:
-            log.debug('POST response: %s', response)
-            try:
-                info = response['files'][0]
-                image_url = info['original_url']
-                thumbnail_url = info['thumbnail_url']
-                web_url = info['url']
-            except (KeyError, IndexError, TypeError) as e:
-                log.debug('Unexpected response: %r', response)
-                raise RuntimeError(f'Unexpected response: {response!r}') from e
-            return Submission(
-                filepath=filepath,
-                image_url=image_url,
-                thumbnail_url=thumbnail_url,
-                web_url=web_url,
-                gallery_url=self.url,
-                edit_url=self.edit_url,
-            )
+            return [
+                Submission(
+                    filepath=filepath,
+                    image_url=image_url,
+                    thumbnail_url=thumbnail_url,
+                    web_url=web_url,
+                    gallery_url=self.url,
+                    edit_url=self.edit_url,
+                )
+                for filepath, (image_url, thumbnail_url, web_url) in zip(filepaths, urls)
+            ]
+        finally:
+            self._progress.finish(file_progress)
+            if self._autotune is not None and not cancelled:
+                self._autotune.report(time.monotonic() - start, file_progress.bytes_sent, error)
+
+    async def _post_files(self, data, files, progress):
+        # Send upload request; if it was sent with the cached CSRF token from
+        # _reattach() and is rejected with a client error, get a new CSRF
+        # token and try again
+        post = functools.partial(
+            self._client.post,
+            url=_const.PROCESS_URL,
+            data=data,
+            files=files,
+            json=True,
+            progress=progress,
+        )
+        csrf_token = self._client.headers.get(_const.CSRF_TOKEN_HEADER)
+        try:
+            response = await post()
+        except ConnectionError as e:
+            if self._unverified_csrf_token is None or csrf_token != self._unverified_csrf_token:
+                raise
+            # Network errors, server errors and "413 File too large" don't
+            # mean the token is invalid and the upload is not sent again
+            status_code = getattr(e, 'status_code', None)
+            if status_code is None or not 400 <= status_code < 500 or status_code == 413:
+                raise
+            if self._create_lock is None:
+                self._create_lock = asyncio.Lock()
+            async with self._create_lock:
+                # Other uploads may have failed with the same token
+                if self._client.headers.get(_const.CSRF_TOKEN_HEADER) == csrf_token:
+                    log.debug('Cached CSRF token was rejected: %s', e)
+                    self._client.session.token_cache.invalidate()
+                    await self._get_csrf_token()
+                    self._unverified_csrf_token = None
+            return await post()
+        else:
+            if csrf_token == self._unverified_csrf_token:
+                self._unverified_csrf_token = None
+            return response
+
+    def _get_urls(self, response, count):
+        # Return list of (image URL, thumbnail URL, web URL) tuples from upload
+        # response for `count` files
+        try:
+            urls = [
+                (info['original_url'], info['thumbnail_url'], info['url'])
+                for info in response['files']
+            ]
+        except (KeyError, IndexError, TypeError) as e:
+            log.debug('Unexpected response: %r', response)
+            raise RuntimeError(f'Unexpected response: {response!r}') from e
+        if len(urls) != count:
+            log.debug('Unexpected number of files: %r', response)
+            raise RuntimeError(f'Unexpected response: {response!r}')
+        return urls
 
     async def upload(self, filepath):
         """
@@ -283,10 +789,10 @@ class Gallery():
 
         Return Submission object.
         """
-        filepath, filetuple, error = self._prepare(filepath)[0]
-        return await self._upload_image(filepath, filetuple, error)
+        return await self._upload_file(filepath)
 
-    async def add(self, filepaths):
+    async def add(self, filepaths, concurrency=None, ordered=False, batch_size=1,
+                  batch_bytes=_const.MAX_FILE_SIZE, schedule=None):
         """
         Upload images to this gallery
 
@@ -295,12 +801,112 @@ class Gallery():
         >>> async for submission in gallery.add(["foo.jpg", "bar.jpg"]):
         >>>     print(submission)
 
-        filepaths: Iterable of paths to JPEG or PNG files
+        filepaths: Iterable or asynchronous iterable of paths to JPEG or PNG
+                   files; each file is only opened while it is uploaded
+        concurrency: Maximum number of simultaneous uploads or None to use
+                     the `concurrency` property; ignored if this gallery has
+                     an Autotuner
+        ordered: Whether to yield submissions in the same order as
+                 `filepaths` or as soon as each upload is finished
+        batch_size: Maximum number of files that are uploaded with one
+                    request
+        batch_bytes: Maximum combined size of files that are uploaded with one
+                     request; larger files are uploaded alone
+        schedule: None to upload files in the order of `filepaths` or
+                  "largest-first", "smallest-first" or "balanced" to upload
+                  them in an order that depends on their size (see
+                  pyimgbox._schedule.schedule()); all `filepaths` are read
+                  before the first upload starts
+
+        Raise ValueError if `schedule` is unknown.
 
         Yield Submission objects asynchronously.
         """
-        for filepath, filetuple, error in self._prepare(*filepaths):
-            yield await self._upload_image(filepath, filetuple, error)
+        if concurrency is None:
+            concurrency = self.concurrency
+
+        if schedule is not None:
+            if schedule not in _schedule.POLICIES:
+                raise ValueError(f'Invalid schedule: {schedule!r}')
+            submissions = self._add_scheduled(filepaths, concurrency, ordered,
+                                              batch_size, batch_bytes, schedule)
+            async for submission in submissions:
+                yield submission
+        elif batch_size > 1:
+            pool = self._make_pool(self._upload_batch, concurrency)
+            batches = self._batch(filepaths, batch_size, batch_bytes)
+            async for submissions in pool.map(self._accept(batches), ordered=ordered):
+                for submission in submissions:
+                    yield submission
+        else:
+            pool = self._make_pool(self._upload_file, concurrency)
+            async for submission in pool.map(self._accept(filepaths), ordered=ordered):
+                yield submission
+
+    def _accept(self, items):
+        # Stop requesting items for new uploads when drain() or cancel() is
+        # called
+        return _utils.aiterate(items, stop=lambda: self._closing)
+
+    def _make_pool(self, func, concurrency):
+        # Return WorkerPool that calls `func`; with an Autotuner, the pool's
+        # concurrency follows the Autotuner after each call
+        if self._autotune is None:
+            return _pool.WorkerPool(func=func, concurrency=concurrency)
+
+        async def tuned_func(item):
+            try:
+                return await func(item)
+            finally:
+                pool.concurrency = self._autotune.concurrency
+
+        pool = _pool.WorkerPool(func=tuned_func, concurrency=self._autotune.concurrency)
+        return pool
+
+    async def _add_scheduled(self, filepaths, concurrency, ordered, batch_size, batch_bytes, schedule):
+        # Upload files in the order from _schedule.schedule(); each result is
+        # tagged with the index of its file in `filepaths` so that `ordered`
+        # refers to the original order
+        filepaths = [filepath async for filepath in _utils.aiterate(filepaths)]
+        loop = asyncio.get_event_loop()
+        order = await loop.run_in_executor(None, _schedule.schedule, filepaths, schedule)
+        log.debug('Upload order (%s): %r', schedule, order)
+
+        if batch_size > 1:
+            async def upload_batch(item):
+                indexes, batch = item
+                return list(zip(indexes, await self._upload_batch(batch)))
+
+            async def batches():
+                # Batches are consecutive slices of `order`
+                position = 0
+                async for batch in self._batch((filepaths[i] for i in order), batch_size, batch_bytes):
+                    yield order[position:position + len(batch)], batch
+                    position += len(batch)
+
+            results = self._make_pool(upload_batch, concurrency).map(self._accept(batches()))
+        else:
+            async def upload_file(index):
+                return [(index, await self._upload_file(filepaths[index]))]
+
+            results = self._make_pool(upload_file, concurrency).map(self._accept(order))
+
+        pending = {}
+        next_index = 0
+        async for indexed_submissions in results:
+            for index, submission in indexed_submissions:
+                if not ordered:
+                    yield submission
+                else:
+                    pending[index] = submission
+                    while next_index in pending:
+                        yield pending.pop(next_index)
+                        next_index += 1
+
+        # drain() or cancel() may stop `order` before all indexes are
+        # uploaded, so submissions can still wait for a smaller index
+        for index in sorted(pending):
+            yield pending[index]
 
     def __repr__(self):
         return (
@@ -311,3 +917,14 @@ class Gallery():
             f'adult={repr(self.adult)}, '
             f'comments_enabled={repr(self.comments_enabled)})'
         )
+
+
+class _Upload:
+    # In-flight upload of one or more files by `task`; `done` is resolved
+    # when the upload is finished or cancelled
+
+    def __init__(self, task, filepaths):
+        self.task = task
+        self.filepaths = filepaths
+        self.cancelled = False
+        self.done = asyncio.get_event_loop().create_future()
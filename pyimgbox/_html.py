@@ -0,0 +1,47 @@
+import html
+import re
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+_META_REGEX = re.compile(r'<meta\s([^>]*)>', flags=re.IGNORECASE)
+_ATTRIBUTE_REGEX = re.compile(
+    r'''([^\s=/>]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+))''',
+    flags=re.IGNORECASE,
+)
+
+
+def find_csrf_token(text):
+    """
+    Return value of the "content" attribute of <meta name="csrf-token"> in
+    HTML string `text` or empty string if there is no such tag
+
+    Try regular expressions first and fall back to BeautifulSoup.
+    """
+    csrf_token = _find_csrf_token_fast(text)
+    if not csrf_token:
+        log.debug('Falling back to BeautifulSoup to find CSRF token')
+        csrf_token = _find_csrf_token_bs4(text)
+    return csrf_token
+
+
+def _find_csrf_token_fast(text):
+    csrf_token = ''
+    for match in _META_REGEX.finditer(text):
+        attributes = {}
+        for m in _ATTRIBUTE_REGEX.finditer(match.group(1)):
+            value = next(v for v in m.group(2, 3, 4) if v is not None)
+            attributes[m.group(1).lower()] = html.unescape(value)
+        if attributes.get('name') == 'csrf-token' and attributes.get('content'):
+            csrf_token = attributes['content']
+    return csrf_token
+
+
+def _find_csrf_token_bs4(text):
+    # bs4 takes a long time to import and is rarely needed
+    import bs4
+    soup = bs4.BeautifulSoup(text, features='html.parser')
+    csrf_token = ''
+    for meta in soup.find_all('meta', {'name': 'csrf-token'}):
+        csrf_token = meta.get('content') or ''
+    return csrf_token
@@ -1,18 +1,127 @@
-import httpx
+import asyncio
+import codecs
+import collections
+import datetime
+import email.utils
+import random
+import re
+import time
+
+from . import _multipart, _observer, _tokencache, _utils
 
 import logging  # isort:skip
 log = logging.getLogger('pyimgbox')
 
+# httpx takes a long time to import and is only needed for network operations
+httpx = _utils.LazyModule('httpx')
+
+
+class Session:
+    """
+    Pool of connections to imgbox.com that can be shared by multiple galleries
+
+    Galleries that share a session reuse each other's connections instead of
+    opening new ones. Closing a gallery does not close its session; call
+    close() when the session is no longer needed.
+
+    max_connections: Maximum number of simultaneous connections
+    max_keepalive_connections: Maximum number of idle connections that are
+                               kept open for reuse
+    keepalive_expiry: Seconds an idle connection is kept open
+    http2: Whether to use HTTP/2 (requires the "h2" package)
+    retry: RetryPolicy instance or None to never repeat failed requests
+    token_cache: TokenCache instance or None to cache tokens in memory
+    rate_limit: RateLimiter instance or None to send requests as fast as
+                possible
+    observer: Observer instance that receives timings or None
+    timeouts: Timeouts instance or None to use the defaults
+    transport: httpx transport instance or None; this can be used to send
+               requests to a local test server (`max_connections`,
+               `max_keepalive_connections`, `keepalive_expiry` and `http2`
+               are ignored)
+    """
+
+    def __init__(self, max_connections=100, max_keepalive_connections=20,
+                 keepalive_expiry=5.0, http2=False, retry=None, token_cache=None,
+                 rate_limit=None, observer=None, timeouts=None, transport=None):
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.timeouts = timeouts if timeouts is not None else Timeouts()
+        self.rate_limit = rate_limit
+        self.observer = observer
+        self.token_cache = token_cache if token_cache is not None else _tokencache.TokenCache()
+        # Connection options that can be passed to another Session
+        self._options = {
+            'max_connections': max_connections,
+            'max_keepalive_connections': max_keepalive_connections,
+            'keepalive_expiry': keepalive_expiry,
+            'http2': http2,
+        }
+        self._client = httpx.AsyncClient(
+            timeout=self.timeouts.get_httpx_timeout(),
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            transport=transport,
+        )
+
+    @property
+    def closed(self):
+        """Whether close() was called"""
+        return self._client.is_closed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close all connections"""
+        await self._client.aclose()
+
 
 class HTTPClient:
-    def __init__(self):
-        self._client = httpx.AsyncClient(timeout=300)
+    """
+    HTTP client with its own headers
+
+    session: Session instance or None to use a private session that is
+             closed by close()
+    """
+
+    def __init__(self, session=None):
+        if session is None:
+            self._session = Session()
+            self._owns_session = True
+        else:
+            self._session = session
+            self._owns_session = False
+        self._client = self._session._client
         self._headers = {}
 
+    @property
+    def session(self):
+        return self._session
+
     @property
     def headers(self):
         return self._headers
 
+    @property
+    def cookies(self):
+        """List of cookie dictionaries with the keys name, value, domain and path"""
+        return [
+            {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path}
+            for c in self._client.cookies.jar
+        ]
+
+    @cookies.setter
+    def cookies(self, cookies):
+        for c in cookies:
+            self._client.cookies.set(c['name'], c['value'], domain=c['domain'], path=c['path'])
+
     async def __aenter__(self):
         return self
 
@@ -20,59 +129,204 @@ class HTTPClient:
         await self.close()
 
     async def close(self):
-        await self._client.aclose()
+        if self._owns_session:
+            await self._session.close()
 
-    async def get(self, url, params={}, json=False):
-        return await self._catch_errors(
-            request=self._client.build_request(
-                method='GET',
-                url=url,
-                headers=self._headers,
-                params=params,
-            ),
+    async def get(self, url, params={}, json=False, until=None):
+        """
+        until: Stop reading the response body after this string
+               (case-insensitive) and return the text up to and including it
+        """
+        return await self._request(
+            method='GET',
+            url=url,
+            params=params,
             json=json,
+            until=until,
         )
 
-    async def post(self, url, data={}, files={}, json=False):
-        return await self._catch_errors(
-            request=self._client.build_request(
+    async def post(self, url, data={}, files={}, json=False, progress=None):
+        if files:
+            # Stream multipart body instead of letting httpx encode it
+            rate_limit = self._session.rate_limit
+            timeouts = self._session.timeouts
+            stall = _StallDetector(
+                timeouts.min_throughput,
+                timeouts.stall_interval,
+                send=rate_limit.send if rate_limit is not None else None,
+            )
+
+            def callback(bytes_sent, bytes_total):
+                stall.update(bytes_sent, bytes_total)
+                if progress is not None:
+                    progress(bytes_sent, bytes_total)
+
+            body = _multipart.MultipartStream(
+                data=data,
+                files=files,
+                callback=callback,
+                throttle=stall.throttle if rate_limit is not None else None,
+            )
+            return await self._request(
+                method='POST',
+                url=url,
+                headers=body.headers,
+                content=body,
+                json=json,
+                timeout=timeouts.get_upload_timeout(len(body)),
+                stall=stall,
+            )
+        else:
+            return await self._request(
                 method='POST',
                 url=url,
-                headers=self._headers,
                 data=data,
-                files=files,
-            ),
-            json=json,
-        )
+                json=json,
+            )
+
+    async def _request(self, method, url, headers={}, json=False, until=None,
+                       timeout=None, stall=None, **kwargs):
+        # Send request and repeat it according to the session's retry policy;
+        # each attempt may take `timeout` seconds (defaults to
+        # Timeouts.request) and is aborted if `stall` detects a stalled upload
+        policy = self._session.retry
+        timeouts = self._session.timeouts
+        if timeout is None:
+            timeout = timeouts.request
+        rate_limit = self._session.rate_limit
+        observer = self._session.observer
+        number = 1
+        while True:
+            if rate_limit is not None:
+                await rate_limit.request()
+            request = self._client.build_request(
+                method=method,
+                url=url,
+                headers={**self._headers, **headers},
+                timeout=timeouts.get_httpx_timeout(timeout),
+                **kwargs,
+            )
+            if observer is not None:
+                stats = _observer._RequestStats()
+                if observer.trace:
+                    request.extensions['trace'] = stats
+            else:
+                stats = None
+            start = time.monotonic()
+            try:
+                response = await self._wait(
+                    self._catch_errors(request, json=json, until=until, stats=stats),
+                    request.url, timeout, stall,
+                )
+            except RuntimeError as e:
+                # Unexpected response (e.g. invalid JSON) is not retried
+                if stats is not None:
+                    self._report(observer, request, stats, time.monotonic() - start, e)
+                raise
+            except _RequestError as e:
+                duration = time.monotonic() - start
+                if stats is not None:
+                    self._report(observer, request, stats, duration, e)
+                if rate_limit is not None:
+                    rate_limit.report(duration, e)
+                delay = policy.get_delay(number, e) if e.retryable else None
+                policy.report(Attempt(method, str(request.url), number, duration, str(e), delay))
+                if delay is None:
+                    raise
+                log.debug('Retrying in %.3f seconds: %s', delay, e)
+                await asyncio.sleep(delay)
+                number += 1
+            else:
+                duration = time.monotonic() - start
+                if stats is not None:
+                    self._report(observer, request, stats, duration)
+                if rate_limit is not None:
+                    rate_limit.report(duration)
+                policy.report(Attempt(method, str(request.url), number, duration, None, None))
+                return response
+
+    async def _wait(self, coro, url, timeout, stall=None):
+        # Return result of `coro` or raise _RequestError if it takes longer
+        # than `timeout` seconds or if `stall` finds that an upload stalled
+        if stall is not None:
+            return await stall.watch(coro, url, timeout)
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise _RequestError(f'{url}: Timeout after {timeout:g} seconds', retryable=True)
+
+    def _report(self, observer, request, stats, duration, error=None):
+        if error is not None:
+            # Report the exception that caused our exception
+            error_type = type(error.__context__ or error).__name__
+        else:
+            error_type = None
+        observer.request(_observer.RequestTiming(
+            method=request.method,
+            url=str(request.url),
+            status_code=stats.status_code,
+            error=str(error) if error is not None else None,
+            error_type=error_type,
+            bytes_sent=int(request.headers.get('Content-Length', 0)),
+            bytes_received=stats.bytes_received,
+            duration=duration,
+            phases=stats.phases,
+        ))
 
-    async def _catch_errors(self, request, json=False):
+    async def _catch_errors(self, request, json=False, until=None, stats=None):
         log.debug('Sending %r', request)
 
         # Don't send User-Agent
         if 'User-Agent' in request.headers:
             del request.headers['User-Agent']
 
+        text = None
         try:
-            response = await self._client.send(request)
+            if until is None:
+                response = await self._client.send(request)
+            else:
+                response = await self._client.send(request, stream=True)
+                try:
+                    if response.is_error:
+                        await response.aread()
+                    else:
+                        text = await _read_until(response, until)
+                finally:
+                    await response.aclose()
+
+            if stats is not None:
+                stats.status_code = response.status_code
+                stats.bytes_received = response.num_bytes_downloaded
 
             try:
                 response.raise_for_status()
             except httpx.HTTPStatusError as e:
-                if e.response.status_code == 413:
-                    raise ConnectionError(f'{request.url}: File too large')
+                status_code = e.response.status_code
+                retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                if status_code == 413:
+                    raise _RequestError(f'{request.url}: File too large',
+                                        status_code=status_code)
                 elif response.text.strip():
-                    raise ConnectionError(f'{request.url}: {response.text}')
+                    raise _RequestError(f'{request.url}: {response.text}',
+                                        status_code=status_code, retry_after=retry_after)
                 else:
-                    raise ConnectionError(f'{request.url}: Unknown status error: {response.status_code}')
+                    raise _RequestError(f'{request.url}: Unknown status error: {response.status_code}',
+                                        status_code=status_code, retry_after=retry_after)
 
-        except httpx.NetworkError:
-            raise ConnectionError(f'{request.url}: Connection failed')
+        except (httpx.NetworkError, httpx.RemoteProtocolError):
+            raise _RequestError(f'{request.url}: Connection failed', retryable=True)
+
+        except httpx.TimeoutException as e:
+            if str(e).strip():
+                raise _RequestError(f'{request.url}: {e}', retryable=True)
+            else:
+                raise _RequestError(f'{request.url}: Timeout', retryable=True)
 
         except httpx.HTTPError as e:
             if str(e).strip():
-                raise ConnectionError(f'{request.url}: {e}')
+                raise _RequestError(f'{request.url}: {e}')
             else:
-                raise ConnectionError(f'{request.url}: Unknown error')
+                raise _RequestError(f'{request.url}: Unknown error')
 
         else:
             if json:
@@ -80,5 +334,282 @@ class HTTPClient:
                     return response.json()
                 except ValueError as e:
                     raise RuntimeError(f'{request.url}: Invalid JSON: {e}: {response.text}')
+            elif text is not None:
+                return text
             else:
                 return response.text
+
+
+async def _read_until(response, terminator):
+    # Return decoded response body up to and including the first occurrence of
+    # `terminator`
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    regex = re.compile(re.escape(terminator), flags=re.IGNORECASE)
+    text = ''
+    chunks = response.aiter_bytes()
+    async for chunk in chunks:
+        start = max(0, len(text) - len(terminator))
+        text += decoder.decode(chunk)
+        match = regex.search(text, start)
+        if match:
+            text = text[:match.end()]
+            break
+    else:
+        return text + decoder.decode(b'', final=True)
+
+    # Discard the rest of the body without decoding it so the connection can
+    # be reused
+    async for _ in chunks:
+        pass
+    return text
+
+
+class _StallDetector:
+    # Abort an upload that sends less than `min_throughput` bytes per second
+    # over `interval` seconds; the request body reports its progress to
+    # update() and waits for the rate limit with throttle(), which doesn't
+    # count as stalling
+
+    def __init__(self, min_throughput, interval, send=None):
+        self._min_throughput = min_throughput
+        self._interval = interval
+        self._send = send
+        self._bytes_sent = 0
+        self._bytes_total = None
+        self._paused = 0.0
+        self._paused_since = None
+
+    def update(self, bytes_sent, bytes_total):
+        self._bytes_sent = bytes_sent
+        self._bytes_total = bytes_total
+
+    async def throttle(self, nbytes):
+        # Wait for `send` without measuring throughput in the meantime
+        self._paused_since = time.monotonic()
+        try:
+            await self._send(nbytes)
+        finally:
+            self._paused += time.monotonic() - self._paused_since
+            self._paused_since = None
+
+    def _take_paused(self):
+        # Return seconds spent in throttle() since the previous call
+        paused = self._paused
+        if self._paused_since is not None:
+            now = time.monotonic()
+            paused += now - self._paused_since
+            self._paused_since = now
+        self._paused = 0.0
+        return paused
+
+    async def watch(self, coro, url, timeout):
+        # Return result of `coro` or raise _RequestError if it stalls or if it
+        # takes longer than `timeout` seconds, not counting time spent in
+        # throttle()
+        self._bytes_sent = 0
+        self._bytes_total = None
+        self._take_paused()
+        task = asyncio.ensure_future(coro)
+        try:
+            elapsed = active = 0.0
+            bytes_sent = self._bytes_sent
+            while True:
+                start = time.monotonic()
+                wait = timeout - elapsed
+                if self._min_throughput is not None:
+                    wait = min(wait, self._interval - active)
+                done, _ = await asyncio.wait({task}, timeout=wait)
+                if done:
+                    return task.result()
+                duration = max(0.0, time.monotonic() - start - self._take_paused())
+                elapsed += duration
+                if elapsed >= timeout:
+                    raise _RequestError(f'{url}: Timeout after {timeout:g} seconds', retryable=True)
+                if self._min_throughput is None:
+                    continue
+                if self._bytes_total is not None and self._bytes_sent >= self._bytes_total:
+                    # Body was sent; waiting for the response is limited by
+                    # the timeout
+                    continue
+                active += duration
+                if active >= self._interval:
+                    bytes_per_second = (self._bytes_sent - bytes_sent) / active
+                    if bytes_per_second < self._min_throughput:
+                        raise _RequestError(
+                            f'{url}: Upload stalled: {bytes_per_second:.0f} bytes per second '
+                            f'in the last {self._interval:g} seconds',
+                            retryable=True,
+                        )
+                    active = 0.0
+                    bytes_sent = self._bytes_sent
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+
+class _RequestError(ConnectionError):
+    # ConnectionError with information for RetryPolicy
+    def __init__(self, msg, status_code=None, retry_after=None, retryable=False):
+        super().__init__(msg)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable or status_code in RetryPolicy.RETRY_STATUSES
+
+
+def _parse_retry_after(value):
+    # Return seconds from Retry-After header value or None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            else:
+                if date is not None:
+                    now = datetime.datetime.now(tz=date.tzinfo)
+                    return max(0.0, (date - now).total_seconds())
+    return None
+
+
+class Timeouts:
+    """
+    How long requests may take
+
+    connect: Seconds to wait for a connection to be established
+    request: Seconds a request without files (e.g. getting the CSRF token or
+             creating the gallery) may take in total
+    upload: Seconds an upload may take in addition to the time it takes to
+            send the request body at `min_throughput`, not counting time spent
+            waiting for the session's RateLimiter
+    min_throughput: Bytes per second an upload must send at least; uploads
+                    that are slower over `stall_interval` seconds are aborted
+                    or None to never abort slow uploads; time spent waiting
+                    for the session's RateLimiter is not measured, so this
+                    doesn't need to account for the rate limit being shared
+                    between simultaneous uploads
+    stall_interval: Seconds over which upload throughput is measured
+
+    Timeouts and stalls are retried according to the session's RetryPolicy.
+    """
+
+    def __init__(self, connect=10, request=30, upload=60, min_throughput=10240,
+                 stall_interval=30):
+        for name, value in (('connect', connect), ('request', request),
+                            ('upload', upload), ('stall_interval', stall_interval)):
+            if not value > 0:
+                raise ValueError(f'Invalid {name}: {value!r}')
+        if min_throughput is not None and not min_throughput > 0:
+            raise ValueError(f'Invalid min_throughput: {min_throughput!r}')
+        self.connect = connect
+        self.request = request
+        self.upload = upload
+        self.min_throughput = min_throughput
+        self.stall_interval = stall_interval
+
+    def get_upload_timeout(self, size):
+        """Return seconds an upload of `size` bytes may take in total"""
+        if self.min_throughput is None:
+            return self.upload
+        return self.upload + size / self.min_throughput
+
+    def get_httpx_timeout(self, timeout=None):
+        """
+        Return httpx.Timeout with `connect` as connection timeout and `timeout`
+        (defaults to `request`) for everything else
+        """
+        return httpx.Timeout(timeout if timeout is not None else self.request, connect=self.connect)
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'connect={self.connect!r}, '
+            f'request={self.request!r}, '
+            f'upload={self.upload!r}, '
+            f'min_throughput={self.min_throughput!r}, '
+            f'stall_interval={self.stall_interval!r})'
+        )
+
+
+Attempt = collections.namedtuple(
+    'Attempt',
+    ('method', 'url', 'number', 'duration', 'error', 'delay'),
+)
+Attempt.__doc__ = """
+Result of a single request attempt
+
+method: HTTP method
+url: Request URL
+number: Attempt number, starting at 1
+duration: Seconds the attempt took
+error: Error message or None if the attempt succeeded
+delay: Seconds until the next attempt or None if there is no next attempt
+"""
+
+
+class RetryPolicy:
+    """
+    How often and how long to wait before failed requests are repeated
+
+    Connection errors, timeouts and the HTTP status codes in RETRY_STATUSES
+    are retried. Other errors (e.g. "413 File too large") are not.
+
+    max_attempts: Maximum number of attempts per request; 1 disables retrying
+    backoff: Seconds to wait before the second attempt; this is doubled for
+             every further attempt
+    max_delay: Maximum number of seconds to wait between attempts; if the
+               server's Retry-After header asks for a longer delay, the
+               request is not retried
+    jitter: Fraction of each delay that is randomized (0 to 1)
+    callback: Callable that is called with an Attempt instance after each
+              attempt or None
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts=1, backoff=0.5, max_delay=30, jitter=0.5,
+                 callback=None):
+        if not isinstance(max_attempts, int) or max_attempts < 1:
+            raise ValueError(f'Invalid max_attempts: {max_attempts!r}')
+        if not 0 <= jitter <= 1:
+            raise ValueError(f'Invalid jitter: {jitter!r}')
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.callback = callback
+
+    def get_delay(self, number, error):
+        """
+        Return seconds to wait before the next attempt or None to give up
+
+        number: Number of the failed attempt, starting at 1
+        error: ConnectionError with optional `retry_after` attribute
+        """
+        if number >= self.max_attempts:
+            return None
+
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            return retry_after
+
+        delay = min(self.backoff * (2 ** (number - 1)), self.max_delay)
+        return delay - (delay * self.jitter * random.random())
+
+    def report(self, attempt):
+        """Pass Attempt instance to `callback`"""
+        if self.callback is not None:
+            self.callback(attempt)
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'max_attempts={self.max_attempts!r}, '
+            f'backoff={self.backoff!r}, '
+            f'max_delay={self.max_delay!r}, '
+            f'jitter={self.jitter!r})'
+        )
@@ -0,0 +1,114 @@
+import collections
+import os
+import struct
+
+ImageInfo = collections.namedtuple('ImageInfo', ('type', 'width', 'height'))
+ImageInfo.__doc__ = """
+Information from the header of an image file
+
+type: "jpeg", "png" or "gif"
+width: Width in pixels
+height: Height in pixels
+"""
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_GIF_SIGNATURES = (b'GIF87a', b'GIF89a')
+_JPEG_SIGNATURE = b'\xff\xd8'
+
+# Start of frame markers contain the image dimensions (0xC4, 0xC8 and 0xCC
+# are other markers)
+_JPEG_SOF_MARKERS = frozenset((
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF,
+))
+# Markers without length and payload
+_JPEG_STANDALONE_MARKERS = frozenset((0x01, *range(0xD0, 0xD8)))
+# Start of scan and end of image; image data starts after SOS
+_JPEG_SOS_MARKERS = frozenset((0xDA, 0xD9))
+
+
+def sniff(fileobj):
+    """
+    Return ImageInfo from the header of a JPEG, PNG or GIF image
+
+    Only the header is read. Metadata in JPEG files (e.g. EXIF) is skipped
+    without reading it. The file position is restored.
+
+    Raise ValueError if the file is not a supported image or if its header is
+    invalid.
+    """
+    position = fileobj.tell()
+    try:
+        fileobj.seek(0)
+        head = fileobj.read(32)
+        if head.startswith(_PNG_SIGNATURE):
+            return _sniff_png(head)
+        elif head.startswith(_GIF_SIGNATURES):
+            return _sniff_gif(head)
+        elif head.startswith(_JPEG_SIGNATURE):
+            fileobj.seek(len(_JPEG_SIGNATURE))
+            return _sniff_jpeg(fileobj)
+        else:
+            raise ValueError('Unsupported file type')
+    finally:
+        fileobj.seek(position)
+
+
+def _sniff_png(head):
+    # The first chunk must be IHDR: length (4), type (4), width (4), height (4)
+    offset = len(_PNG_SIGNATURE)
+    if len(head) < offset + 16 or head[offset + 4:offset + 8] != b'IHDR':
+        raise ValueError('Invalid PNG header')
+    width, height = struct.unpack_from('>II', head, offset + 8)
+    return _make_info('png', width, height)
+
+
+def _sniff_gif(head):
+    # Logical screen width and height follow the signature
+    offset = len(_GIF_SIGNATURES[0])
+    if len(head) < offset + 4:
+        raise ValueError('Invalid GIF header')
+    width, height = struct.unpack_from('<HH', head, offset)
+    return _make_info('gif', width, height)
+
+
+def _sniff_jpeg(fileobj):
+    # Walk through the segments until we find a start of frame
+    while True:
+        byte = fileobj.read(1)
+        if byte != b'\xff':
+            raise ValueError('Invalid JPEG header')
+        # Any number of 0xFF bytes may precede a marker
+        while byte == b'\xff':
+            byte = fileobj.read(1)
+        if not byte:
+            raise ValueError('Invalid JPEG header')
+        marker = byte[0]
+
+        if marker in _JPEG_STANDALONE_MARKERS:
+            continue
+        elif marker in _JPEG_SOS_MARKERS:
+            raise ValueError('Invalid JPEG header')
+
+        data = fileobj.read(2)
+        if len(data) < 2:
+            raise ValueError('Invalid JPEG header')
+        length = struct.unpack('>H', data)[0]
+        if length < 2:
+            raise ValueError('Invalid JPEG header')
+
+        if marker in _JPEG_SOF_MARKERS:
+            # Precision (1), height (2), width (2)
+            data = fileobj.read(5)
+            if len(data) < 5:
+                raise ValueError('Invalid JPEG header')
+            _, height, width = struct.unpack('>BHH', data)
+            return _make_info('jpeg', width, height)
+        else:
+            fileobj.seek(length - 2, os.SEEK_CUR)
+
+
+def _make_info(type, width, height):
+    if width < 1 or height < 1:
+        raise ValueError(f'Invalid {type.upper()} dimensions: {width}x{height}')
+    return ImageInfo(type, width, height)
@@ -0,0 +1,106 @@
+import json
+import os
+
+from ._submission import Submission
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+
+class Journal:
+    """
+    Append-only record of a gallery and its successful uploads
+
+    The journal is a file with one JSON object per line. It stores the
+    gallery's token and every successful Submission together with the file
+    path and a hash of the file content. If the journal file already exists,
+    its records are loaded so a Gallery can continue where a previous run
+    stopped.
+
+    Incomplete or invalid lines (e.g. from a crash while writing) are ignored.
+
+    filepath: Path to journal file
+    """
+
+    def __init__(self, filepath):
+        self._filepath = filepath
+        self._file = None
+        self._gallery_token = {}
+        self._submissions = {}
+        self._read()
+
+    @property
+    def filepath(self):
+        """Path to journal file"""
+        return self._filepath
+
+    @property
+    def gallery_token(self):
+        """Gallery token from journal file or empty dictionary"""
+        return self._gallery_token
+
+    def get(self, filepath, content_hash):
+        """Return recorded Submission for `filepath` and `content_hash` or None"""
+        kwargs = self._submissions.get((filepath, content_hash))
+        if kwargs is not None:
+            return Submission(**kwargs)
+        return None
+
+    def add_gallery(self, gallery_token):
+        """Record gallery token"""
+        self._gallery_token = dict(gallery_token)
+        self._write({'type': 'gallery', 'token': self._gallery_token})
+
+    def add_submission(self, filepath, content_hash, submission):
+        """Record successful Submission"""
+        kwargs = {
+            key: submission[key]
+            for key in ('filepath', 'image_url', 'thumbnail_url', 'web_url', 'gallery_url', 'edit_url')
+        }
+        self._submissions[(filepath, content_hash)] = kwargs
+        self._write({
+            'type': 'submission',
+            'filepath': filepath,
+            'hash': content_hash,
+            'submission': kwargs,
+        })
+
+    def close(self):
+        """Close journal file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read(self):
+        try:
+            with open(self._filepath, 'r') as f:
+                for line in f:
+                    try:
+                        self._add_record(json.loads(line))
+                    except (ValueError, KeyError, TypeError) as e:
+                        log.debug('Ignoring invalid journal record: %r: %r', line, e)
+        except FileNotFoundError:
+            pass
+
+    def _add_record(self, record):
+        if record['type'] == 'gallery':
+            self._gallery_token = dict(record['token'])
+        elif record['type'] == 'submission':
+            self._submissions[(record['filepath'], record['hash'])] = dict(record['submission'])
+        else:
+            raise ValueError(f'Unknown record type: {record["type"]!r}')
+
+    def _write(self, record):
+        if self._file is None:
+            self._file = open(self._filepath, 'ab+')
+            # Don't append to incomplete last line
+            size = self._file.seek(0, os.SEEK_END)
+            if size > 0:
+                self._file.seek(size - 1)
+                if self._file.read(1) != b'\n':
+                    self._file.write(b'\n')
+        self._file.write(json.dumps(record).encode('utf-8') + b'\n')
+        self._file.flush()
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._filepath!r})'
@@ -0,0 +1,153 @@
+import mimetypes
+import os
+
+
+class MultipartStream:
+    """
+    Asynchronously iterable multipart/form-data request body
+
+    File contents are read in chunks while the body is sent, so memory usage
+    is bounded by `chunk_size`, not by file size. The size of the complete
+    body is known in advance. Files are rewound every time iteration starts,
+    so the same stream can be sent repeatedly.
+
+    data: Mapping or sequence of 2-tuples of form field names and values
+    files: Mapping or sequence of 2-tuples of form field names and file
+           tuples: (file name, file object) or (file name, file object,
+           content type)
+    chunk_size: Maximum number of bytes read from a file at once
+    callback: Callable that is called with the number of bytes sent and the
+              total number of bytes after each chunk or None
+    throttle: Coroutine function that is called with the size of each chunk
+              before it is sent or None
+    """
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, data={}, files={}, chunk_size=CHUNK_SIZE, callback=None, throttle=None):
+        self._boundary = os.urandom(16).hex()
+        self._chunk_size = chunk_size
+        self._callback = callback
+        self._throttle = throttle
+        self._parts = []
+        for name, value in _items(data):
+            self._parts.append((self._get_data_header(name), _to_bytes(value), None))
+        for name, filetuple in _items(files):
+            filename, fileobj, content_type = self._get_file_info(*filetuple)
+            self._parts.append((self._get_file_header(name, filename, content_type), None, fileobj))
+        self._footer = f'--{self._boundary}--\r\n'.encode('ascii')
+
+    @property
+    def boundary(self):
+        """Separator between form fields"""
+        return self._boundary
+
+    @property
+    def headers(self):
+        """Content-Type and Content-Length headers"""
+        return {
+            'Content-Type': f'multipart/form-data; boundary={self._boundary}',
+            'Content-Length': str(len(self)),
+        }
+
+    def __len__(self):
+        length = len(self._footer)
+        for header, value, fileobj in self._parts:
+            length += len(header) + 2  # + b'\r\n'
+            if value is not None:
+                length += len(value)
+            else:
+                length += _get_size(fileobj)
+        return length
+
+    async def __aiter__(self):
+        if self._callback is None:
+            async for chunk in self._iter_throttled_chunks():
+                yield chunk
+        else:
+            # The previous chunk was sent when the next one is requested
+            total = len(self)
+            sent = 0
+            self._callback(sent, total)
+            async for chunk in self._iter_throttled_chunks():
+                yield chunk
+                sent += len(chunk)
+                self._callback(sent, total)
+
+    async def _iter_throttled_chunks(self):
+        if self._throttle is None:
+            async for chunk in self._iter_chunks():
+                yield chunk
+        else:
+            async for chunk in self._iter_chunks():
+                await self._throttle(len(chunk))
+                yield chunk
+
+    async def _iter_chunks(self):
+        for header, value, fileobj in self._parts:
+            yield header
+            if value is not None:
+                yield value
+            else:
+                fileobj.seek(0)
+                chunk = fileobj.read(self._chunk_size)
+                while chunk:
+                    yield chunk
+                    chunk = fileobj.read(self._chunk_size)
+            yield b'\r\n'
+        yield self._footer
+
+    def _get_file_info(self, filename, fileobj, content_type=None):
+        if content_type is None:
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        return filename, fileobj, content_type
+
+    def _get_data_header(self, name):
+        return (
+            f'--{self._boundary}\r\n'
+            f'Content-Disposition: form-data; name="{_escape(name)}"\r\n'
+            '\r\n'
+        ).encode('utf-8')
+
+    def _get_file_header(self, name, filename, content_type):
+        return (
+            f'--{self._boundary}\r\n'
+            f'Content-Disposition: form-data; name="{_escape(name)}"; filename="{_escape(filename)}"\r\n'
+            f'Content-Type: {content_type}\r\n'
+            '\r\n'
+        ).encode('utf-8')
+
+
+def _items(mapping):
+    # Return (key, value) pairs from mapping or sequence of 2-tuples
+    if hasattr(mapping, 'items'):
+        return tuple(mapping.items())
+    else:
+        return tuple(mapping)
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    else:
+        return str(value).encode('utf-8')
+
+
+def _escape(value):
+    # Escape form field name or file name as browsers do (HTML5)
+    value = str(value).replace('\\', '\\\\').replace('"', '%22')
+    return ''.join(
+        f'%{ord(c):02X}' if ord(c) < 0x20 and c != '\x1b' else c
+        for c in value
+    )
+
+
+def _get_size(fileobj):
+    # Return number of bytes in file object
+    try:
+        return os.fstat(fileobj.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        position = fileobj.tell()
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(position)
+        return size
@@ -0,0 +1,98 @@
+import collections
+import time
+
+
+class Observer:
+    """
+    Receive timings of HTTP requests and gallery operations
+
+    Subclass this and pass an instance to Session to feed metrics into a
+    monitoring system. All methods do nothing by default. Without an
+    Observer, no timings are collected at all.
+
+    If `trace` is True, RequestTiming.phases contains the durations of
+    connection phases reported by httpcore. This adds a little overhead to
+    every request and relies on the "trace" request extension of httpcore
+    0.14 (httpx 0.21), which is the oldest httpx that setup.py allows.
+    """
+
+    trace = False
+
+    def request(self, timing):
+        """Called with a RequestTiming instance after each request attempt"""
+
+    def operation(self, operation):
+        """Called with an Operation instance after each gallery operation"""
+
+
+RequestTiming = collections.namedtuple(
+    'RequestTiming',
+    ('method', 'url', 'status_code', 'error', 'error_type',
+     'bytes_sent', 'bytes_received', 'duration', 'phases'),
+)
+RequestTiming.__doc__ = """
+Timing of a single request attempt
+
+method: HTTP method
+url: Request URL
+status_code: HTTP status code or None if there was no response
+error: Error message or None if the request succeeded
+error_type: Name of the exception class that caused the error (e.g.
+            "ConnectTimeout" or "HTTPStatusError") or None
+bytes_sent: Size of the request body
+bytes_received: Size of the response body as it was transferred
+duration: Seconds the request took
+phases: Dictionary that maps "connect" (DNS lookup and TCP handshake),
+        "tls", "send", "wait" (server processing) and "receive" to seconds;
+        empty unless Observer.trace is True, phases that didn't happen (e.g.
+        "connect" for a reused connection) are missing
+"""
+
+
+Operation = collections.namedtuple(
+    'Operation',
+    ('name', 'duration', 'error', 'filepaths', 'bytes_sent'),
+)
+Operation.__doc__ = """
+Timing of a gallery operation, including any repeated requests
+
+name: "csrf" (get CSRF token from landing page), "token" (create gallery)
+      or "upload" (upload one or more images)
+duration: Seconds the operation took
+error: Error message or None if the operation succeeded
+filepaths: Tuple of uploaded file paths (empty for other operations)
+bytes_sent: Size of the uploaded request body (0 for other operations)
+"""
+
+
+class _RequestStats:
+    # Collect information about a request attempt; instances are also
+    # httpcore trace callbacks
+
+    _PHASES = {
+        'connect_tcp': 'connect',
+        'start_tls': 'tls',
+        'send_request_headers': 'send',
+        'send_request_body': 'send',
+        'receive_response_headers': 'wait',
+        'receive_response_body': 'receive',
+    }
+
+    def __init__(self):
+        self.status_code = None
+        self.bytes_received = 0
+        self.phases = {}
+        self._started = {}
+
+    async def __call__(self, event_name, info):
+        # Event names look like "connection.connect_tcp.started" or
+        # "http11.receive_response_body.complete"
+        _, _, event = event_name.partition('.')
+        step, _, state = event.rpartition('.')
+        phase = self._PHASES.get(step)
+        if phase is not None:
+            if state == 'started':
+                self._started[step] = time.monotonic()
+            elif step in self._started:
+                duration = time.monotonic() - self._started.pop(step)
+                self.phases[phase] = self.phases.get(phase, 0.0) + duration
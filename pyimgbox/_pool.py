@@ -0,0 +1,136 @@
+import asyncio
+import collections
+
+from . import _utils
+
+
+class WorkerPool:
+    """
+    Call coroutine function on multiple items concurrently
+
+    func: Coroutine function that is called with each item
+    concurrency: Maximum number of concurrent calls; this can be changed while
+                 map() is running
+    """
+
+    def __init__(self, func, concurrency=1):
+        self._func = func
+        self.concurrency = concurrency
+
+    @property
+    def concurrency(self):
+        """Maximum number of concurrent calls"""
+        return self._concurrency
+
+    @concurrency.setter
+    def concurrency(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f'Invalid concurrency: {value!r}')
+        self._concurrency = value
+
+    async def map(self, items, ordered=False):
+        """
+        Call `func` on each item in `items`
+
+        items: Iterable or asynchronous iterable of arguments for `func`; items
+               are only requested when a call can be made immediately
+        ordered: Whether to yield return values in the same order as `items`
+                 or as soon as they are available
+
+        Exceptions from `func` are raised after all pending calls are
+        cancelled.
+
+        Yield return values of `func` asynchronously.
+        """
+        results = asyncio.Queue()
+        slots = _Slots(lambda: self.concurrency)
+        tasks = set()
+        feeder_done = object()
+
+        async def call(index, item):
+            try:
+                result = await self._func(item)
+            except Exception as e:
+                results.put_nowait((index, None, e))
+            else:
+                results.put_nowait((index, result, None))
+            finally:
+                slots.release()
+
+        async def feed():
+            count = 0
+            try:
+                await slots.acquire()
+                async for item in _utils.aiterate(items):
+                    task = asyncio.ensure_future(call(count, item))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    count += 1
+                    await slots.acquire()
+            except Exception as e:
+                results.put_nowait((feeder_done, count, e))
+            else:
+                results.put_nowait((feeder_done, count, None))
+
+        feeder = asyncio.ensure_future(feed())
+        try:
+            pending = {}
+            next_index = 0
+            received = 0
+            expected = None
+            while expected is None or received < expected:
+                index, result, exception = await results.get()
+                if exception is not None:
+                    raise exception
+                elif index is feeder_done:
+                    expected = result
+                    continue
+
+                received += 1
+                if not ordered:
+                    yield result
+                else:
+                    pending[index] = result
+                    while next_index in pending:
+                        yield pending.pop(next_index)
+                        next_index += 1
+        finally:
+            for task in (feeder, *tasks):
+                task.cancel()
+            await asyncio.gather(feeder, *tasks, return_exceptions=True)
+
+
+class _Slots:
+    # Like asyncio.Semaphore, but the number of slots is read from `get_limit`
+    # on every acquire() and release() so it can change at any time; running
+    # calls are not interrupted if the limit is lowered and waiters are only
+    # woken up by release() if it is raised
+
+    def __init__(self, get_limit):
+        self._get_limit = get_limit
+        self._used = 0
+        self._waiters = collections.deque()
+
+    async def acquire(self):
+        if not self._waiters and self._used < self._get_limit():
+            self._used += 1
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() takes the slot for us before waking us up
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        self._used -= 1
+        while self._waiters and self._used < self._get_limit():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._used += 1
+                waiter.set_result(None)
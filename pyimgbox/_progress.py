@@ -0,0 +1,134 @@
+import time
+
+
+class FileProgress:
+    """
+    Upload progress of a single file
+
+    filepath: Path to image file or tuple of paths if multiple files are
+              uploaded with one request
+    bytes_sent: Number of request body bytes sent so far
+    bytes_total: Size of the request body in bytes or None if not known yet
+    """
+
+    __slots__ = ('filepath', 'bytes_sent', 'bytes_total')
+
+    def __init__(self, filepath, bytes_sent=0, bytes_total=None):
+        self.filepath = filepath
+        self.bytes_sent = bytes_sent
+        self.bytes_total = bytes_total
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'filepath={self.filepath!r}, '
+            f'bytes_sent={self.bytes_sent!r}, '
+            f'bytes_total={self.bytes_total!r})'
+        )
+
+
+class Progress:
+    """
+    Upload progress of a gallery
+
+    Progress is updated for every chunk of every upload. `callback` is called
+    with this instance at most once every `interval` seconds and whenever an
+    upload is finished.
+
+    callback: Callable or None
+    interval: Minimum number of seconds between `callback` calls
+    """
+
+    def __init__(self, callback=None, interval=0.5):
+        self.callback = callback
+        self.interval = interval
+        self._files = {}
+        self._files_done = 0
+        self._bytes_done = 0
+        self._started = None
+        self._last_report = 0
+
+    @property
+    def files(self):
+        """Sequence of FileProgress instances of unfinished uploads"""
+        return tuple(self._files.values())
+
+    @property
+    def files_done(self):
+        """Number of finished uploads"""
+        return self._files_done
+
+    @property
+    def bytes_sent(self):
+        """Number of bytes sent by all uploads"""
+        return self._bytes_done + sum(f.bytes_sent for f in self._files.values())
+
+    @property
+    def bytes_total(self):
+        """Number of bytes of all started uploads"""
+        return self._bytes_done + sum(f.bytes_total or 0 for f in self._files.values())
+
+    @property
+    def elapsed(self):
+        """Seconds since the first upload started"""
+        if self._started is None:
+            return 0.0
+        else:
+            return time.monotonic() - self._started
+
+    @property
+    def rate(self):
+        """Average number of bytes sent per second"""
+        elapsed = self.elapsed
+        if elapsed > 0:
+            return self.bytes_sent / elapsed
+        else:
+            return 0.0
+
+    @property
+    def eta(self):
+        """
+        Estimated seconds until all started uploads are finished or None
+
+        Uploads that haven't started yet are unknown and not included.
+        """
+        rate = self.rate
+        if rate > 0:
+            return max(0.0, (self.bytes_total - self.bytes_sent) / rate)
+        else:
+            return None
+
+    def start(self, filepath):
+        """Return new FileProgress for `filepath`"""
+        if self._started is None:
+            self._started = time.monotonic()
+        file = FileProgress(filepath)
+        self._files[id(file)] = file
+        return file
+
+    def update(self, file, bytes_sent, bytes_total):
+        """Set bytes sent and total bytes of FileProgress `file`"""
+        file.bytes_sent = bytes_sent
+        file.bytes_total = bytes_total
+        if self.callback is not None:
+            now = time.monotonic()
+            if now - self._last_report >= self.interval:
+                self._last_report = now
+                self.callback(self)
+
+    def finish(self, file):
+        """Mark FileProgress `file` as finished"""
+        if self._files.pop(id(file), None) is not None:
+            self._files_done += 1
+            self._bytes_done += file.bytes_sent
+            if self.callback is not None:
+                self._last_report = time.monotonic()
+                self.callback(self)
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'files_done={self.files_done!r}, '
+            f'bytes_sent={self.bytes_sent!r}, '
+            f'bytes_total={self.bytes_total!r})'
+        )
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+
+class RateLimiter:
+    """
+    Limit the number of requests and bytes sent per second
+
+    A RateLimiter is shared by all galleries that use the same Session.
+
+    Both limits are token buckets: Short bursts of up to `burst` seconds worth
+    of requests or bytes are sent immediately, after that requests and
+    uploads wait until they are allowed.
+
+    In adaptive mode, both rates are cut by `decrease` (multiplicative
+    decrease) whenever a request fails in a way that suggests the server is
+    overloaded (timeouts, connection errors, 429 and 5xx responses) or when it
+    takes longer than `max_latency` seconds. Every successful request raises
+    the rates by `increase` times the configured rate (additive increase) up
+    to the configured rate. Rates are never reduced below `min_fraction` of
+    the configured rate.
+
+    requests_per_second: Maximum number of requests per second or None
+    bytes_per_second: Maximum number of uploaded bytes per second or None
+    burst: Number of seconds worth of requests or bytes that may be sent
+           without waiting
+    adaptive: Whether to adjust rates to errors and latency
+    increase: Fraction of the configured rates that is added after each
+              successful request in adaptive mode
+    decrease: Factor rates are multiplied with after a failed or slow request
+              in adaptive mode
+    min_fraction: Lowest fraction of the configured rates in adaptive mode
+    max_latency: Number of seconds after which a successful request is
+                 considered slow or None
+    """
+
+    # Rates are not decreased more than once in this many seconds so that
+    # a group of simultaneously failing requests counts as one failure
+    DECREASE_INTERVAL = 1.0
+
+    def __init__(self, requests_per_second=None, bytes_per_second=None, burst=1.0,
+                 adaptive=False, increase=0.05, decrease=0.5, min_fraction=0.1,
+                 max_latency=None):
+        for name, value in (('requests_per_second', requests_per_second),
+                            ('bytes_per_second', bytes_per_second)):
+            if value is not None and not value > 0:
+                raise ValueError(f'Invalid {name}: {value!r}')
+        if not burst > 0:
+            raise ValueError(f'Invalid burst: {burst!r}')
+        if not 0 < increase <= 1:
+            raise ValueError(f'Invalid increase: {increase!r}')
+        if not 0 < decrease < 1:
+            raise ValueError(f'Invalid decrease: {decrease!r}')
+        if not 0 < min_fraction <= 1:
+            raise ValueError(f'Invalid min_fraction: {min_fraction!r}')
+
+        self._requests_per_second = requests_per_second
+        self._bytes_per_second = bytes_per_second
+        self.adaptive = adaptive
+        self.increase = increase
+        self.decrease = decrease
+        self.min_fraction = min_fraction
+        self.max_latency = max_latency
+        self._fraction = 1.0
+        self._last_decrease = None
+        self._requests = (
+            _TokenBucket(requests_per_second, capacity=max(1, requests_per_second * burst))
+            if requests_per_second is not None else None
+        )
+        self._bytes = (
+            _TokenBucket(bytes_per_second, capacity=bytes_per_second * burst)
+            if bytes_per_second is not None else None
+        )
+
+    @property
+    def requests_per_second(self):
+        """Current maximum number of requests per second or None"""
+        if self._requests is not None:
+            return self._requests.rate
+        return None
+
+    @property
+    def bytes_per_second(self):
+        """Current maximum number of uploaded bytes per second or None"""
+        if self._bytes is not None:
+            return self._bytes.rate
+        return None
+
+    @property
+    def fraction(self):
+        """Fraction of the configured rates that is currently allowed"""
+        return self._fraction
+
+    async def request(self):
+        """Wait until another request may be sent"""
+        if self._requests is not None:
+            await self._requests.acquire(1)
+
+    async def send(self, nbytes):
+        """Wait until `nbytes` more bytes may be uploaded"""
+        if self._bytes is not None:
+            await self._bytes.acquire(nbytes)
+
+    def report(self, duration, error=None):
+        """
+        Adjust rates to the result of a request in adaptive mode
+
+        duration: Number of seconds the request took
+        error: ConnectionError with optional `retryable` attribute or None if
+               the request succeeded
+        """
+        if not self.adaptive:
+            return
+
+        if error is not None:
+            # Only errors that may go away if we slow down are relevant
+            if getattr(error, 'retryable', False):
+                self._slow_down(f'Request failed: {error}')
+        elif self.max_latency is not None and duration > self.max_latency:
+            self._slow_down(f'Request took {duration:.3f} seconds')
+        else:
+            self._set_fraction(self._fraction + self.increase)
+
+    def _slow_down(self, reason):
+        now = time.monotonic()
+        if self._last_decrease is None or now - self._last_decrease >= self.DECREASE_INTERVAL:
+            self._last_decrease = now
+            self._set_fraction(self._fraction * self.decrease)
+            log.debug('Reducing rate limit to %.0f %%: %s', self._fraction * 100, reason)
+
+    def _set_fraction(self, fraction):
+        self._fraction = min(1.0, max(self.min_fraction, fraction))
+        if self._requests is not None:
+            self._requests.rate = self._requests_per_second * self._fraction
+        if self._bytes is not None:
+            self._bytes.rate = self._bytes_per_second * self._fraction
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'requests_per_second={self._requests_per_second!r}, '
+            f'bytes_per_second={self._bytes_per_second!r}, '
+            f'adaptive={self.adaptive!r})'
+        )
+
+
+class _TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self, amount):
+        # Take tokens immediately and wait until the bucket is no longer in
+        # debt; later callers queue up behind earlier ones, and amounts larger
+        # than the capacity are possible
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= amount
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
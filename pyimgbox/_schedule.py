@@ -0,0 +1,51 @@
+import os
+
+POLICIES = ('largest-first', 'smallest-first', 'balanced')
+
+
+def schedule(filepaths, policy):
+    """
+    Return indexes of `filepaths` in the order they should be uploaded
+
+    policy: "largest-first" to start large files early so that no upload is
+            still running long after all others are finished,
+            "smallest-first" to get as many results as soon as possible or
+            "balanced" to alternate between the largest and the smallest
+            remaining file so that large files start early while small files
+            keep producing results
+
+    Files that can't be accessed have a size of 0. Files with the same size
+    keep their relative order, so the result only depends on `filepaths` and
+    their sizes.
+
+    Raise ValueError if `policy` is unknown.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f'Invalid schedule: {policy!r}')
+
+    sizes = [_get_size(filepath) for filepath in filepaths]
+    if policy == 'smallest-first':
+        return sorted(range(len(sizes)), key=lambda i: (sizes[i], i))
+
+    largest_first = sorted(range(len(sizes)), key=lambda i: (-sizes[i], i))
+    if policy == 'largest-first':
+        return largest_first
+
+    # Take from both ends of the largest-first order
+    indexes = []
+    head, tail = 0, len(largest_first) - 1
+    while head <= tail:
+        indexes.append(largest_first[head])
+        head += 1
+        if head <= tail:
+            indexes.append(largest_first[tail])
+            tail -= 1
+    return indexes
+
+
+def _get_size(filepath):
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        # _prepare() reports the error
+        return 0
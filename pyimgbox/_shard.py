@@ -0,0 +1,298 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+from . import _const, _http, _pool, _tokencache, _utils
+from ._gallery import Gallery
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+
+class ShardedGallery:
+    """
+    Upload images to one gallery with multiple processes
+
+    The gallery is created by this process. Image files are split into chunks
+    that are uploaded by worker processes. Each worker process has its own
+    event loop and connection pool and uses the gallery token, CSRF token and
+    cookies from this process.
+
+    title, thumb_width, square_thumbs, adult, comments_enabled: See Gallery
+    processes: Number of worker processes or None to use the number of CPUs
+    concurrency: Maximum number of simultaneous uploads per worker process
+    chunk_size: Number of files that are sent to a worker process at once
+    session: Session instance that is used to create the gallery or None;
+             worker processes make their own sessions with the same
+             connection limits, RetryPolicy (without callback) and Timeouts
+    executor: concurrent.futures.Executor instance or None to use a private
+              ProcessPoolExecutor with `processes` workers that is shut
+              down by close()
+
+    >>> async with pyimgbox.ShardedGallery(title="Archive", processes=4) as gallery:
+    >>>     async for submission in gallery.add(filepaths):
+    >>>         print(submission)
+    """
+
+    def __init__(self, title=None, thumb_width=100, square_thumbs=False,
+                 adult=False, comments_enabled=False, processes=None,
+                 concurrency=1, chunk_size=50, session=None, executor=None):
+        self._gallery = Gallery(
+            title=title,
+            thumb_width=thumb_width,
+            square_thumbs=square_thumbs,
+            adult=adult,
+            comments_enabled=comments_enabled,
+            session=session,
+        )
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self._id = os.urandom(8).hex()
+        self._used_workers = False
+        if executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.processes)
+            self._owns_executor = True
+        else:
+            self._executor = executor
+            self._owns_executor = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close gallery and shut down private worker processes
+
+        Workers in a shared executor are asked to close their connections and
+        event loop, but this is best effort: the executor decides which worker
+        runs each request, so some workers may keep their connections and
+        event loop open until they get a chunk from another ShardedGallery or
+        the executor is shut down.
+        """
+        await self._gallery.close()
+        if self._used_workers:
+            await self._close_workers()
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def _close_workers(self):
+        # The executor doesn't let us address each worker, so we submit one
+        # call per worker and hope they are distributed evenly; workers that
+        # are missed are closed when they get a chunk from another
+        # ShardedGallery (see _get_worker()) or when their process ends
+        # (atexit handlers don't run in forked worker processes)
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _close_worker, self._id)
+            for _ in range(self.processes)
+        ))
+
+    @property
+    def gallery(self):
+        """Gallery instance that creates the gallery in this process"""
+        return self._gallery
+
+    @property
+    def processes(self):
+        """Maximum number of chunks that are uploaded simultaneously"""
+        return self._processes
+
+    @processes.setter
+    def processes(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f'Invalid processes: {value!r}')
+        self._processes = value
+
+    @property
+    def concurrency(self):
+        """Maximum number of simultaneous uploads per worker process"""
+        return self._gallery.concurrency
+
+    @concurrency.setter
+    def concurrency(self, value):
+        self._gallery.concurrency = value
+
+    @property
+    def chunk_size(self):
+        """Number of files that are sent to a worker process at once"""
+        return self._chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f'Invalid chunk_size: {value!r}')
+        self._chunk_size = value
+
+    @property
+    def url(self):
+        """URL to gallery of thumbnails or None before create() was called"""
+        return self._gallery.url
+
+    @property
+    def edit_url(self):
+        """URL to manage gallery or None before create() was called"""
+        return self._gallery.edit_url
+
+    @property
+    def created(self):
+        """Whether this gallery was created remotely"""
+        return self._gallery.created
+
+    async def create(self):
+        """See Gallery.create()"""
+        await self._gallery.create()
+
+    def _get_worker_config(self):
+        # Everything a worker process needs to upload to our gallery
+        gallery = self._gallery
+        return {
+            'id': self._id,
+            'gallery': {
+                'thumb_width': gallery.thumb_width,
+                'square_thumbs': gallery.square_thumbs,
+                'adult': gallery.adult,
+                'comments_enabled': gallery.comments_enabled,
+                'concurrency': gallery.concurrency,
+            },
+            'gallery_token': dict(gallery._gallery_token),
+            'csrf_token': gallery._client.headers[_const.CSRF_TOKEN_HEADER],
+            'cookies': gallery._client.cookies,
+            'session': _get_session_config(gallery._client.session),
+        }
+
+    async def add(self, filepaths):
+        """
+        Upload images to this gallery with multiple processes
+
+        filepaths: Iterable or asynchronous iterable of paths to JPEG or PNG
+                   files
+
+        The gallery is created first if necessary.
+
+        Yield Submission objects asynchronously in the same order as
+        `filepaths`.
+        """
+        if not self.created:
+            await self.create()
+
+        config = self._get_worker_config()
+        loop = asyncio.get_event_loop()
+        self._used_workers = True
+
+        async def upload_chunk(chunk):
+            return await loop.run_in_executor(self._executor, _upload_chunk, config, chunk)
+
+        pool = _pool.WorkerPool(func=upload_chunk, concurrency=self.processes)
+        chunks = _chunk(filepaths, self.chunk_size)
+        async for submissions in pool.map(chunks, ordered=True):
+            for submission in submissions:
+                yield submission
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}('
+            f'title={repr(self._gallery.title)}, '
+            f'processes={repr(self.processes)}, '
+            f'concurrency={repr(self.concurrency)}, '
+            f'chunk_size={repr(self.chunk_size)})'
+        )
+
+
+def _get_session_config(session):
+    # Picklable Session arguments for worker processes; the retry callback,
+    # rate limit, observer and transport only work in this process
+    retry = session.retry
+    return {
+        **session._options,
+        'retry': _http.RetryPolicy(
+            max_attempts=retry.max_attempts,
+            backoff=retry.backoff,
+            max_delay=retry.max_delay,
+            jitter=retry.jitter,
+        ),
+        'timeouts': session.timeouts,
+    }
+
+
+async def _chunk(filepaths, size):
+    # Group file paths into lists of `size` items
+    chunk = []
+    async for filepath in _utils.aiterate(filepaths):
+        chunk.append(filepath)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Worker processes keep their event loop and connection pool between chunks
+# of the same ShardedGallery. Only one worker is kept at a time, so a chunk
+# from another ShardedGallery closes the previous worker. Workers are per
+# thread in case the executor is a ThreadPoolExecutor.
+_workers = threading.local()
+
+
+def _upload_chunk(config, filepaths):
+    # Called in worker process
+    return _get_worker(config).upload(filepaths)
+
+
+def _get_worker(config):
+    worker = getattr(_workers, 'worker', None)
+    if worker is not None and worker.id != config['id']:
+        worker.close()
+        worker = None
+    if worker is None:
+        worker = _workers.worker = _Worker(config)
+    return worker
+
+
+def _close_worker(id):
+    # Called in worker process by ShardedGallery.close()
+    worker = getattr(_workers, 'worker', None)
+    if worker is not None and worker.id == id:
+        worker.close()
+        _workers.worker = None
+
+
+class _Worker:
+    def __init__(self, config):
+        self.id = config['id']
+        self._loop = asyncio.new_event_loop()
+        self._gallery = self._loop.run_until_complete(self._make_gallery(config))
+
+    def close(self):
+        log.debug('Closing worker in process %d', os.getpid())
+        try:
+            self._loop.run_until_complete(self._close())
+        finally:
+            self._loop.close()
+
+    async def _close(self):
+        await self._gallery.close()
+        await self._gallery._client.session.close()
+
+    async def _make_gallery(self, config):
+        token_cache = _tokencache.TokenCache()
+        token_cache.set(config['csrf_token'], config['cookies'])
+        session = _http.Session(token_cache=token_cache, **config['session'])
+        gallery = Gallery(session=session, **config['gallery'])
+        # Gallery.create() reattaches to the existing gallery
+        gallery._gallery_token = dict(config['gallery_token'])
+        return gallery
+
+    def upload(self, filepaths):
+        return self._loop.run_until_complete(self._upload(filepaths))
+
+    async def _upload(self, filepaths):
+        log.debug('Uploading %d files in process %d', len(filepaths), os.getpid())
+        return [
+            submission
+            async for submission in self._gallery.add(filepaths, ordered=True)
+        ]
@@ -0,0 +1,146 @@
+import asyncio
+import concurrent.futures
+import importlib
+import importlib.util
+import io
+import math
+
+from . import _const
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+
+class Shrinker:
+    """
+    Recompress or downscale images that are too large to upload
+
+    JPEG images are recompressed with decreasing quality first. If that is not
+    enough (or for PNG and GIF images), the image is downscaled until it fits.
+    Animated images are not supported.
+
+    Images are encoded by worker processes so that uploads are not blocked by
+    encoding. The result is kept in memory; no temporary files are written.
+
+    This requires Pillow (pip install pyimgbox[shrink]).
+
+    max_size: Maximum size of the encoded image in bytes
+    qualities: JPEG quality values that are tried in order before the image is
+               downscaled
+    processes: Number of worker processes or None to use the number of CPUs
+    executor: concurrent.futures.Executor instance or None to use a private
+              ProcessPoolExecutor with `processes` workers that is shut
+              down by close()
+
+    Raise ImportError if Pillow is not installed.
+    """
+
+    def __init__(self, max_size=_const.MAX_FILE_SIZE, qualities=(90, 80, 70),
+                 processes=None, executor=None):
+        if importlib.util.find_spec('PIL') is None:
+            raise ImportError('Pillow is required to shrink images: pip install pyimgbox[shrink]')
+        self.max_size = max_size
+        self.qualities = qualities
+        if executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+            self._owns_executor = True
+        else:
+            self._executor = executor
+            self._owns_executor = False
+
+    def close(self):
+        """Shut down private worker processes"""
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    @property
+    def max_size(self):
+        """Maximum size of the encoded image in bytes"""
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f'Invalid max_size: {value!r}')
+        self._max_size = value
+
+    @property
+    def qualities(self):
+        """JPEG quality values that are tried before the image is downscaled"""
+        return self._qualities
+
+    @qualities.setter
+    def qualities(self, value):
+        qualities = tuple(value)
+        for quality in qualities:
+            if not isinstance(quality, int) or not 1 <= quality <= 95:
+                raise ValueError(f'Invalid quality: {quality!r}')
+        self._qualities = qualities
+
+    async def shrink(self, filepath):
+        """
+        Return image data from `filepath` in the same format with a size of
+        no more than `max_size` bytes
+
+        Raise ValueError if the image can't be shrunk.
+
+        Raise OSError if the file can't be read.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, shrink, filepath, self.max_size, self.qualities,
+        )
+
+
+def shrink(filepath, max_size, qualities=()):
+    # Synchronous implementation of Shrinker.shrink() that runs in a worker
+    # process
+    Image = importlib.import_module('PIL.Image')
+    with Image.open(filepath) as image:
+        if getattr(image, 'is_animated', False):
+            raise ValueError("Animated images can't be shrunk")
+        format = image.format
+        if format not in ('JPEG', 'PNG', 'GIF'):
+            raise ValueError(f'Unsupported file type: {format}')
+        image.load()
+
+        options = {'optimize': True}
+        for key in ('exif', 'icc_profile'):
+            if image.info.get(key):
+                options[key] = image.info[key]
+
+        # Lower JPEG quality first; this keeps the dimensions
+        data = None
+        for quality in (qualities if format == 'JPEG' else ()):
+            data = _encode(image, format, quality=quality, **options)
+            log.debug('Encoded %s with quality %d: %d bytes', filepath, quality, len(data))
+            if len(data) <= max_size:
+                return data
+        if format == 'JPEG' and qualities:
+            options['quality'] = qualities[-1]
+        if data is None:
+            data = _encode(image, format, **options)
+            if len(data) <= max_size:
+                return data
+
+        # Scale down by the square root of the size ratio (size is roughly
+        # proportional to the number of pixels) with some slack because the
+        # estimate is rarely accurate
+        width, height = image.size
+        for _ in range(10):
+            scale = math.sqrt(max_size / len(data)) * 0.95
+            width, height = int(width * scale), int(height * scale)
+            if width < 1 or height < 1:
+                break
+            data = _encode(image.resize((width, height), Image.LANCZOS), format, **options)
+            log.debug('Encoded %s with %dx%d pixels: %d bytes', filepath, width, height, len(data))
+            if len(data) <= max_size:
+                return data
+
+    raise ValueError(f'Unable to shrink image to {max_size} bytes')
+
+
+def _encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
@@ -1,4 +1,5 @@
 import os
+import sys
 
 
 class Submission(dict):
@@ -14,40 +15,45 @@ class Submission(dict):
     web_url: URL to image's web page or None
     gallery_url: URL to web page of thumbnails or None
     edit_url: URL to manage gallery or None
+    cached: True if the image was not uploaded because it was uploaded before
+            (see DedupCache), False otherwise
 
     "success" is derived from "error".
     "filename" is derived from "filepath".
 
     All keys are also available as attributes for convenience.
+
+    "gallery_url" and "edit_url" are interned so that all submissions for the
+    same gallery share them.
     """
 
-    def __init__(self, **kwargs):
-        values = {
-            'success': None,
-            'error': None,
-            'filepath': None,
-            'filename': None,
-            'image_url': None,
-            'thumbnail_url': None,
-            'web_url': None,
-            'gallery_url': None,
-            'edit_url': None,
-        }
-        for k in kwargs:
-            assert k in values, f'Unknown key: {k!r}'
-
-        if not kwargs.get('error'):
-            for k in ('filepath', 'image_url', 'thumbnail_url',
-                      'web_url', 'gallery_url', 'edit_url'):
-                assert k in kwargs, f'Missing key: {k!r}'
-
-        values.update(kwargs)
-
-        if values.get('filepath'):
-            values['filename'] = os.path.basename(values['filepath'])
-        values['success'] = not bool(values.get('error'))
-
-        super().__init__(values)
+    # No instance __dict__ in addition to the dictionary itself
+    __slots__ = ()
+
+    _REQUIRED_KEYS = ('filepath', 'image_url', 'thumbnail_url', 'web_url', 'gallery_url', 'edit_url')
+
+    def __init__(self, *, error=None, filepath=None, image_url=None, thumbnail_url=None,
+                 web_url=None, gallery_url=None, edit_url=None, cached=False,
+                 success=None, filename=None):
+        # "success" and "filename" are accepted for compatibility with
+        # Submission(**submission) but ignored because they are derived
+        if not error and None in (filepath, image_url, thumbnail_url, web_url, gallery_url, edit_url):
+            for k, v in zip(self._REQUIRED_KEYS, (filepath, image_url, thumbnail_url,
+                                                  web_url, gallery_url, edit_url)):
+                assert v is not None, f'Missing key: {k!r}'
+
+        super().__init__(
+            success=not bool(error),
+            error=error,
+            filepath=filepath,
+            filename=os.path.basename(filepath) if filepath else None,
+            image_url=image_url,
+            thumbnail_url=thumbnail_url,
+            web_url=web_url,
+            gallery_url=sys.intern(gallery_url) if gallery_url is not None else None,
+            edit_url=sys.intern(edit_url) if edit_url is not None else None,
+            cached=cached,
+        )
 
     def __getattr__(self, name):
         try:
@@ -55,8 +61,16 @@ class Submission(dict):
         except KeyError:
             raise AttributeError(f'{type(self).__name__} object has no attribute {name!r}')
 
+    def __reduce__(self):
+        # Don't pickle/unpickle shared URLs as separate strings
+        return (_unpickle, (dict(self),))
+
     def __repr__(self):
         kwargs = ', '.join(f'{k}={v!r}'
                            for k,v in self.items()
                            if v is not None)
         return f'{type(self).__name__}({kwargs})'
+
+
+def _unpickle(values):
+    return Submission(**values)
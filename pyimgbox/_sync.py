@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+from ._gallery import Gallery
+
+
+class SyncGallery:
+    """
+    Blocking interface to Gallery
+
+    All arguments are passed to Gallery. The Gallery lives in an event loop
+    that runs in a background thread, so connections are reused between
+    calls. close() stops the thread.
+
+    Attributes of the Gallery (e.g. `url`) are also available as attributes of
+    this object. Use the `gallery` property to change them.
+
+    >>> with pyimgbox.SyncGallery(title="Hello, World!") as gallery:
+    >>>     for submission in gallery.add(["foo.jpg", "bar.jpg"]):
+    >>>         print(submission)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name=f'{type(self).__name__}-{id(self)}',
+            daemon=True,
+        )
+        self._thread.start()
+        self._closed = False
+        try:
+            self._gallery = self._run(self._make_gallery(*args, **kwargs))
+        except BaseException:
+            self._stop()
+            raise
+
+    async def _make_gallery(self, *args, **kwargs):
+        # Make sure the Gallery is created in our event loop
+        return Gallery(*args, **kwargs)
+
+    def _run(self, coro):
+        # Run coroutine in background thread and return its return value
+        if self._closed:
+            coro.close()
+            raise RuntimeError(f'{type(self).__name__} is closed')
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result()
+        except BaseException:
+            # Cancel coroutine, e.g. on KeyboardInterrupt
+            future.cancel()
+            raise
+
+    @property
+    def gallery(self):
+        """Wrapped Gallery instance"""
+        return self._gallery
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(f'{type(self).__name__} object has no attribute {name!r}')
+        return getattr(self._gallery, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Close Gallery and stop background thread"""
+        if not self._closed:
+            try:
+                self._run(self._gallery.close())
+            finally:
+                self._stop()
+
+    def _stop(self):
+        self._closed = True
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def create(self):
+        """Blocking version of Gallery.create()"""
+        return self._run(self._gallery.create())
+
+    def upload(self, filepath):
+        """Blocking version of Gallery.upload()"""
+        return self._run(self._gallery.upload(filepath))
+
+    def drain(self, timeout=None):
+        """
+        Blocking version of Gallery.drain()
+
+        This may be called from another thread while add() or upload() is
+        running.
+        """
+        return self._run(self._gallery.drain(timeout))
+
+    def cancel(self):
+        """
+        Blocking version of Gallery.cancel()
+
+        This may be called from another thread while add() or upload() is
+        running.
+        """
+        return self._run(self._gallery.cancel())
+
+    def add(self, filepaths, **kwargs):
+        """
+        Blocking version of Gallery.add()
+
+        Yield Submission objects.
+        """
+        submissions = self._gallery.add(filepaths, **kwargs)
+        try:
+            while True:
+                try:
+                    yield self._run(_anext(submissions))
+                except StopAsyncIteration:
+                    break
+        finally:
+            if not self._closed:
+                self._run(submissions.aclose())
+
+    def __repr__(self):
+        return repr(self._gallery).replace(type(self._gallery).__name__, type(self).__name__, 1)
+
+
+async def _anext(iterator):
+    return await iterator.__anext__()
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+import logging  # isort:skip
+log = logging.getLogger('pyimgbox')
+
+
+class TokenCache:
+    """
+    Cache of the CSRF token and session cookies that are needed to create
+    galleries
+
+    Galleries that find a valid token in the cache don't need to request the
+    landing page of imgbox.com before creating the gallery.
+
+    filepath: Path to JSON file that keeps the token between processes or
+              None to keep the token in memory only
+    ttl: Number of seconds a token is valid
+    """
+
+    def __init__(self, filepath=None, ttl=3600):
+        self._filepath = filepath
+        self._ttl = ttl
+        self._entry = None
+
+    @property
+    def filepath(self):
+        """Path to JSON file or None"""
+        return self._filepath
+
+    @property
+    def ttl(self):
+        """Number of seconds a token is valid"""
+        return self._ttl
+
+    def get(self):
+        """
+        Return dictionary with the keys "csrf_token" and "cookies" or None if
+        there is no valid token
+
+        "cookies" is a list of dictionaries with the keys "name", "value",
+        "domain" and "path".
+        """
+        if self._entry is None and self._filepath:
+            self._entry = self._read()
+
+        if self._entry is not None:
+            age = time.time() - self._entry['timestamp']
+            if 0 <= age < self._ttl:
+                return {
+                    'csrf_token': self._entry['csrf_token'],
+                    'cookies': self._entry['cookies'],
+                }
+            else:
+                log.debug('Cached CSRF token expired')
+                self.invalidate()
+        return None
+
+    def set(self, csrf_token, cookies=()):
+        """Store CSRF token and list of cookie dictionaries"""
+        self._entry = {
+            'csrf_token': str(csrf_token),
+            'cookies': [dict(cookie) for cookie in cookies],
+            'timestamp': time.time(),
+        }
+        if self._filepath:
+            self._write(self._entry)
+
+    def invalidate(self):
+        """Forget stored token, e.g. because the server rejected it"""
+        self._entry = None
+        if self._filepath:
+            try:
+                os.remove(self._filepath)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.debug('Failed to remove %s: %s', self._filepath, e)
+
+    def _read(self):
+        try:
+            with open(self._filepath, 'r') as f:
+                entry = json.load(f)
+            if not isinstance(entry, dict):
+                raise ValueError(f'Not a dict: {entry!r}')
+            return {
+                'csrf_token': str(entry['csrf_token']),
+                'cookies': [dict(cookie) for cookie in entry['cookies']],
+                'timestamp': float(entry['timestamp']),
+            }
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug('Ignoring invalid token cache %s: %s', self._filepath, e)
+        return None
+
+    def _write(self, entry):
+        # Write to temporary file first so readers never see a partial file
+        tmp_filepath = f'{self._filepath}.{os.getpid()}.tmp'
+        try:
+            fd = os.open(tmp_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_filepath, self._filepath)
+        except OSError as e:
+            log.debug('Failed to write token cache %s: %s', self._filepath, e)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(filepath={self._filepath!r}, ttl={self._ttl!r})'
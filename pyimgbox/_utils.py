@@ -1,3 +1,52 @@
+import hashlib
+import importlib
+
+
 def find_closest_number(n, ns):
     # Return the number from `ns` that is closest to `n`
     return min(ns, key=lambda x: abs(x - n))
+
+
+def get_content_hash(fileobj, chunk_size=65536):
+    # Return hex digest of file object's content and rewind it
+    fileobj.seek(0)
+    h = hashlib.blake2b(digest_size=20)
+    chunk = fileobj.read(chunk_size)
+    while chunk:
+        h.update(chunk)
+        chunk = fileobj.read(chunk_size)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+async def aiterate(iterable, stop=None):
+    # Yield items from synchronous or asynchronous iterable; if `stop` is
+    # given, no more items are requested as soon as it returns True
+    if hasattr(iterable, '__aiter__'):
+        iterator = iterable.__aiter__()
+    else:
+        iterator = _aiter(iterable)
+    while stop is None or not stop():
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        yield item
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+class LazyModule:
+    # Import module on first attribute access
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._name!r})'
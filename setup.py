@@ -32,9 +32,13 @@ setuptools.setup(
         'Topic :: Software Development :: Libraries',
         'Intended Audience :: Developers',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=[
-        'httpx==0.*,>=0.16.0',
+        'httpx==0.*,>=0.21.0',
         'beautifulsoup4',
     ],
+    extras_require={
+        'http2': ['httpx[http2]'],
+        'shrink': ['Pillow'],
+    },
 )
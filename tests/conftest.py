@@ -0,0 +1,34 @@
+import os
+from unittest.mock import Mock
+
+import pytest
+
+from pyimgbox import Submission
+
+# Smallest file header that passes the image check (1x1 PNG)
+IMAGE_HEADER = b'\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR\x00\x00\x00\x01\x00\x00\x00\x01'
+
+
+# Python 3.7 doesn't have AsyncMock
+class AsyncMock(Mock):
+    def __call__(self, *args, **kwargs):
+        async def coro(_sup=super()):
+            return _sup.__call__(*args, **kwargs)
+        return coro()
+
+
+@pytest.fixture
+def make_submission():
+    """Return a factory for successful Submissions with placeholder URLs"""
+    def make_submission(filepath='path/to/Foo.jpg', **kwargs):
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        return Submission(**{
+            'filepath': filepath,
+            'image_url': f'https://foo/{name}.jpg',
+            'thumbnail_url': f'https://foo/{name}_t.jpg',
+            'web_url': f'https://foo/{name}',
+            'gallery_url': 'https://foo/gallery',
+            'edit_url': 'https://foo/gallery/edit',
+            **kwargs,
+        })
+    return make_submission
@@ -0,0 +1,96 @@
+import pytest
+
+from pyimgbox import Autotuner
+
+
+@pytest.fixture
+def clock(mocker):
+    now = [0.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    return now
+
+
+def run_window(tuner, clock, seconds, bytes_sent, error=None, duration=0.1):
+    # Report as many uploads as the current window needs
+    for _ in range(max(tuner.min_samples, tuner.concurrency)):
+        clock[0] += seconds / max(tuner.min_samples, tuner.concurrency)
+        tuner.report(duration, bytes_sent, error)
+
+
+@pytest.mark.parametrize(
+    argnames='kwargs, exp_error',
+    argvalues=(
+        ({'minimum': 0}, 'Invalid minimum: 0'),
+        ({'minimum': 4, 'maximum': 3, 'initial': 4}, 'Invalid maximum: 3'),
+        ({'initial': 0}, 'Invalid initial: 0'),
+        ({'initial': 33}, 'Invalid initial: 33'),
+        ({'min_samples': 0}, 'Invalid min_samples: 0'),
+        ({'max_error_rate': 1}, 'Invalid max_error_rate: 1'),
+        ({'decrease': 1}, 'Invalid decrease: 1'),
+        ({'tolerance': -0.1}, 'Invalid tolerance: -0.1'),
+    ),
+)
+def test_Autotuner_gets_invalid_argument(kwargs, exp_error):
+    with pytest.raises(ValueError, match=rf'^{exp_error}$'):
+        Autotuner(**kwargs)
+
+
+def test_Autotuner_increases_concurrency_while_throughput_increases(clock):
+    tuner = Autotuner(initial=2, maximum=6)
+    assert tuner.throughput is None
+    for exp_concurrency in (3, 4, 5, 6):
+        # Throughput is proportional to concurrency
+        run_window(tuner, clock, seconds=1, bytes_sent=1000)
+        assert tuner.concurrency == exp_concurrency
+    assert tuner.throughput == pytest.approx(5000)
+
+    # Maximum is reached
+    run_window(tuner, clock, seconds=1, bytes_sent=1000)
+    assert tuner.concurrency == 5
+
+
+def test_Autotuner_reverses_when_throughput_stops_increasing(clock):
+    tuner = Autotuner(initial=4)
+    run_window(tuner, clock, seconds=1, bytes_sent=1000)
+    assert tuner.concurrency == 5
+    # Same total throughput with more uploads
+    run_window(tuner, clock, seconds=1, bytes_sent=800)
+    assert tuner.concurrency == 4
+    # Fewer uploads are better
+    run_window(tuner, clock, seconds=0.5, bytes_sent=1000)
+    assert tuner.concurrency == 3
+
+
+def test_Autotuner_backs_off_on_errors(clock):
+    tuner = Autotuner(initial=8)
+    run_window(tuner, clock, seconds=1, bytes_sent=1000, error=ConnectionError('Timeout'))
+    assert tuner.concurrency == 4
+    run_window(tuner, clock, seconds=1, bytes_sent=1000, error=ConnectionError('Timeout'))
+    assert tuner.concurrency == 2
+    run_window(tuner, clock, seconds=1, bytes_sent=1000, error=ConnectionError('Timeout'))
+    assert tuner.concurrency == 1
+    run_window(tuner, clock, seconds=1, bytes_sent=1000, error=ConnectionError('Timeout'))
+    assert tuner.concurrency == 1
+    # Climb again
+    run_window(tuner, clock, seconds=1, bytes_sent=1000)
+    assert tuner.concurrency == 2
+
+
+def test_Autotuner_tolerates_some_errors(clock):
+    tuner = Autotuner(initial=4, max_error_rate=0.3)
+    tuner.report(0.1, 1000, ConnectionError('Timeout'))
+    for _ in range(3):
+        tuner.report(0.1, 1000)
+    assert tuner.concurrency == 5
+
+
+def test_Autotuner_backs_off_on_latency(clock):
+    tuner = Autotuner(initial=4, max_latency=1)
+    run_window(tuner, clock, seconds=1, bytes_sent=1000, duration=0.9)
+    assert tuner.concurrency == 5
+    run_window(tuner, clock, seconds=1, bytes_sent=1000, duration=1.1)
+    assert tuner.concurrency == 2
+
+
+def test_Autotuner_repr():
+    assert repr(Autotuner(initial=3, minimum=2, maximum=10)) == 'Autotuner(concurrency=3, minimum=2, maximum=10)'
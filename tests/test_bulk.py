@@ -0,0 +1,225 @@
+import asyncio
+import io
+import json
+import os
+import signal
+from unittest.mock import Mock
+
+import pytest
+from conftest import AsyncMock
+
+from pyimgbox import BulkUploader, DrainResult, ManifestEntry, Submission
+from pyimgbox import __main__ as cli
+from pyimgbox import _bulk
+
+
+def test_read_manifest_jsonl():
+    manifest = io.StringIO(
+        '{"path": "a.jpg"}\n'
+        '\n'
+        '{"path": "b.jpg", "title": "Foo", "adult": true, "thumb_width": 300}\n'
+        '{"path": "c.jpg", "title": "", "adult": false}\n'
+    )
+    entries = list(_bulk.read_manifest(manifest, title='Default', adult=True, thumb_width=200))
+    assert entries == [
+        ManifestEntry('a.jpg', 'Default', True, 200),
+        ManifestEntry('b.jpg', 'Foo', True, 300),
+        ManifestEntry('c.jpg', 'Default', False, 200),
+    ]
+
+def test_read_manifest_csv():
+    manifest = io.StringIO(
+        'path,title,adult,thumb_width\n'
+        'a.jpg,,,\n'
+        'b.jpg,"Foo, Bar",yes,300\n'
+        'c.jpg,Baz,0,\n'
+    )
+    entries = list(_bulk.read_manifest(manifest, format='csv'))
+    assert entries == [
+        ManifestEntry('a.jpg', None, False, 100),
+        ManifestEntry('b.jpg', 'Foo, Bar', True, 300),
+        ManifestEntry('c.jpg', 'Baz', False, 100),
+    ]
+
+def test_read_manifest_reads_lazily():
+    manifest = io.StringIO('{"path": "a.jpg"}\n{"path": "b.jpg"}\n')
+    entries = _bulk.read_manifest(manifest)
+    assert next(entries).filepath == 'a.jpg'
+    assert manifest.readline() == '{"path": "b.jpg"}\n'
+
+def test_read_manifest_gets_unknown_format():
+    with pytest.raises(ValueError, match=r"^Unknown manifest format: 'xml'$"):
+        list(_bulk.read_manifest(io.StringIO(''), format='xml'))
+
+@pytest.mark.parametrize(
+    argnames='line, exp_message',
+    argvalues=(
+        ('{"path": "a.jpg"', r'Invalid manifest line 2: Expecting .*'),
+        ('["a.jpg"]', r"Invalid manifest line 2: Not an object: \['a.jpg'\]"),
+        ('{"title": "Foo"}', r"Invalid manifest line 2: 'path'"),
+        ('{"path": ""}', r"Invalid manifest line 2: Invalid path: ''"),
+        ('{"path": "a.jpg", "adult": "maybe"}', r"Invalid manifest line 2: Invalid adult: 'maybe'"),
+        ('{"path": "a.jpg", "thumb_width": "wide"}', r'Invalid manifest line 2: invalid literal .*'),
+    ),
+)
+def test_read_manifest_gets_invalid_line(line, exp_message):
+    manifest = io.StringIO('{"path": "ok.jpg"}\n' + line + '\n')
+    entries = _bulk.read_manifest(manifest)
+    assert next(entries).filepath == 'ok.jpg'
+    with pytest.raises(ValueError, match=rf'^{exp_message}$'):
+        next(entries)
+
+
+@pytest.mark.asyncio
+async def test_BulkUploader_validates_concurrency():
+    async with BulkUploader() as uploader:
+        with pytest.raises(ValueError, match=r'^Invalid concurrency: 0$'):
+            uploader.concurrency = 0
+
+@pytest.mark.asyncio
+async def test_BulkUploader_groups_entries_into_galleries(mocker, make_submission):
+    async def upload(self, filepath):
+        return make_submission(filepath, gallery_url=f'{self.title}/{self.adult}/{self.thumb_width}')
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    entries = [
+        ManifestEntry('a.jpg', 'Foo', False, 100),
+        ManifestEntry('b.jpg', 'Bar', False, 100),
+        ManifestEntry('c.jpg', 'Foo', False, 100),
+        ManifestEntry('d.jpg', 'Foo', True, 100),
+        ManifestEntry('e.jpg', 'Foo', False, 300),
+    ]
+    async with BulkUploader(concurrency=2, square_thumbs=True) as uploader:
+        submissions = [s async for s in uploader.run(entries)]
+        galleries = uploader.galleries
+    assert sorted((s.filepath, s.gallery_url) for s in submissions) == [
+        ('a.jpg', 'Foo/False/150'),
+        ('b.jpg', 'Bar/False/150'),
+        ('c.jpg', 'Foo/False/150'),
+        ('d.jpg', 'Foo/True/150'),
+        ('e.jpg', 'Foo/False/300'),
+    ]
+    assert len(galleries) == 4
+    assert all(g.square_thumbs for g in galleries)
+    assert len({g._client.session for g in galleries}) == 1
+    assert uploader._session.closed
+
+@pytest.mark.asyncio
+async def test_BulkUploader_requests_entries_only_when_upload_can_start(mocker, make_submission):
+    running = []
+    max_running = 0
+    requested = []
+
+    async def upload(self, filepath):
+        nonlocal max_running
+        running.append(filepath)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(filepath)
+        return make_submission(filepath)
+
+    def entries():
+        for i in range(20):
+            requested.append(i)
+            # Never more than `concurrency` entries in memory
+            assert len(requested) - received <= 3
+            yield ManifestEntry(f'{i}.jpg', None, False, 100)
+
+    received = 0
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    async with BulkUploader(concurrency=3) as uploader:
+        async for submission in uploader.run(entries()):
+            received += 1
+    assert received == 20
+    assert max_running == 3
+
+@pytest.mark.asyncio
+async def test_BulkUploader_does_not_close_shared_session(mocker):
+    session = Mock(close=AsyncMock())
+    async with BulkUploader(session=session):
+        pass
+    assert session.close.call_args_list == []
+
+@pytest.mark.asyncio
+async def test_BulkUploader_drain_stops_requesting_entries(mocker, make_submission):
+    requested = []
+    drained = []
+
+    async def upload(self, filepath):
+        if filepath == '1.jpg':
+            drained.append(await uploader.drain())
+        return make_submission(filepath)
+
+    def entries():
+        for i in range(10):
+            requested.append(i)
+            yield ManifestEntry(f'{i}.jpg', None, False, 100)
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    async with BulkUploader(concurrency=1) as uploader:
+        submissions = [s async for s in uploader.run(entries())]
+    assert [s.filepath for s in submissions] == ['0.jpg', '1.jpg']
+    assert requested == [0, 1]
+    assert drained == [DrainResult(finished=(), cancelled=())]
+
+@pytest.mark.asyncio
+async def test_BulkUploader_refuses_entries_after_drain(mocker):
+    upload_mock = mocker.patch('pyimgbox._gallery.Gallery.upload', AsyncMock())
+    async with BulkUploader() as uploader:
+        await uploader.drain()
+        submission = await uploader._upload(ManifestEntry('a.jpg', None, False, 100))
+    assert (submission.filepath, submission.error) == ('a.jpg', 'BulkUploader is closed')
+    assert upload_mock.call_args_list == []
+
+
+@pytest.mark.asyncio
+async def test_write_jsonl(make_submission):
+    submissions = [make_submission('a.jpg'), Submission(filepath='b.jpg', error='Nope')]
+    output = io.StringIO()
+    assert await _bulk.write_jsonl(submissions, output) == (1, 1)
+    lines = output.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [dict(s) for s in submissions]
+
+
+def test_main_uploads_manifest(tmp_path, mocker, make_submission):
+    async def upload(self, filepath):
+        if filepath == 'bad.jpg':
+            return Submission(filepath=filepath, error='Nope')
+        return make_submission(filepath, gallery_url=self.title)
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('path,title\na.jpg,Foo\nbad.jpg,\n')
+    output = tmp_path / 'output.jsonl'
+    assert cli.main([str(manifest), '--output', str(output), '--title', 'Default',
+                     '--dedup', str(tmp_path / 'dedup.db')]) == 1
+    results = sorted((json.loads(line) for line in output.read_text().splitlines()),
+                     key=lambda r: r['filepath'])
+    assert [(r['filepath'], r['gallery_url'], r['error']) for r in results] == [
+        ('a.jpg', 'Foo', None),
+        ('bad.jpg', None, 'Nope'),
+    ]
+
+def test_main_stops_uploading_on_SIGTERM(tmp_path, mocker, capsys, make_submission):
+    async def upload(self, filepath):
+        if filepath == 'a.jpg':
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.sleep(0.01)
+        return make_submission(filepath)
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('path\na.jpg\nb.jpg\nc.jpg\n')
+    output = tmp_path / 'output.jsonl'
+    assert cli.main([str(manifest), '--output', str(output), '--concurrency', '1']) == 1
+    assert [json.loads(line)['filepath'] for line in output.read_text().splitlines()] == ['a.jpg']
+    assert capsys.readouterr().err == (
+        'Received SIGTERM, waiting up to 10 seconds for in-flight uploads\n'
+        'Uploaded 1 images, 0 failed\n'
+    )
+
+def test_main_reports_invalid_manifest(tmp_path, capsys):
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('not json\n')
+    assert cli.main([str(manifest)]) == 1
+    assert capsys.readouterr().err.startswith('Invalid manifest line 1: ')
@@ -0,0 +1,78 @@
+import pytest
+
+from pyimgbox import _dedup
+
+
+def exp_urls(name):
+    return {
+        'image_url': f'https://foo/{name}.jpg',
+        'thumbnail_url': f'https://foo/{name}_t.jpg',
+        'web_url': f'https://foo/{name}',
+        'gallery_url': 'https://foo/gallery',
+        'edit_url': 'https://foo/gallery/edit',
+    }
+
+
+@pytest.fixture
+def cache():
+    cache = _dedup.DedupCache()
+    yield cache
+    cache.close()
+
+
+def test_DedupCache_get_and_add(cache, make_submission):
+    assert cache.get('abc') is None
+    cache.add('abc', make_submission('foo.jpg'))
+    assert cache.get('abc') == exp_urls('foo')
+    assert cache.get('def') is None
+    cache.add('abc', make_submission('bar.jpg'))
+    assert cache.get('abc') == exp_urls('bar')
+    assert len(cache) == 1
+
+
+def test_DedupCache_persists_on_disk(tmp_path, make_submission):
+    filepath = str(tmp_path / 'dedup.db')
+    cache = _dedup.DedupCache(filepath)
+    assert cache.filepath == filepath
+    cache.add('abc', make_submission('foo.jpg'))
+    cache.close()
+    cache = _dedup.DedupCache(filepath)
+    assert cache.get('abc') == exp_urls('foo')
+    cache.close()
+
+
+def test_DedupCache_removes_old_entries(mocker, make_submission):
+    time_mock = mocker.patch('time.time', return_value=1000)
+    cache = _dedup.DedupCache(max_age=100)
+    cache.add('abc', make_submission('foo.jpg'))
+    time_mock.return_value = 1050
+    cache.add('def', make_submission('bar.jpg'))
+    time_mock.return_value = 1099
+    assert cache.get('abc') == exp_urls('foo')
+    time_mock.return_value = 1100
+    assert cache.get('abc') is None
+    assert len(cache) == 1
+    time_mock.return_value = 1150
+    cache.add('ghi', make_submission('baz.jpg'))
+    assert len(cache) == 1
+    assert cache.get('ghi') == exp_urls('baz')
+
+
+def test_DedupCache_removes_least_recently_used_entries(mocker, make_submission):
+    time_mock = mocker.patch('time.time', return_value=1000)
+    cache = _dedup.DedupCache(max_entries=2)
+    cache.add('a', make_submission('a.jpg'))
+    time_mock.return_value = 1001
+    cache.add('b', make_submission('b.jpg'))
+    time_mock.return_value = 1002
+    assert cache.get('a') == exp_urls('a')
+    time_mock.return_value = 1003
+    cache.add('c', make_submission('c.jpg'))
+    assert len(cache) == 2
+    assert cache.get('a') == exp_urls('a')
+    assert cache.get('b') is None
+    assert cache.get('c') == exp_urls('c')
+
+
+def test_DedupCache_repr(cache):
+    assert repr(cache) == "DedupCache(filepath=':memory:', max_entries=100000, max_age=None)"
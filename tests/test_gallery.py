@@ -1,23 +1,21 @@
+import asyncio
+import io
+import json
 import os
 import re
 import sys
-from unittest.mock import Mock, call, patch
+from unittest.mock import ANY, Mock, call, patch
 
 import pytest
 import pytest_asyncio
+from conftest import IMAGE_HEADER, AsyncMock
 
-from pyimgbox import Gallery, Submission, _const
+from pyimgbox import (Autotuner, DedupCache, DrainResult, Gallery, Journal,
+                      Observer, Operation, Progress, Session, Submission,
+                      _const, _http, _utils)
 from pyimgbox._http import HTTPClient
 
 
-# Python 3.6 doesn't have AsyncMock
-class AsyncMock(Mock):
-    def __call__(self, *args, **kwargs):
-        async def coro(_sup=super()):
-            return _sup.__call__(*args, **kwargs)
-        return coro()
-
-
 @pytest_asyncio.fixture
 async def client(mocker):
     mocker.patch('pyimgbox._http.HTTPClient.get', AsyncMock())
@@ -27,6 +25,24 @@ async def client(mocker):
     await client.close()
 
 
+@pytest.mark.asyncio
+async def test_Gallery_with_private_session():
+    g = Gallery()
+    assert g._client.session.closed is False
+    await g.close()
+    assert g._client.session.closed is True
+
+@pytest.mark.asyncio
+async def test_Gallery_with_shared_session():
+    async with Session() as session:
+        async with Gallery(session=session) as g1:
+            async with Gallery(session=session) as g2:
+                assert g1._client.session is g2._client.session is session
+                assert g1._client.headers is not g2._client.headers
+        assert session.closed is False
+    assert session.closed is True
+
+
 def test_Gallery_property_title():
     assert Gallery().title is None
     g = Gallery(title='Foo, Bar, Baz')
@@ -88,6 +104,23 @@ def test_Gallery_property_comments_enabled():
         g.comments_enabled = False
 
 
+def test_Gallery_property_concurrency():
+    assert Gallery().concurrency == 1
+    g = Gallery(concurrency=5)
+    assert g.concurrency == 5
+    g.concurrency = 2
+    assert g.concurrency == 2
+    for value in (0, 1.5, 'foo'):
+        with pytest.raises(ValueError, match=rf'^Invalid concurrency: {value!r}$'):
+            g.concurrency = value
+
+
+def test_Gallery_property_progress():
+    assert isinstance(Gallery().progress, Progress)
+    progress = Progress()
+    assert Gallery(progress=progress).progress is progress
+
+
 def test_Gallery_property_url():
     g = Gallery()
     assert g.url is None
@@ -141,7 +174,7 @@ async def test_Gallery_create_sets_session_header_and_token(client):
     assert g.created is False
     await g.create()
     assert client.get.call_args_list == [
-        call(f'https://{_const.SERVICE_DOMAIN}/'),
+        call(f'https://{_const.SERVICE_DOMAIN}/', until='</head>'),
     ]
     assert client.post.call_args_list == [
         call(
@@ -162,43 +195,396 @@ async def test_Gallery_create_sets_session_header_and_token(client):
         await g.create()
 
 
-def test_prepare_fails_to_open_file(mocker):
-    filepaths = [
-        'path/to/file0.jpg',
-        'path/file1.jpg',
-        'path/where/file2.jpg',
+@pytest.mark.asyncio
+async def test_Gallery_create_stores_csrf_token_in_cache(client):
+    client.get.return_value = '<html><head><meta content="THE-CSRF-TOKEN" name="csrf-token" /></head></html>'
+    client.post.return_value = {'token_id': 'a'}
+    g = Gallery()
+    await g.create()
+    assert g._client.session.token_cache.get() == {'csrf_token': 'THE-CSRF-TOKEN', 'cookies': []}
+
+@pytest.mark.asyncio
+async def test_Gallery_create_uses_cached_csrf_token(client):
+    async with Session() as session:
+        cookies = [{'name': 'session', 'value': 'abc', 'domain': 'imgbox.com', 'path': '/'}]
+        session.token_cache.set('CACHED-TOKEN', cookies)
+        client.post.return_value = {'token_id': 'a'}
+        g = Gallery(session=session)
+        await g.create()
+        assert client.get.call_args_list == []
+        assert client.post.call_args_list == [call(url=_const.TOKEN_URL, data=ANY, json=True)]
+        assert g._client.headers == {_const.CSRF_TOKEN_HEADER: 'CACHED-TOKEN'}
+        assert g._client.cookies == cookies
+        assert g._gallery_token == {'token_id': 'a'}
+        assert g.created is True
+
+@pytest.mark.asyncio
+async def test_Gallery_create_invalidates_rejected_csrf_token(client):
+    async with Session() as session:
+        session.token_cache.set('CACHED-TOKEN')
+        client.get.return_value = '<html><head><meta content="THE-CSRF-TOKEN" name="csrf-token" /></head></html>'
+        client.post.side_effect = [ConnectionError('Invalid token'), {'token_id': 'a'}]
+        g = Gallery(session=session)
+        await g.create()
+        assert client.get.call_args_list == [call(f'https://{_const.SERVICE_DOMAIN}/', until='</head>')]
+        assert client.post.call_args_list == [call(url=_const.TOKEN_URL, data=ANY, json=True)] * 2
+        assert g._client.headers == {_const.CSRF_TOKEN_HEADER: 'THE-CSRF-TOKEN'}
+        assert session.token_cache.get()['csrf_token'] == 'THE-CSRF-TOKEN'
+        assert g._gallery_token == {'token_id': 'a'}
+
+@pytest.mark.asyncio
+async def test_Gallery_shares_csrf_token_via_session(client):
+    client.get.return_value = '<html><head><meta content="THE-CSRF-TOKEN" name="csrf-token" /></head></html>'
+    client.post.side_effect = [{'token_id': 'a'}, {'token_id': 'b'}]
+    async with Session() as session:
+        g1 = Gallery(session=session)
+        await g1.create()
+        g2 = Gallery(session=session)
+        await g2.create()
+    assert client.get.call_args_list == [call(f'https://{_const.SERVICE_DOMAIN}/', until='</head>')]
+    assert g1._gallery_token == {'token_id': 'a'}
+    assert g2._gallery_token == {'token_id': 'b'}
+    assert g2._client.headers == {_const.CSRF_TOKEN_HEADER: 'THE-CSRF-TOKEN'}
+
+
+@pytest.mark.asyncio
+async def test_Gallery_create_records_gallery_in_journal(client, tmp_path):
+    client.get.return_value = '<html><head><meta content="THE-CSRF-TOKEN" name="csrf-token" /></head></html>'
+    client.post.return_value = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    g = Gallery(journal=str(tmp_path / 'journal'))
+    assert isinstance(g.journal, Journal)
+    await g.create()
+    await g.close()
+    assert Journal(str(tmp_path / 'journal')).gallery_token == client.post.return_value
+
+@pytest.mark.asyncio
+async def test_Gallery_reattaches_to_gallery_from_journal(client, tmp_path):
+    journal = Journal(str(tmp_path / 'journal'))
+    journal.add_gallery({'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'})
+    client.get.return_value = '<html><head><meta content="THE-CSRF-TOKEN" name="csrf-token" /></head></html>'
+    g = Gallery(journal=journal)
+    assert g.journal is journal
+    assert g.created is False
+    assert g.url == _const.GALLERY_URL_FORMAT.format(gallery_id='c')
+    await g.create()
+    assert g.created is True
+    assert client.get.call_args_list == [call(f'https://{_const.SERVICE_DOMAIN}/', until='</head>')]
+    assert client.post.call_args_list == []
+    assert g._client.headers == {_const.CSRF_TOKEN_HEADER: 'THE-CSRF-TOKEN'}
+
+@pytest.mark.asyncio
+async def test_Gallery_reattaches_with_cached_csrf_token(client, tmp_path):
+    journal = Journal(str(tmp_path / 'journal'))
+    journal.add_gallery({'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'})
+    async with Session() as session:
+        session.token_cache.set('CACHED-TOKEN')
+        g = Gallery(journal=journal, session=session)
+        await g.create()
+    assert client.get.call_args_list == []
+    assert client.post.call_args_list == []
+    assert g._client.headers == {_const.CSRF_TOKEN_HEADER: 'CACHED-TOKEN'}
+
+
+@pytest.mark.asyncio
+async def test_Gallery_replaces_rejected_cached_csrf_token_after_reattaching(client, tmp_path, mocker):
+    journal = Journal(str(tmp_path / 'journal'))
+    journal.add_gallery({'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'})
+    client.get.return_value = '<html><head><meta content="NEW-TOKEN" name="csrf-token" /></head></html>'
+    headers = []
+    responses = [
+        _http._RequestError('https://imgbox.com/upload/process: Forbidden', status_code=403),
+        {'files': [{'original_url': 'i', 'thumbnail_url': 't', 'url': 'w'}]},
+        _http._RequestError('https://imgbox.com/upload/process: Nope', status_code=403),
     ]
-    mocker.patch('builtins.open', Mock(
-        side_effect=[
-            'fileobj0',
-            OSError('mock errno', 'No such file'),
-            'fileobj2',
-        ],
-    ))
+
+    async def post(self, url, **kwargs):
+        headers.append(self.headers[_const.CSRF_TOKEN_HEADER])
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    mocker.patch('pyimgbox._http.HTTPClient.post', post)
+    mocker.patch.object(Gallery, '_prepare', lambda self, fp: (fp, (fp, io.BytesIO(IMAGE_HEADER)), None))
+    async with Session() as session:
+        session.token_cache.set('STALE-TOKEN')
+        async with Gallery(journal=journal, session=session) as g:
+            submission = await g.upload('foo.png')
+            assert (submission['success'], submission['image_url']) == (True, 'i')
+            assert headers == ['STALE-TOKEN', 'NEW-TOKEN']
+            assert session.token_cache.get()['csrf_token'] == 'NEW-TOKEN'
+
+            # The new token is not replaced again
+            submission = await g.upload('bar.png')
+            assert submission['error'] == 'https://imgbox.com/upload/process: Nope'
+            assert headers == ['STALE-TOKEN', 'NEW-TOKEN', 'NEW-TOKEN']
+    assert len(client.get.call_args_list) == 1
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    argnames='exception',
+    argvalues=(
+        _http._RequestError('https://imgbox.com/upload/process: File too large', status_code=413),
+        _http._RequestError('https://imgbox.com/upload/process: Bad Gateway', status_code=502),
+        _http._RequestError('https://imgbox.com/upload/process: Connection failed', retryable=True),
+        ConnectionError('https://imgbox.com/upload/process: Connection failed'),
+    ),
+    ids=('file too large', 'server error', 'network error', 'other error'),
+)
+async def test_Gallery_keeps_cached_csrf_token_after_reattaching_if_upload_fails_otherwise(
+        exception, client, tmp_path, mocker):
+    journal = Journal(str(tmp_path / 'journal'))
+    journal.add_gallery({'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'})
+    client.post.side_effect = exception
+    mocker.patch.object(Gallery, '_prepare', lambda self, fp: (fp, (fp, io.BytesIO(IMAGE_HEADER)), None))
+    async with Session() as session:
+        session.token_cache.set('CACHED-TOKEN')
+        async with Gallery(journal=journal, session=session) as g:
+            assert (await g.upload('foo.png'))['error'] == str(exception)
+            assert session.token_cache.get()['csrf_token'] == 'CACHED-TOKEN'
+    assert client.get.call_args_list == []
+    assert len(client.post.call_args_list) == 1
+
+@pytest.mark.asyncio
+async def test_Gallery_keeps_verified_cached_csrf_token_after_reattaching(client, tmp_path, mocker):
+    journal = Journal(str(tmp_path / 'journal'))
+    journal.add_gallery({'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'})
+    client.post.side_effect = [
+        {'files': [{'original_url': 'i', 'thumbnail_url': 't', 'url': 'w'}]},
+        ConnectionError('https://imgbox.com/upload/process: Nope'),
+    ]
+    mocker.patch.object(Gallery, '_prepare', lambda self, fp: (fp, (fp, io.BytesIO(IMAGE_HEADER)), None))
+    async with Session() as session:
+        session.token_cache.set('CACHED-TOKEN')
+        async with Gallery(journal=journal, session=session) as g:
+            assert (await g.upload('foo.png'))['success'] is True
+            assert (await g.upload('bar.png'))['error'] == 'https://imgbox.com/upload/process: Nope'
+    assert client.get.call_args_list == []
+    assert len(client.post.call_args_list) == 2
+
+
+def test_prepare_fails_to_open_file(mocker):
+    mocker.patch('builtins.open', Mock(side_effect=OSError('mock errno', 'No such file')))
     mocker.patch('os.path.getsize', return_value=1048576)
     g = Gallery()
-    submissions = g._prepare(*filepaths)
-    assert submissions == [
-        (filepaths[0], (os.path.basename(filepaths[0]), 'fileobj0'), None),
-        (filepaths[1], None, 'No such file'),
-        (filepaths[2], (os.path.basename(filepaths[2]), 'fileobj2'), None),
-    ]
+    assert g._prepare('path/file1.jpg') == ('path/file1.jpg', None, 'No such file')
 
 def test_prepare_finds_large_file(mocker):
-    filepaths = [
-        'path/to/file0.jpg',
-        'path/file1.jpg',
-        'path/where/file2.jpg',
-    ]
-    mocker.patch('builtins.open', Mock(side_effect=['fileobj0', 'fileobj1', 'fileobj2']))
-    mocker.patch('os.path.getsize', side_effect=[1048576, _const.MAX_FILE_SIZE + 1, 1048576])
+    fileobj = Mock()
+    mocker.patch('builtins.open', Mock(return_value=fileobj))
+    mocker.patch('os.path.getsize', return_value=_const.MAX_FILE_SIZE + 1)
     g = Gallery()
-    submissions = g._prepare(*filepaths)
-    assert submissions == [
-        (filepaths[0], (os.path.basename(filepaths[0]), 'fileobj0'), None),
-        (filepaths[1], None, f'File is larger than {_const.MAX_FILE_SIZE} bytes'),
-        (filepaths[2], (os.path.basename(filepaths[2]), 'fileobj2'), None),
+    assert g._prepare('path/file1.jpg') == (
+        'path/file1.jpg', None, f'File is larger than {_const.MAX_FILE_SIZE} bytes',
+    )
+    assert fileobj.close.call_args_list == [call()]
+
+def test_prepare_returns_filetuple(mocker):
+    fileobj = Mock()
+    mocker.patch('builtins.open', Mock(return_value=fileobj))
+    mocker.patch('os.path.getsize', return_value=1048576)
+    g = Gallery()
+    assert g._prepare('path/to/file1.jpg') == (
+        'path/to/file1.jpg', ('file1.jpg', fileobj), None,
+    )
+    assert fileobj.close.call_args_list == []
+
+
+@pytest.mark.asyncio
+async def test_upload_file_closes_file_after_upload(client):
+    g = Gallery()
+    fileobj = Mock(wraps=io.BytesIO(IMAGE_HEADER))
+    mock_prepare = Mock(return_value=('mock filepath', ('mock filename', fileobj), None))
+    with patch.multiple(g, _prepare=mock_prepare, _upload_image=AsyncMock()):
+        submission = await g._upload_file('path/to/foo.jpg')
+        assert g._prepare.call_args_list == [call('path/to/foo.jpg')]
+        assert g._upload_image.call_args_list == [
+            call('mock filepath', ('mock filename', fileobj), None),
+        ]
+        assert submission is g._upload_image.return_value
+    assert fileobj.close.call_args_list == [call()]
+
+@pytest.mark.asyncio
+async def test_upload_file_closes_file_after_exception(client):
+    g = Gallery()
+    fileobj = Mock(wraps=io.BytesIO(IMAGE_HEADER))
+    mock_prepare = Mock(return_value=('mock filepath', ('mock filename', fileobj), None))
+    mock_upload_image = AsyncMock(side_effect=RuntimeError('Unexpected response'))
+    with patch.multiple(g, _prepare=mock_prepare, _upload_image=mock_upload_image):
+        with pytest.raises(RuntimeError, match=r'^Unexpected response$'):
+            await g._upload_file('path/to/foo.jpg')
+    assert fileobj.close.call_args_list == [call()]
+
+@pytest.mark.asyncio
+async def test_upload_file_skips_files_from_journal(client, tmp_path):
+    filepaths = []
+    for i in range(3):
+        filepath = tmp_path / f'{i}.jpg'
+        filepath.write_bytes(IMAGE_HEADER + f'image data {i}'.encode())
+        filepaths.append(str(filepath))
+    journal_filepath = str(tmp_path / 'journal')
+
+    def make_submission(filepath, filetuple, error):
+        return Submission(
+            filepath=filepath,
+            image_url=f'https://foo/{os.path.basename(filepath)}',
+            thumbnail_url='https://foo/thumb',
+            web_url='https://foo/web',
+            gallery_url='https://foo/gallery',
+            edit_url='https://foo/edit',
+        )
+
+    # First run uploads first file
+    g = Gallery(journal=journal_filepath)
+    with patch.multiple(g, _upload_image=AsyncMock(side_effect=make_submission)):
+        sub0 = await g._upload_file(filepaths[0])
+    await g.close()
+
+    # Second run only uploads other files and changed files
+    (tmp_path / '1.jpg').write_bytes(IMAGE_HEADER + b'changed')
+    g = Gallery(journal=journal_filepath)
+    with patch.multiple(g, _upload_image=AsyncMock(side_effect=make_submission)):
+        submissions = [s async for s in g.add(filepaths)]
+        assert [c[0][0] for c in g._upload_image.call_args_list] == filepaths[1:]
+    await g.close()
+    assert submissions == [sub0] + [make_submission(fp, None, None) for fp in filepaths[1:]]
+
+    # Third run uploads nothing
+    g = Gallery(journal=journal_filepath)
+    with patch.multiple(g, _upload_image=AsyncMock(side_effect=make_submission)):
+        assert [s async for s in g.add(filepaths)] == submissions
+        assert g._upload_image.call_args_list == []
+    await g.close()
+
+@pytest.mark.asyncio
+async def test_upload_file_does_not_record_failed_upload_in_journal(client, tmp_path):
+    filepath = tmp_path / 'foo.jpg'
+    filepath.write_bytes(b'image data')
+    g = Gallery(journal=str(tmp_path / 'journal'))
+    with patch.multiple(g, _upload_image=AsyncMock(return_value=Submission(filepath=str(filepath), error='Nope'))):
+        await g._upload_file(str(filepath))
+    await g.close()
+    assert not (tmp_path / 'journal').exists()
+
+@pytest.mark.asyncio
+async def test_upload_file_skips_files_from_dedup_cache(client, tmp_path):
+    for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+        (tmp_path / name).write_bytes(IMAGE_HEADER + b'same image data')
+    (tmp_path / 'd.jpg').write_bytes(IMAGE_HEADER + b'other image data')
+
+    def make_submission(filepath, filetuple, error):
+        name = os.path.basename(filepath)
+        return Submission(
+            filepath=filepath,
+            image_url=f'https://foo/{name}',
+            thumbnail_url=f'https://foo/{name}_t',
+            web_url=f'https://foo/{name}_w',
+            gallery_url='https://foo/gallery',
+            edit_url='https://foo/edit',
+        )
+
+    g = Gallery(dedup=str(tmp_path / 'dedup.db'))
+    assert isinstance(g.dedup, DedupCache)
+    with patch.multiple(g, _upload_image=AsyncMock(side_effect=make_submission)):
+        submissions = [s async for s in g.add(str(tmp_path / name) for name in ('a.jpg', 'b.jpg', 'd.jpg', 'c.jpg'))]
+        assert [os.path.basename(c[0][0]) for c in g._upload_image.call_args_list] == ['a.jpg', 'd.jpg']
+    await g.close()
+    assert [(os.path.basename(s.filepath), s.image_url, s.cached) for s in submissions] == [
+        ('a.jpg', 'https://foo/a.jpg', False),
+        ('b.jpg', 'https://foo/a.jpg', True),
+        ('d.jpg', 'https://foo/d.jpg', False),
+        ('c.jpg', 'https://foo/a.jpg', True),
     ]
+    assert all(s.success for s in submissions)
+
+@pytest.mark.asyncio
+async def test_Gallery_does_not_close_dedup_cache_instance(client):
+    cache = DedupCache()
+    g = Gallery(dedup=cache)
+    assert g.dedup is cache
+    await g.close()
+    assert len(cache) == 0
+    cache.close()
+
+@pytest.mark.asyncio
+async def test_Gallery_closes_private_shrinker_only(client, mocker):
+    Shrinker_mock = mocker.patch('pyimgbox._shrink.Shrinker')
+    g = Gallery(shrink=True)
+    assert g.shrinker is Shrinker_mock.return_value
+    await g.close()
+    assert g.shrinker.close.call_args_list == [call()]
+
+    shrinker = Mock()
+    g = Gallery(shrink=shrinker)
+    assert g.shrinker is shrinker
+    await g.close()
+    assert shrinker.close.call_args_list == []
+
+@pytest.mark.asyncio
+async def test_upload_file_shrinks_large_file(client, tmp_path, mocker):
+    filepath = tmp_path / 'foo.png'
+    filepath.write_bytes(IMAGE_HEADER + b'large image data')
+    mocker.patch('os.path.getsize', return_value=_const.MAX_FILE_SIZE + 1)
+    shrinker = Mock(shrink=AsyncMock(return_value=IMAGE_HEADER + b'small'))
+    uploaded = []
+
+    async def upload_image(filepath, filetuple, error):
+        uploaded.append((filetuple[0], filetuple[1].read(), error))
+        return Submission(filepath=filepath, error='mock error')
+
+    g = Gallery(shrink=shrinker)
+    with patch.multiple(g, _upload_image=upload_image):
+        await g._upload_file(str(filepath))
+    await g.close()
+    assert shrinker.shrink.call_args_list == [call(str(filepath))]
+    assert uploaded == [('foo.png', IMAGE_HEADER + b'small', None)]
+
+@pytest.mark.asyncio
+async def test_upload_file_does_not_shrink_small_file(client, tmp_path):
+    filepath = tmp_path / 'foo.png'
+    filepath.write_bytes(IMAGE_HEADER + b'image data')
+    shrinker = Mock(shrink=AsyncMock())
+    g = Gallery(shrink=shrinker)
+    with patch.multiple(g, _upload_image=AsyncMock()):
+        await g._upload_file(str(filepath))
+        assert g._upload_image.call_args_list[0][0][1][1].name == str(filepath)
+    await g.close()
+    assert shrinker.shrink.call_args_list == []
+
+@pytest.mark.asyncio
+async def test_upload_file_fails_to_shrink_large_file(client, tmp_path, mocker):
+    filepath = tmp_path / 'foo.png'
+    filepath.write_bytes(IMAGE_HEADER + b'large image data')
+    mocker.patch('os.path.getsize', return_value=_const.MAX_FILE_SIZE + 1)
+    shrinker = Mock(shrink=AsyncMock(side_effect=ValueError('Nope')))
+    g = Gallery(shrink=shrinker)
+    with patch.multiple(g, _upload_image=AsyncMock()):
+        await g._upload_file(str(filepath))
+        assert g._upload_image.call_args_list == [
+            call(str(filepath), None, f'File is larger than {_const.MAX_FILE_SIZE} bytes: Nope'),
+        ]
+    await g.close()
+
+@pytest.mark.asyncio
+async def test_upload_file_handles_error_from_prepare(client):
+    g = Gallery()
+    mock_prepare = Mock(return_value=('mock filepath', None, 'mock error'))
+    with patch.multiple(g, _prepare=mock_prepare, _upload_image=AsyncMock()):
+        submission = await g._upload_file('path/to/foo.jpg')
+        assert g._upload_image.call_args_list == [call('mock filepath', None, 'mock error')]
+        assert submission is g._upload_image.return_value
+
+@pytest.mark.asyncio
+async def test_upload_file_rejects_unsupported_file_type(client):
+    g = Gallery()
+    fileobj = Mock(wraps=io.BytesIO(b'%PDF-1.4 not an image'))
+    mock_prepare = Mock(return_value=('mock filepath', ('mock filename', fileobj), None))
+    with patch.multiple(g, _prepare=mock_prepare, _upload_image=AsyncMock()):
+        submission = await g._upload_file('path/to/foo.jpg')
+        assert g._upload_image.call_args_list == [call('mock filepath', None, 'Unsupported file type')]
+        assert submission is g._upload_image.return_value
+    assert fileobj.close.call_args_list == [call()]
+    assert client.post.call_args_list == []
 
 
 @pytest.mark.asyncio
@@ -236,6 +622,27 @@ async def test_upload_image_calls_create_if_necessary(client):
             await g._upload_image(f'foo{i}.jpg', 'mock filetuple', None)
             assert g.create.call_args_list == [call()]
 
+@pytest.mark.asyncio
+async def test_upload_image_calls_create_once_for_concurrent_uploads(client):
+    g = Gallery()
+
+    async def set_tokens():
+        await asyncio.sleep(0.01)
+        g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+        g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+
+    with patch.object(g, 'create', side_effect=set_tokens):
+        client.post.return_value = {'files': [{
+            'original_url': 'http://image_url',
+            'thumbnail_url': 'http://thumbnail_url',
+            'url': 'http://web_url',
+        }]}
+        await asyncio.gather(*(
+            g._upload_image(f'foo{i}.jpg', 'mock filetuple', None)
+            for i in range(5)
+        ))
+        assert g.create.call_args_list == [call()]
+
 @pytest.mark.asyncio
 async def test_upload_image_catches_exception_from_create_request(client):
     g = Gallery()
@@ -276,10 +683,47 @@ async def test_upload_image_makes_correct_upload_request(client):
             'thumbnail_size': _const.THUMBNAIL_SIZES_KEEP_ASPECT[100],
             'comments_enabled': '0',
         },
-        files={'files[]': 'mock filetuple'},
+        files=[('files[]', 'mock filetuple')],
         json=True,
+        progress=ANY,
     )]
 
+@pytest.mark.asyncio
+async def test_upload_image_reports_progress(client):
+    callback = Mock()
+    g = Gallery(progress=Progress(callback=callback, interval=0))
+    g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+
+    def post(url, data, files, json, progress):
+        assert [f.filepath for f in g.progress.files] == ['foo.jpg']
+        progress(0, 100)
+        progress(60, 100)
+        progress(100, 100)
+        return {'files': [{
+            'original_url': 'http://image_url',
+            'thumbnail_url': 'http://thumbnail_url',
+            'url': 'http://web_url',
+        }]}
+
+    client.post.side_effect = post
+    await g._upload_image('foo.jpg', 'mock filetuple', None)
+    assert g.progress.files == ()
+    assert g.progress.files_done == 1
+    assert g.progress.bytes_sent == 100
+    assert g.progress.bytes_total == 100
+    assert [c[0] for c in callback.call_args_list] == [(g.progress,)] * 4
+
+@pytest.mark.asyncio
+async def test_upload_image_finishes_progress_on_error(client):
+    g = Gallery()
+    g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+    client.post.side_effect = ConnectionError('The Error')
+    await g._upload_image('foo.jpg', 'mock filetuple', None)
+    assert g.progress.files == ()
+    assert g.progress.files_done == 1
+
 @pytest.mark.parametrize(
     argnames='unexpected_response, exp_cause, exp_cause_msg',
     argvalues=(
@@ -326,40 +770,574 @@ async def test_upload_image_returns_submission(client):
     )
 
 
+@pytest.mark.asyncio
+async def test_upload_images_maps_response_to_submissions(client):
+    g = Gallery()
+    g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+    client.post.return_value = {'files': [
+        {'original_url': f'http://image_url{i}', 'thumbnail_url': f'http://thumbnail_url{i}', 'url': f'http://web_url{i}'}
+        for i in range(3)
+    ]}
+    subs = await g._upload_images([(f'foo{i}.jpg', f'filetuple{i}') for i in range(3)])
+    assert client.post.call_args_list == [call(
+        url=_const.PROCESS_URL,
+        data=ANY,
+        files=[('files[]', 'filetuple0'), ('files[]', 'filetuple1'), ('files[]', 'filetuple2')],
+        json=True,
+        progress=ANY,
+    )]
+    assert subs == [
+        Submission(
+            filepath=f'foo{i}.jpg',
+            image_url=f'http://image_url{i}',
+            thumbnail_url=f'http://thumbnail_url{i}',
+            web_url=f'http://web_url{i}',
+            gallery_url=g.url,
+            edit_url=g.edit_url,
+        )
+        for i in range(3)
+    ]
+
+@pytest.mark.asyncio
+async def test_upload_images_gets_wrong_number_of_files(client):
+    g = Gallery()
+    g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+    response = {'files': [{'original_url': 'i', 'thumbnail_url': 't', 'url': 'w'}]}
+    client.post.return_value = response
+    with pytest.raises(RuntimeError, match=rf'^Unexpected response: {re.escape(repr(response))}$'):
+        await g._upload_images([('foo.jpg', 'filetuple'), ('bar.jpg', 'filetuple')])
+
+@pytest.mark.asyncio
+async def test_upload_images_reports_error_for_each_file(client):
+    g = Gallery()
+    with patch.object(g, 'create', side_effect=ConnectionError('The Error')):
+        subs = await g._upload_images([('foo.jpg', 'filetuple'), ('bar.jpg', 'filetuple')])
+    assert subs == [Submission(filepath='foo.jpg', error='The Error'), Submission(filepath='bar.jpg', error='The Error')]
+    g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+    client.post.side_effect = ConnectionError('Another Error')
+    subs = await g._upload_images([('foo.jpg', 'filetuple'), ('bar.jpg', 'filetuple')])
+    assert subs == [Submission(filepath='foo.jpg', error='Another Error'), Submission(filepath='bar.jpg', error='Another Error')]
+
+
+@pytest.mark.asyncio
+async def test_Gallery_reports_operations_to_observer(client):
+    observer = Mock(spec=Observer)
+    client.get.return_value = '<html><head><meta content="THE-CSRF-TOKEN" name="csrf-token" /></head></html>'
+
+    def post(url, data, json, files=None, progress=None):
+        if url == _const.TOKEN_URL:
+            return {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+        progress(100, 100)
+        return {'files': [{'original_url': 'i', 'thumbnail_url': 't', 'url': 'w'}]}
+
+    client.post.side_effect = post
+    async with Session(observer=observer) as session:
+        g = Gallery(session=session)
+        await g._upload_image('foo.jpg', 'mock filetuple', None)
+    operations = [c[0][0] for c in observer.operation.call_args_list]
+    assert [(o.name, o.error, o.filepaths, o.bytes_sent) for o in operations] == [
+        ('csrf', None, (), 0),
+        ('token', None, (), 0),
+        ('upload', None, ('foo.jpg',), 100),
+    ]
+    assert all(isinstance(o, Operation) and o.duration >= 0 for o in operations)
+
+@pytest.mark.asyncio
+async def test_Gallery_reports_failed_operations_to_observer(client):
+    observer = Mock(spec=Observer)
+    async with Session(observer=observer) as session:
+        g = Gallery(session=session)
+        client.get.return_value = '<html><head></head></html>'
+        with pytest.raises(RuntimeError):
+            await g.create()
+        g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+        g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+        client.post.side_effect = ConnectionError('The Error')
+        await g._upload_images([('foo.jpg', 'filetuple'), ('bar.jpg', 'filetuple')])
+        client.post.side_effect = None
+        client.post.return_value = {'foo': 'bar'}
+        with pytest.raises(RuntimeError):
+            await g._upload_images([('baz.jpg', 'filetuple')])
+    operations = [c[0][0] for c in observer.operation.call_args_list]
+    assert [(o.name, o.error, o.filepaths) for o in operations] == [
+        ('csrf', "Couldn't find CSRF token in HTML head", ()),
+        ('upload', 'The Error', ('foo.jpg', 'bar.jpg')),
+        ('upload', "Unexpected response: {'foo': 'bar'}", ('baz.jpg',)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_groups_filepaths(client, tmp_path):
+    sizes = {'a': 10, 'b': 20, 'c': 50, 'd': 5, 'e': 100, 'f': 1, 'g': 1, 'h': 1}
+    for name, size in sizes.items():
+        (tmp_path / name).write_bytes(b'x' * size)
+    filepaths = [str(tmp_path / name) for name in sizes] + [str(tmp_path / 'nonexisting')]
+    g = Gallery()
+    batches = [b async for b in g._batch(filepaths, batch_size=3, batch_bytes=60)]
+    assert [[os.path.basename(fp) for fp in batch] for batch in batches] == [
+        ['a', 'b'],
+        ['c', 'd'],
+        ['e'],
+        ['f', 'g', 'h'],
+        ['nonexisting'],
+    ]
+
+@pytest.mark.asyncio
+async def test_upload_batch(client, tmp_path):
+    for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+        (tmp_path / name).write_bytes(IMAGE_HEADER + b'image data ' + name.encode())
+    filepaths = [str(tmp_path / name) for name in ('a.jpg', 'nonexisting.jpg', 'b.jpg', 'c.jpg')]
+    g = Gallery(dedup=DedupCache())
+    known = Submission(filepath='x', image_url='i', thumbnail_url='t', web_url='w', gallery_url='g', edit_url='e')
+    g.dedup.add(_utils.get_content_hash(io.BytesIO(IMAGE_HEADER + b'image data b.jpg')), known)
+    opened = []
+
+    async def upload_images(files):
+        opened.extend(ft[1] for _, ft in files)
+        assert all(not ft[1].closed for _, ft in files)
+        return [
+            Submission(filepath=fp, image_url=f'{fp}.i', thumbnail_url='t', web_url='w', gallery_url='g', edit_url='e')
+            for fp, _ in files
+        ]
+
+    with patch.object(g, '_upload_images', side_effect=upload_images):
+        subs = await g._upload_batch(filepaths)
+    assert [(s.filepath, s.success, s.cached, s.image_url) for s in subs] == [
+        (filepaths[0], True, False, f'{filepaths[0]}.i'),
+        (filepaths[1], False, False, None),
+        (filepaths[2], True, True, 'i'),
+        (filepaths[3], True, False, f'{filepaths[3]}.i'),
+    ]
+    assert subs[1].error == 'No such file or directory'
+    assert len(opened) == 2
+    assert all(f.closed for f in opened)
+    assert g.dedup.get(_utils.get_content_hash(io.BytesIO(IMAGE_HEADER + b'image data c.jpg')))['image_url'] == f'{filepaths[3]}.i'
+    await g.close()
+
+@pytest.mark.asyncio
+async def test_Gallery_add_uploads_batches_to_server(tmp_path, httpserver, mocker):
+    from werkzeug import Response
+
+    filepaths = []
+    for i in range(7):
+        filepath = tmp_path / f'{i}.png'
+        filepath.write_bytes(IMAGE_HEADER + b'image data %d' % i)
+        filepaths.append(str(filepath))
+    requests = []
+
+    def handler(request):
+        files = request.files.getlist('files[]')
+        requests.append([f.filename for f in files])
+        return Response(json.dumps({'files': [
+            {'original_url': f'http://i/{f.filename}', 'thumbnail_url': f'http://t/{f.filename}',
+             'url': f'http://w/{f.read()[len(IMAGE_HEADER):].decode()}'}
+            for f in files
+        ]}), content_type='application/json')
+
+    httpserver.expect_request('/upload/process', method='POST').respond_with_handler(handler)
+    mocker.patch.object(_const, 'PROCESS_URL', httpserver.url_for('/upload/process'))
+    async with Gallery() as g:
+        g._gallery_token = {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+        g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf_token'
+        subs = [s async for s in g.add(filepaths, batch_size=3, concurrency=2, ordered=True)]
+    assert sorted(requests) == [['0.png', '1.png', '2.png'], ['3.png', '4.png', '5.png'], ['6.png']]
+    assert [(os.path.basename(s.filepath), s.image_url, s.web_url) for s in subs] == [
+        (f'{i}.png', f'http://i/{i}.png', f'http://w/image data {i}')
+        for i in range(7)
+    ]
+
+
 @pytest.mark.asyncio
 async def test_upload(client):
     g = Gallery()
-    mock_prepare = Mock(return_value=[('mock filepath', 'mock filetuple', 'mock error')])
-    with patch.multiple(g, _prepare=mock_prepare, _upload_image=AsyncMock()):
+    with patch.multiple(g, _upload_file=AsyncMock()):
         submission = await g.upload('path/to/foo.jpg')
-        assert g._prepare.call_args_list == [call('path/to/foo.jpg')]
-        assert g._upload_image.call_args_list == [
-            call('mock filepath', 'mock filetuple', 'mock error'),
-        ]
-        assert submission is g._upload_image.return_value
+        assert g._upload_file.call_args_list == [call('path/to/foo.jpg')]
+        assert submission is g._upload_file.return_value
 
 
 @pytest.mark.asyncio
 async def test_Gallery_add(client, mocker):
     g = Gallery()
     filepaths = ('path/to/foo.jpg', 'bar.jpg', 'something/baz.jpg')
-    mock_prepare = Mock(return_value=[
-        (f'{filepath}: mock filepath', f'{filepath}: mock filetuple', f'{filepath}: mock error')
-        for filepath in filepaths
-    ])
-    mock_upload_image = AsyncMock(side_effect=[
+    mock_upload_file = AsyncMock(side_effect=[
         f'{filepath} submission'
         for filepath in filepaths
     ])
-    with patch.multiple(g, _prepare=mock_prepare, _upload_image=mock_upload_image):
+    with patch.multiple(g, _upload_file=mock_upload_file):
         submissions = [s async for s in g.add(filepaths)]
-        assert g._prepare.call_args_list == [call(*filepaths)]
+        assert g._upload_file.call_args_list == [call(fp) for fp in filepaths]
     assert submissions == [
         'path/to/foo.jpg submission',
         'bar.jpg submission',
         'something/baz.jpg submission',
     ]
 
+@pytest.mark.asyncio
+async def test_Gallery_add_gets_async_iterable(client, mocker):
+    g = Gallery()
+
+    async def filepaths():
+        for filepath in ('foo.jpg', 'bar.jpg'):
+            yield filepath
+
+    mock_upload_file = AsyncMock(side_effect=lambda fp: f'{fp} submission')
+    with patch.multiple(g, _upload_file=mock_upload_file):
+        submissions = [s async for s in g.add(filepaths())]
+    assert submissions == ['foo.jpg submission', 'bar.jpg submission']
+
+@pytest.mark.asyncio
+async def test_Gallery_add_opens_files_lazily(client, tmp_path, mocker):
+    filepaths = []
+    for i in range(10):
+        filepath = tmp_path / f'{i}.jpg'
+        filepath.write_bytes(IMAGE_HEADER + b'image data')
+        filepaths.append(str(filepath))
+
+    g = Gallery()
+    open_files = set()
+    max_open_files = 0
+
+    async def upload_image(filepath, filetuple, error):
+        nonlocal max_open_files
+        open_files.add(filetuple[1])
+        max_open_files = max(max_open_files, len([f for f in open_files if not f.closed]))
+        await asyncio.sleep(0.01)
+        return f'{os.path.basename(filepath)} submission'
+
+    mocker.patch.object(g, '_upload_image', upload_image)
+    submissions = [s async for s in g.add(iter(filepaths), concurrency=3, ordered=True)]
+    assert submissions == [f'{i}.jpg submission' for i in range(10)]
+    assert max_open_files == 3
+    assert all(f.closed for f in open_files)
+
+@pytest.mark.parametrize(
+    argnames='gallery_concurrency, concurrency, exp_concurrency',
+    argvalues=(
+        (1, None, 1),
+        (3, None, 3),
+        (3, 2, 2),
+    ),
+)
+@pytest.mark.asyncio
+async def test_Gallery_add_passes_concurrency_to_pool(gallery_concurrency, concurrency, exp_concurrency, client, mocker):
+    g = Gallery(concurrency=gallery_concurrency)
+    WorkerPool_mock = mocker.patch('pyimgbox._pool.WorkerPool')
+
+    async def map(items, ordered):
+        async for item in items:
+            yield f'{item} submission'
+
+    WorkerPool_mock.return_value.map.side_effect = map
+    submissions = [s async for s in g.add(['foo', 'bar'], concurrency=concurrency, ordered='mock ordered')]
+    assert submissions == ['foo submission', 'bar submission']
+    assert WorkerPool_mock.call_args_list == [call(func=g._upload_file, concurrency=exp_concurrency)]
+    assert WorkerPool_mock.return_value.map.call_args_list == [call(ANY, ordered='mock ordered')]
+
+@pytest.mark.asyncio
+async def test_Gallery_add_uploads_concurrently(client, mocker):
+    g = Gallery()
+    filepaths = ('a.jpg', 'b.jpg', 'c.jpg', 'd.jpg')
+    mocker.patch.object(g, '_prepare', Mock(side_effect=lambda fp: (fp, None, None)))
+    running = []
+    max_running = 0
+
+    async def upload_image(filepath, filetuple, error):
+        nonlocal max_running
+        running.append(filepath)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(filepath)
+        return f'{filepath} submission'
+
+    mocker.patch.object(g, '_upload_image', upload_image)
+    submissions = [s async for s in g.add(filepaths, concurrency=2, ordered=True)]
+    assert submissions == [f'{fp} submission' for fp in filepaths]
+    assert max_running == 2
+
+@pytest.mark.asyncio
+async def test_Gallery_add_uses_autotuner_concurrency(client, mocker):
+    autotune = Autotuner(initial=1, maximum=3)
+    g = Gallery(concurrency=10, autotune=autotune)
+    assert g.autotune is autotune
+    filepaths = [f'{i}.jpg' for i in range(12)]
+    mocker.patch.object(g, '_prepare', Mock(side_effect=lambda fp: (fp, None, None)))
+    running = []
+    max_running = []
+
+    async def upload_image(filepath, filetuple, error):
+        running.append(filepath)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(filepath)
+        return f'{filepath} submission'
+
+    mocker.patch.object(g, '_upload_image', upload_image)
+    # 1 at the start, then 2 after the first upload and 3 after that
+    concurrencies = iter([1, 2])
+    mocker.patch.object(type(autotune), 'concurrency', property(lambda self: next(concurrencies, 3)))
+    submissions = [s async for s in g.add(filepaths, concurrency=1, ordered=True)]
+    assert submissions == [f'{fp} submission' for fp in filepaths]
+    assert max_running[0] == 1
+    assert max(max_running) == 3
+
+@pytest.mark.asyncio
+async def test_upload_images_reports_to_autotuner(client, mocker):
+    autotune = Mock()
+    g = Gallery(autotune=autotune)
+    g._gallery_token = {'token_id': 'tid', 'token_secret': 'ts', 'gallery_id': 'gid', 'gallery_secret': 'gs'}
+    g._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf'
+    fileobj = io.BytesIO(IMAGE_HEADER)
+
+    client.post.return_value = {'files': [{'original_url': 'i', 'thumbnail_url': 't', 'url': 'w'}]}
+    await g._upload_images([('foo.png', ('foo.png', fileobj))])
+    assert autotune.report.call_args_list == [call(ANY, ANY, None)]
+
+    client.post.side_effect = ConnectionError('Timeout')
+    await g._upload_images([('foo.png', ('foo.png', fileobj))])
+    assert autotune.report.call_args_list[-1][0][2].args == ('Timeout',)
+
+    client.post.side_effect = None
+    client.post.return_value = {'unexpected': 'response'}
+    with pytest.raises(RuntimeError):
+        await g._upload_images([('foo.png', ('foo.png', fileobj))])
+    assert isinstance(autotune.report.call_args_list[-1][0][2], RuntimeError)
+
+    # Cancelled uploads are not reported
+    client.post.side_effect = asyncio.CancelledError()
+    with pytest.raises(asyncio.CancelledError):
+        await g._upload_images([('foo.png', ('foo.png', fileobj))])
+    assert len(autotune.report.call_args_list) == 3
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    argnames='schedule, exp_order',
+    argvalues=(
+        ('largest-first', ['c', 'a', 'd', 'b', 'e']),
+        ('smallest-first', ['e', 'b', 'd', 'a', 'c']),
+        ('balanced', ['c', 'e', 'a', 'b', 'd']),
+    ),
+)
+@pytest.mark.parametrize('ordered', (True, False))
+async def test_Gallery_add_schedules_uploads_by_size(schedule, exp_order, ordered, client, tmp_path, mocker):
+    sizes = {'a': 300, 'b': 100, 'c': 500, 'd': 200, 'e': 10}
+    filepaths = []
+    for name, size in sizes.items():
+        filepath = tmp_path / f'{name}.png'
+        filepath.write_bytes(IMAGE_HEADER + b'x' * size)
+        filepaths.append(str(filepath))
+    uploaded = []
+
+    async def upload_image(filepath, filetuple, error):
+        uploaded.append(os.path.basename(filepath)[0])
+        return Submission(filepath=filepath, error='mock error')
+
+    g = Gallery()
+    mocker.patch.object(g, '_upload_image', upload_image)
+    submissions = [s async for s in g.add(filepaths, ordered=ordered, schedule=schedule)]
+    assert uploaded == exp_order
+    if ordered:
+        assert [s.filepath for s in submissions] == filepaths
+    else:
+        assert [s.filename[0] for s in submissions] == exp_order
+
+@pytest.mark.asyncio
+async def test_Gallery_add_schedules_batches_by_size(client, tmp_path, mocker):
+    filepaths = []
+    for i, size in enumerate((10, 500, 20, 400, 30)):
+        filepath = tmp_path / f'{i}.png'
+        filepath.write_bytes(IMAGE_HEADER + b'x' * size)
+        filepaths.append(str(filepath))
+    requests = []
+
+    async def upload_images(files):
+        requests.append([os.path.basename(fp) for fp, _ in files])
+        return [Submission(filepath=fp, error='mock error') for fp, _ in files]
+
+    g = Gallery()
+    mocker.patch.object(g, '_upload_images', upload_images)
+    submissions = [s async for s in g.add(filepaths, ordered=True, batch_size=2, schedule='largest-first')]
+    assert requests == [['1.png', '3.png'], ['4.png', '2.png'], ['0.png']]
+    assert [s.filepath for s in submissions] == filepaths
+
+@pytest.mark.asyncio
+async def test_Gallery_add_gets_invalid_schedule(client):
+    g = Gallery()
+    with pytest.raises(ValueError, match=r"^Invalid schedule: 'random'$"):
+        [s async for s in g.add(['a.jpg'], schedule='random')]
+
+
+def _mock_slow_uploads(g, mocker, seconds):
+    # Uploads take `seconds`; return list of file objects and list of running
+    # uploads
+    fileobjs = []
+    running = []
+
+    def prepare(filepath):
+        fileobjs.append(Mock(wraps=io.BytesIO(IMAGE_HEADER)))
+        return (filepath, (os.path.basename(filepath), fileobjs[-1]), None)
+
+    async def upload_images(files):
+        filepaths = [filepath for filepath, _ in files]
+        running.extend(filepaths)
+        await asyncio.sleep(seconds)
+        return [f'{filepath} submission' for filepath in filepaths]
+
+    mocker.patch.object(g, '_prepare', Mock(side_effect=prepare))
+    mocker.patch.object(g, '_upload_images', upload_images)
+    return fileobjs, running
+
+async def _wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0)
+
+async def _collect(submissions):
+    return [s async for s in submissions]
+
+@pytest.mark.asyncio
+async def test_Gallery_drain_waits_for_in_flight_uploads(client, mocker):
+    g = Gallery(concurrency=2)
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=0.05)
+    requested = []
+
+    def filepaths():
+        for filepath in ('a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'):
+            requested.append(filepath)
+            yield filepath
+
+    async def consume():
+        return [s async for s in g.add(filepaths())]
+
+    task = asyncio.ensure_future(consume())
+    await _wait_for(lambda: len(running) == 2)
+    result = await g.drain()
+    assert result == (('a.jpg', 'b.jpg'), ())
+    assert result.finished == ('a.jpg', 'b.jpg')
+    assert result.cancelled == ()
+    assert sorted(await task) == ['a.jpg submission', 'b.jpg submission']
+    assert requested == ['a.jpg', 'b.jpg']
+    assert [f.close.call_args_list for f in fileobjs] == [[call()], [call()]]
+
+@pytest.mark.asyncio
+async def test_Gallery_drain_cancels_uploads_after_timeout(client, mocker):
+    g = Gallery(concurrency=2)
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=10)
+    task = asyncio.ensure_future(_collect(g.add(['a.jpg', 'b.jpg', 'c.jpg'])))
+    await _wait_for(lambda: len(running) == 2)
+    result = await g.drain(timeout=0.01)
+    assert result == DrainResult(finished=(), cancelled=('a.jpg', 'b.jpg'))
+    submissions = sorted(await task, key=lambda s: s['filepath'])
+    assert [(s['filepath'], s['error']) for s in submissions] == [
+        ('a.jpg', 'Upload cancelled'),
+        ('b.jpg', 'Upload cancelled'),
+    ]
+    assert [f.close.call_args_list for f in fileobjs] == [[call()], [call()]]
+    assert g._uploads == {}
+
+@pytest.mark.asyncio
+async def test_Gallery_drain_without_uploads(client):
+    g = Gallery()
+    assert await g.drain() == DrainResult(finished=(), cancelled=())
+    submission = await g.upload('foo.jpg')
+    assert (submission['success'], submission['error']) == (False, 'Gallery is closed')
+
+@pytest.mark.asyncio
+async def test_Gallery_cancel_cancels_upload(client, mocker):
+    g = Gallery()
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=10)
+    task = asyncio.ensure_future(g.upload('foo.jpg'))
+    await _wait_for(lambda: running)
+    assert await g.cancel() == DrainResult(finished=(), cancelled=('foo.jpg',))
+    submission = await task
+    assert (submission['filepath'], submission['error']) == ('foo.jpg', 'Upload cancelled')
+    assert fileobjs[0].close.call_args_list == [call()]
+
+@pytest.mark.asyncio
+async def test_Gallery_cancel_cancels_batch_upload(client, mocker):
+    g = Gallery()
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=10)
+    task = asyncio.ensure_future(_collect(g.add(['a.jpg', 'b.jpg', 'c.jpg'], batch_size=2)))
+    await _wait_for(lambda: running)
+    assert await g.cancel() == DrainResult(finished=(), cancelled=('a.jpg', 'b.jpg'))
+    assert [(s['filepath'], s['error']) for s in await task] == [
+        ('a.jpg', 'Upload cancelled'),
+        ('b.jpg', 'Upload cancelled'),
+    ]
+    assert [f.close.call_args_list for f in fileobjs] == [[call()], [call()]]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    argnames='batch_size, exp_finished',
+    argvalues=(
+        (1, ('2.png',)),
+        (2, ('2.png', '1.png')),
+    ),
+)
+async def test_Gallery_drain_yields_scheduled_and_ordered_uploads(batch_size, exp_finished, client, tmp_path, mocker):
+    filepaths = []
+    for i, size in enumerate((10, 20, 30)):
+        filepath = tmp_path / f'{i}.png'
+        filepath.write_bytes(IMAGE_HEADER + b'x' * size)
+        filepaths.append(str(filepath))
+    g = Gallery(concurrency=1)
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=0.05)
+    task = asyncio.ensure_future(_collect(g.add(filepaths, ordered=True, batch_size=batch_size,
+                                                schedule='largest-first')))
+    await _wait_for(lambda: running)
+    result = await g.drain()
+    assert tuple(os.path.basename(fp) for fp in result.finished) == exp_finished
+    assert await task == [f'{fp} submission' for fp in sorted(result.finished)]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    argnames='batch_size, exp_cancelled',
+    argvalues=(
+        (1, ('2.png',)),
+        (2, ('2.png', '1.png')),
+    ),
+)
+async def test_Gallery_cancel_yields_scheduled_and_ordered_uploads(batch_size, exp_cancelled, client, tmp_path, mocker):
+    filepaths = []
+    for i, size in enumerate((10, 20, 30)):
+        filepath = tmp_path / f'{i}.png'
+        filepath.write_bytes(IMAGE_HEADER + b'x' * size)
+        filepaths.append(str(filepath))
+    g = Gallery(concurrency=1)
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=10)
+    task = asyncio.ensure_future(_collect(g.add(filepaths, ordered=True, batch_size=batch_size,
+                                                schedule='largest-first')))
+    await _wait_for(lambda: running)
+    result = await g.cancel()
+    assert tuple(os.path.basename(fp) for fp in result.cancelled) == exp_cancelled
+    assert [(s['filepath'], s['error']) for s in await task] == [
+        (fp, 'Upload cancelled') for fp in sorted(result.cancelled)
+    ]
+
+@pytest.mark.asyncio
+async def test_Gallery_close_cancels_uploads(client, mocker):
+    g = Gallery()
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=10)
+    task = asyncio.ensure_future(g.upload('foo.jpg'))
+    await _wait_for(lambda: running)
+    await g.close()
+    assert (await task)['error'] == 'Upload cancelled'
+    assert fileobjs[0].close.call_args_list == [call()]
+
+@pytest.mark.asyncio
+async def test_Gallery_upload_can_still_be_cancelled_by_caller(client, mocker):
+    g = Gallery()
+    fileobjs, running = _mock_slow_uploads(g, mocker, seconds=10)
+    task = asyncio.ensure_future(g.upload('foo.jpg'))
+    await _wait_for(lambda: running)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert fileobjs[0].close.call_args_list == [call()]
+    assert g._uploads == {}
+
 
 def test_repr(client):
     g = Gallery(
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+import pytest
+
+from pyimgbox import _html
+
+
+@pytest.mark.parametrize(
+    argnames='text, exp_token',
+    argvalues=(
+        ('<html><head><meta content="THE-TOKEN" name="csrf-token" /></head></html>', 'THE-TOKEN'),
+        ('<head><meta name="csrf-token" content="THE-TOKEN"></head>', 'THE-TOKEN'),
+        ("<head><META NAME='csrf-token' CONTENT='THE-TOKEN'/></head>", 'THE-TOKEN'),
+        ('<head><meta\n  name=csrf-token\n  content=THE-TOKEN\n></head>', 'THE-TOKEN'),
+        ('<head><meta name="csrf-token" content="a+b/c&#x3D;&amp;=="></head>', 'a+b/c=&=='),
+        ('<head>'
+         '<meta foo="bar" name="something" />'
+         '<meta content="THE-TOKEN" name="csrf-token" />'
+         '<meta name="yo" />'
+         '</head>', 'THE-TOKEN'),
+        ('<head><meta name="csrf-param" content="authenticity_token"></head>', ''),
+        ('<head><meta name="csrf-token"></head>', ''),
+        ('~~> This is not html. <-', ''),
+        ('', ''),
+    ),
+)
+def test_find_csrf_token(text, exp_token):
+    assert _html.find_csrf_token(text) == exp_token
+
+
+@pytest.mark.parametrize(
+    argnames='text',
+    argvalues=(
+        '<head><meta content="THE-TOKEN" name="csrf-token" /></head>',
+        '<head><meta foo="bar" name="something" /><meta content="THE-TOKEN" name="csrf-token"></head>',
+    ),
+)
+def test_find_csrf_token_finds_same_token_as_bs4(text):
+    assert _html._find_csrf_token_fast(text) == _html._find_csrf_token_bs4(text) == 'THE-TOKEN'
+
+
+def test_find_csrf_token_does_not_use_bs4_if_fast_path_succeeds():
+    with patch('pyimgbox._html._find_csrf_token_bs4') as bs4_mock:
+        assert _html.find_csrf_token('<meta content="THE-TOKEN" name="csrf-token" />') == 'THE-TOKEN'
+    assert bs4_mock.call_args_list == []
+
+
+def test_find_csrf_token_falls_back_to_bs4():
+    with patch('pyimgbox._html._find_csrf_token_fast', return_value=''):
+        assert _html.find_csrf_token('<meta content="THE-TOKEN" name="csrf-token" />') == 'THE-TOKEN'
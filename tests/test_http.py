@@ -1,10 +1,15 @@
+import asyncio
 import io
 import re
+import time
+from unittest.mock import Mock, call
 
+import httpx
 import pytest
 import pytest_asyncio
+from conftest import AsyncMock
 
-from pyimgbox import _http
+from pyimgbox import _http, _observer, _ratelimit
 
 
 @pytest_asyncio.fixture
@@ -13,6 +18,89 @@ async def client():
         yield client
 
 
+def test_Session_passes_arguments_to_AsyncClient(mocker):
+    AsyncClient_mock = mocker.patch('httpx.AsyncClient')
+    Limits_mock = mocker.patch('httpx.Limits')
+    Timeout_mock = mocker.patch('httpx.Timeout')
+    session = _http.Session(
+        max_connections=1,
+        max_keepalive_connections=2,
+        keepalive_expiry=3,
+        http2='mock http2',
+        timeouts=_http.Timeouts(connect=4, request=5),
+        transport='mock transport',
+    )
+    assert session._client is AsyncClient_mock.return_value
+    assert Timeout_mock.call_args_list == [call(5, connect=4)]
+    assert AsyncClient_mock.call_args_list == [call(
+        timeout=Timeout_mock.return_value,
+        http2='mock http2',
+        limits=Limits_mock.return_value,
+        transport='mock transport',
+    )]
+    assert Limits_mock.call_args_list == [call(
+        max_connections=1,
+        max_keepalive_connections=2,
+        keepalive_expiry=3,
+    )]
+
+@pytest.mark.asyncio
+async def test_Session_close():
+    session = _http.Session()
+    assert session.closed is False
+    async with session:
+        pass
+    assert session.closed is True
+
+
+@pytest.mark.asyncio
+async def test_HTTPClient_with_private_session():
+    client = _http.HTTPClient()
+    assert isinstance(client.session, _http.Session)
+    assert client._client is client.session._client
+    await client.close()
+    assert client.session.closed is True
+
+@pytest.mark.asyncio
+async def test_HTTPClient_with_shared_session():
+    async with _http.Session() as session:
+        client1 = _http.HTTPClient(session=session)
+        client2 = _http.HTTPClient(session=session)
+        assert client1.session is client2.session is session
+        assert client1._client is client2._client is session._client
+        client1.headers['foo'] = 'bar'
+        assert client2.headers == {}
+        await client1.close()
+        assert session.closed is False
+        await client2.close()
+        assert session.closed is False
+    assert session.closed is True
+
+def test_Session_has_rate_limit():
+    assert _http.Session().rate_limit is None
+    rate_limit = _ratelimit.RateLimiter(requests_per_second=1)
+    assert _http.Session(rate_limit=rate_limit).rate_limit is rate_limit
+
+def test_Session_has_token_cache():
+    assert isinstance(_http.Session().token_cache, _http._tokencache.TokenCache)
+    token_cache = _http._tokencache.TokenCache()
+    assert _http.Session(token_cache=token_cache).token_cache is token_cache
+
+
+@pytest.mark.asyncio
+async def test_HTTPClient_cookies(httpserver):
+    httpserver.expect_request(uri='/foo').respond_with_data('bar', headers={'Set-Cookie': 'session=abc; Path=/'})
+    url = httpserver.url_for('/foo')
+    async with _http.HTTPClient() as client:
+        assert client.cookies == []
+        await client.get(url)
+        cookies = client.cookies
+        assert [(c['name'], c['value'], c['path']) for c in cookies] == [('session', 'abc', '/')]
+    async with _http.HTTPClient() as client:
+        client.cookies = cookies
+        assert client.cookies == cookies
+
+
 @pytest.mark.asyncio
 async def test_get_sends_headers(client, httpserver):
     client.headers.update({'a': '123'})
@@ -71,6 +159,53 @@ async def test_get_cannot_connect(client):
     with pytest.raises(ConnectionError, match=f'^{url}: Connection failed$'):
         await client.get(url)
 
+@pytest.mark.asyncio
+async def test_get_reads_until_string(client, httpserver):
+    body = '<html><head><title>Foo</title></HEAD><body>' + ('x' * 100000) + '</body></html>'
+    httpserver.expect_request(uri='/foo', method='GET').respond_with_data(body)
+    url = httpserver.url_for('/foo')
+    response = await client.get(url, until='</head>')
+    assert response == '<html><head><title>Foo</title></HEAD>'
+
+@pytest.mark.asyncio
+async def test_get_reads_until_missing_string(client, httpserver):
+    httpserver.expect_request(uri='/foo', method='GET').respond_with_data('<html>Foo</html>')
+    url = httpserver.url_for('/foo')
+    response = await client.get(url, until='</head>')
+    assert response == '<html>Foo</html>'
+
+@pytest.mark.asyncio
+async def test_get_reads_until_string_and_gets_http_error_status(client, httpserver):
+    httpserver.expect_request(uri='/foo', method='GET').respond_with_data('No such URI', status=404)
+    url = httpserver.url_for('/foo')
+    with pytest.raises(ConnectionError, match=f'^{url}: No such URI$'):
+        await client.get(url, until='</head>')
+
+@pytest.mark.parametrize(
+    argnames='chunks, exp_text',
+    argvalues=(
+        ([b'<head></he', b'ad><body>'], '<head></head>'),
+        ([b'<head></HE', b'AD>', b'<body>'], '<head></HEAD>'),
+        ([b'<', b'/', b'h', b'e', b'a', b'd', b'>', b'x'], '</head>'),
+        ([b'<title>\xc3', b'\xa4</title></head>'], '<title>\xe4</title></head>'),
+        ([b'<head>', b'<body>'], '<head><body>'),
+    ),
+)
+@pytest.mark.asyncio
+async def test_read_until_handles_chunk_boundaries(chunks, exp_text):
+    consumed = []
+
+    class MockResponse:
+        encoding = 'utf-8'
+
+        async def aiter_bytes(self):
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+    assert await _http._read_until(MockResponse(), '</head>') == exp_text
+    assert consumed == chunks
+
 @pytest.mark.asyncio
 async def test_get_cannot_parse_json(client, httpserver):
     httpserver.expect_request(
@@ -134,6 +269,41 @@ async def test_post_sends_files(client, httpserver):
     assert re.search(request_data_regex, request_seen.data)
     assert response == 'bar'
 
+@pytest.mark.asyncio
+async def test_post_sends_files_with_content_length(client, httpserver):
+    files = {'files[]': ('asdf.jpg', io.BytesIO(b'image data'))}
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    response = await client.post(url, data={'foo': 'bar'}, files=files)
+    request_seen = httpserver.log[0][0]
+    assert 'Transfer-Encoding' not in request_seen.headers
+    assert int(request_seen.headers['Content-Length']) == len(request_seen.data)
+    assert request_seen.form.to_dict() == {'foo': 'bar'}
+    assert request_seen.files['files[]'].read() == b'image data'
+    assert response == 'bar'
+
+@pytest.mark.asyncio
+async def test_post_reports_progress(client, httpserver):
+    calls = []
+    files = {'files[]': ('asdf.jpg', io.BytesIO(b'image data'))}
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    await client.post(url, files=files, progress=lambda sent, total: calls.append((sent, total)))
+    total = len(httpserver.log[0][0].data)
+    assert calls[0] == (0, total)
+    assert calls[-1] == (total, total)
+
+@pytest.mark.asyncio
+async def test_post_sends_files_again_when_retrying(httpserver):
+    files = {'files[]': ('asdf.jpg', io.BytesIO(b'image data'))}
+    httpserver.expect_oneshot_request(uri='/foo', method='POST').respond_with_data('Wat', status=503)
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    async with _http.Session(retry=_http.RetryPolicy(max_attempts=2, backoff=0)) as session:
+        client = _http.HTTPClient(session=session)
+        assert await client.post(url, files=files) == 'bar'
+    assert [r.files['files[]'].read() for r, _ in httpserver.log] == [b'image data'] * 2
+
 @pytest.mark.asyncio
 async def test_post_gets_json(client, httpserver):
     json = {'bar': 'baz'}
@@ -182,3 +352,399 @@ async def test_post_cannot_parse_json(client, httpserver):
                            '{this is not json]')
     with pytest.raises(RuntimeError, match=f'^{url}: Invalid JSON: {json_error}'):
         await client.post(url, json=True)
+
+
+@pytest.mark.parametrize(
+    argnames='kwargs, exp_error',
+    argvalues=(
+        ({'max_attempts': 0}, 'Invalid max_attempts: 0'),
+        ({'max_attempts': 1.5}, 'Invalid max_attempts: 1.5'),
+        ({'jitter': -0.1}, 'Invalid jitter: -0.1'),
+        ({'jitter': 1.1}, 'Invalid jitter: 1.1'),
+    ),
+)
+def test_RetryPolicy_gets_invalid_argument(kwargs, exp_error):
+    with pytest.raises(ValueError, match=rf'^{re.escape(exp_error)}$'):
+        _http.RetryPolicy(**kwargs)
+
+def test_RetryPolicy_get_delay_gives_up_after_max_attempts():
+    policy = _http.RetryPolicy(max_attempts=3, backoff=1, jitter=0)
+    assert policy.get_delay(1, ConnectionError()) == 1
+    assert policy.get_delay(2, ConnectionError()) == 2
+    assert policy.get_delay(3, ConnectionError()) is None
+
+def test_RetryPolicy_get_delay_backs_off_exponentially():
+    policy = _http.RetryPolicy(max_attempts=10, backoff=0.5, max_delay=5, jitter=0)
+    assert [policy.get_delay(n, ConnectionError()) for n in range(1, 7)] == [0.5, 1, 2, 4, 5, 5]
+
+def test_RetryPolicy_get_delay_adds_jitter(mocker):
+    mocker.patch('random.random', return_value=0.5)
+    policy = _http.RetryPolicy(max_attempts=10, backoff=1, jitter=0.5)
+    assert policy.get_delay(3, ConnectionError()) == 3
+
+def test_RetryPolicy_get_delay_honors_retry_after():
+    policy = _http.RetryPolicy(max_attempts=10, backoff=1, max_delay=10, jitter=0)
+    assert policy.get_delay(1, _http._RequestError('foo', status_code=503, retry_after=7)) == 7
+    assert policy.get_delay(1, _http._RequestError('foo', status_code=503, retry_after=11)) is None
+
+def test_RetryPolicy_report():
+    callback = Mock()
+    _http.RetryPolicy().report('mock attempt')
+    _http.RetryPolicy(callback=callback).report('mock attempt')
+    assert callback.call_args_list == [call('mock attempt')]
+
+
+@pytest.mark.parametrize(
+    argnames='kwargs, exp_error',
+    argvalues=(
+        ({'connect': 0}, 'Invalid connect: 0'),
+        ({'request': -1}, 'Invalid request: -1'),
+        ({'upload': 0}, 'Invalid upload: 0'),
+        ({'stall_interval': 0}, 'Invalid stall_interval: 0'),
+        ({'min_throughput': 0}, 'Invalid min_throughput: 0'),
+    ),
+)
+def test_Timeouts_gets_invalid_argument(kwargs, exp_error):
+    with pytest.raises(ValueError, match=rf'^{re.escape(exp_error)}$'):
+        _http.Timeouts(**kwargs)
+
+def test_Timeouts_get_upload_timeout_scales_with_size():
+    timeouts = _http.Timeouts(upload=60, min_throughput=1000)
+    assert timeouts.get_upload_timeout(0) == 60
+    assert timeouts.get_upload_timeout(5000) == 65
+    assert timeouts.get_upload_timeout(10**6) == 1060
+
+def test_Timeouts_get_upload_timeout_without_min_throughput():
+    timeouts = _http.Timeouts(upload=60, min_throughput=None)
+    assert timeouts.get_upload_timeout(10**9) == 60
+
+def test_Timeouts_get_httpx_timeout():
+    timeouts = _http.Timeouts(connect=3, request=7)
+    assert timeouts.get_httpx_timeout() == httpx.Timeout(7, connect=3)
+    assert timeouts.get_httpx_timeout(100) == httpx.Timeout(100, connect=3)
+
+
+@pytest.mark.asyncio
+async def test_request_times_out(mocker):
+    attempts = []
+    session = _http.Session(
+        retry=_http.RetryPolicy(max_attempts=2, backoff=0, callback=attempts.append),
+        timeouts=_http.Timeouts(request=0.05),
+    )
+
+    async def catch_errors(request, **kwargs):
+        await asyncio.sleep(10)
+
+    url = 'http://localhost:12345/foo'
+    async with session:
+        client = _http.HTTPClient(session=session)
+        mocker.patch.object(client, '_catch_errors', catch_errors)
+        with pytest.raises(ConnectionError, match=rf'^{url}: Timeout after 0.05 seconds$'):
+            await client.get(url)
+    assert [a.number for a in attempts] == [1, 2]
+
+@pytest.mark.asyncio
+async def test_post_uses_upload_timeout_for_files(mocker):
+    session = _http.Session(timeouts=_http.Timeouts(upload=60, min_throughput=10))
+    client = _http.HTTPClient(session=session)
+    request_mock = mocker.patch.object(client, '_request', AsyncMock(return_value='response'))
+    files = {'files[]': ('asdf.jpg', io.BytesIO(b'image data'))}
+    async with session:
+        assert await client.post('http://localhost/foo', files=files) == 'response'
+    body = request_mock.call_args[1]['content']
+    assert request_mock.call_args[1]['timeout'] == 60 + len(body) / 10
+    assert isinstance(request_mock.call_args[1]['stall'], _http._StallDetector)
+
+@pytest.mark.asyncio
+async def test_StallDetector_returns_result():
+    stall = _http._StallDetector(min_throughput=100, interval=0.01)
+
+    async def upload():
+        for sent in range(0, 11):
+            stall.update(sent * 10, 100)
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        return 'response'
+
+    assert await stall.watch(upload(), 'http://foo', 10) == 'response'
+
+@pytest.mark.asyncio
+async def test_StallDetector_aborts_stalled_upload():
+    stall = _http._StallDetector(min_throughput=1000, interval=0.02)
+    cancelled = []
+
+    async def upload():
+        stall.update(10, 100)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(_http._RequestError, match=r'^http://foo: Upload stalled: \d+ bytes per second in the last 0.02 seconds$') as exc_info:
+        await stall.watch(upload(), 'http://foo', 10)
+    assert exc_info.value.retryable is True
+    assert cancelled == [True]
+
+@pytest.mark.asyncio
+async def test_StallDetector_does_not_measure_throttled_time():
+    async def send(nbytes):
+        await asyncio.sleep(0.05)
+
+    stall = _http._StallDetector(min_throughput=10**9, interval=0.02, send=send)
+
+    async def upload():
+        for sent in range(0, 101, 10):
+            await stall.throttle(10)
+            stall.update(sent, 100)
+        return 'response'
+
+    assert await stall.watch(upload(), 'http://foo', 0.1) == 'response'
+
+@pytest.mark.asyncio
+async def test_StallDetector_times_out():
+    stall = _http._StallDetector(min_throughput=None, interval=0.01)
+
+    async def upload():
+        await asyncio.sleep(10)
+
+    with pytest.raises(_http._RequestError, match=r'^http://foo: Timeout after 0.05 seconds$') as exc_info:
+        await stall.watch(upload(), 'http://foo', 0.05)
+    assert exc_info.value.retryable is True
+
+@pytest.mark.asyncio
+async def test_post_does_not_abort_uploads_throttled_by_shared_rate_limit(httpserver):
+    # Each of the 4 uploads gets ~25000 bytes per second, which is slower than
+    # min_throughput
+    attempts = []
+    session = _http.Session(
+        rate_limit=_ratelimit.RateLimiter(bytes_per_second=100000),
+        retry=_http.RetryPolicy(max_attempts=2, backoff=0, callback=attempts.append),
+        timeouts=_http.Timeouts(upload=0.5, min_throughput=100000, stall_interval=0.1),
+    )
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+
+    async def upload(i):
+        files = {'files[]': (f'{i}.jpg', io.BytesIO(b'x' * 30000))}
+        return await client.post(url, files=files)
+
+    async with session:
+        client = _http.HTTPClient(session=session)
+        assert await asyncio.gather(*(upload(i) for i in range(4))) == ['bar'] * 4
+    assert [a.error for a in attempts] == [None] * 4
+
+@pytest.mark.asyncio
+async def test_StallDetector_without_min_throughput():
+    stall = _http._StallDetector(min_throughput=None, interval=0.01)
+
+    async def upload():
+        await asyncio.sleep(0.05)
+        return 'response'
+
+    assert await stall.watch(upload(), 'http://foo', 10) == 'response'
+
+
+@pytest.mark.parametrize(
+    argnames='value, exp_seconds',
+    argvalues=(
+        (None, None),
+        ('', None),
+        ('foo', None),
+        ('12', 12.0),
+        ('1.5', 1.5),
+        ('-3', 0.0),
+        ('Wed, 21 Oct 2015 07:28:00 GMT', 0.0),
+    ),
+)
+def test_parse_retry_after(value, exp_seconds):
+    assert _http._parse_retry_after(value) == exp_seconds
+
+def test_parse_retry_after_with_future_date():
+    import email.utils
+    value = email.utils.formatdate(time.time() + 100, usegmt=True)
+    assert 95 < _http._parse_retry_after(value) <= 100
+
+
+@pytest.mark.parametrize(
+    argnames='status, exp_retryable',
+    argvalues=(
+        (400, False),
+        (404, False),
+        (413, False),
+        (429, True),
+        (500, True),
+        (502, True),
+        (503, True),
+        (504, True),
+    ),
+)
+@pytest.mark.asyncio
+async def test_request_retries_status(status, exp_retryable, httpserver):
+    attempts = []
+    session = _http.Session(retry=_http.RetryPolicy(max_attempts=3, backoff=0, callback=attempts.append))
+    httpserver.expect_oneshot_request(uri='/foo', method='POST').respond_with_data('Wat', status=status)
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    async with session:
+        client = _http.HTTPClient(session=session)
+        if exp_retryable:
+            assert await client.post(url) == 'bar'
+            assert [(a.number, a.error, a.delay) for a in attempts] == [
+                (1, f'{url}: Wat' if status != 413 else f'{url}: File too large', 0),
+                (2, None, None),
+            ]
+        else:
+            with pytest.raises(ConnectionError):
+                await client.post(url)
+            assert len(attempts) == 1
+            assert attempts[0].delay is None
+    assert all(a.method == 'POST' and a.url == url for a in attempts)
+    assert all(a.duration >= 0 for a in attempts)
+
+@pytest.mark.asyncio
+async def test_request_gives_up_after_max_attempts(httpserver):
+    attempts = []
+    session = _http.Session(retry=_http.RetryPolicy(max_attempts=3, backoff=0, callback=attempts.append))
+    httpserver.expect_request(uri='/foo', method='GET').respond_with_data('Wat', status=503)
+    url = httpserver.url_for('/foo')
+    async with session:
+        client = _http.HTTPClient(session=session)
+        with pytest.raises(ConnectionError, match=f'^{url}: Wat$'):
+            await client.get(url)
+    assert [(a.number, a.delay) for a in attempts] == [(1, 0), (2, 0), (3, None)]
+    assert len(httpserver.log) == 3
+
+@pytest.mark.asyncio
+async def test_request_retries_connection_error(mocker):
+    attempts = []
+    sleep_mock = mocker.patch('asyncio.sleep', AsyncMock())
+    session = _http.Session(retry=_http.RetryPolicy(max_attempts=2, backoff=1, jitter=0, callback=attempts.append))
+    url = 'http://localhost:12345/foo/bar'
+    async with session:
+        client = _http.HTTPClient(session=session)
+        with pytest.raises(ConnectionError, match=f'^{url}: Connection failed$'):
+            await client.get(url)
+    assert [(a.number, a.error, a.delay) for a in attempts] == [
+        (1, f'{url}: Connection failed', 1),
+        (2, f'{url}: Connection failed', None),
+    ]
+    assert sleep_mock.call_args_list == [call(1)]
+
+@pytest.mark.asyncio
+async def test_request_honors_retry_after(httpserver, mocker):
+    sleep_mock = mocker.patch('asyncio.sleep', AsyncMock())
+    session = _http.Session(retry=_http.RetryPolicy(max_attempts=2, backoff=100))
+    httpserver.expect_oneshot_request(uri='/foo').respond_with_data('Slow down', status=429, headers={'Retry-After': '3'})
+    httpserver.expect_request(uri='/foo').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    async with session:
+        client = _http.HTTPClient(session=session)
+        assert await client.get(url) == 'bar'
+    assert sleep_mock.call_args_list == [call(3.0)]
+
+@pytest.mark.asyncio
+async def test_request_does_not_retry_by_default(httpserver):
+    httpserver.expect_request(uri='/foo').respond_with_data('Wat', status=503)
+    url = httpserver.url_for('/foo')
+    async with _http.HTTPClient() as client:
+        with pytest.raises(ConnectionError, match=f'^{url}: Wat$'):
+            await client.get(url)
+    assert len(httpserver.log) == 1
+
+@pytest.mark.asyncio
+async def test_request_waits_for_rate_limit_before_each_attempt(httpserver, mocker):
+    rate_limit = _ratelimit.RateLimiter(requests_per_second=100, adaptive=True)
+    request_mock = mocker.patch.object(rate_limit, 'request', AsyncMock())
+    report_mock = mocker.patch.object(rate_limit, 'report')
+    session = _http.Session(retry=_http.RetryPolicy(max_attempts=2, backoff=0), rate_limit=rate_limit)
+    httpserver.expect_oneshot_request(uri='/foo').respond_with_data('Wat', status=503)
+    httpserver.expect_request(uri='/foo').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    async with session:
+        client = _http.HTTPClient(session=session)
+        assert await client.get(url) == 'bar'
+    assert request_mock.call_args_list == [call(), call()]
+    assert [type(c[0][1]) for c in report_mock.call_args_list[:1]] == [_http._RequestError]
+    assert report_mock.call_args_list[0][0][1].retryable is True
+    assert len(report_mock.call_args_list[1][0]) == 1
+
+@pytest.mark.asyncio
+async def test_post_throttles_uploaded_bytes(httpserver, mocker):
+    rate_limit = _ratelimit.RateLimiter(bytes_per_second=10**9)
+    send_mock = mocker.patch.object(rate_limit, 'send', AsyncMock())
+    files = {'files[]': ('asdf.jpg', io.BytesIO(b'image data'))}
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    async with _http.Session(rate_limit=rate_limit) as session:
+        client = _http.HTTPClient(session=session)
+        assert await client.post(url, files=files) == 'bar'
+    assert sum(c[0][0] for c in send_mock.call_args_list) == len(httpserver.log[0][0].data)
+
+
+class RecordingObserver(_observer.Observer):
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.timings = []
+
+    def request(self, timing):
+        self.timings.append(timing)
+
+@pytest.mark.parametrize('trace', (False, True))
+@pytest.mark.asyncio
+async def test_request_reports_timing_to_observer(trace, httpserver):
+    observer = RecordingObserver(trace=trace)
+    httpserver.expect_request(uri='/foo', method='POST').respond_with_data('bar')
+    url = httpserver.url_for('/foo')
+    files = {'files[]': ('asdf.jpg', io.BytesIO(b'image data'))}
+    async with _http.Session(observer=observer) as session:
+        client = _http.HTTPClient(session=session)
+        assert await client.post(url, files=files) == 'bar'
+    assert len(observer.timings) == 1
+    timing = observer.timings[0]
+    assert (timing.method, timing.url, timing.status_code, timing.error, timing.error_type) == \
+        ('POST', url, 200, None, None)
+    assert timing.bytes_sent == len(httpserver.log[0][0].data)
+    assert timing.bytes_received == 3
+    assert timing.duration > 0
+    if trace:
+        assert {'connect', 'send', 'wait', 'receive'} <= set(timing.phases)
+        assert all(seconds >= 0 for seconds in timing.phases.values())
+        assert sum(timing.phases.values()) <= timing.duration
+    else:
+        assert timing.phases == {}
+
+@pytest.mark.asyncio
+async def test_request_reports_errors_to_observer(httpserver):
+    observer = RecordingObserver()
+    httpserver.expect_oneshot_request(uri='/foo').respond_with_data('Wat', status=503)
+    httpserver.expect_oneshot_request(uri='/foo').respond_with_data('not json')
+    url = httpserver.url_for('/foo')
+    async with _http.Session(observer=observer, retry=_http.RetryPolicy(max_attempts=2, backoff=0)) as session:
+        client = _http.HTTPClient(session=session)
+        with pytest.raises(RuntimeError, match=r'Invalid JSON'):
+            await client.get(url, json=True)
+        with pytest.raises(ConnectionError, match=r'Connection failed'):
+            await client.get('http://localhost:12345/foo')
+    assert [(t.status_code, t.error_type) for t in observer.timings] == [
+        (503, 'HTTPStatusError'),
+        (200, 'JSONDecodeError'),
+        (None, 'ConnectError'),
+        (None, 'ConnectError'),
+    ]
+    assert observer.timings[0].error == f'{url}: Wat'
+
+@pytest.mark.asyncio
+async def test_RequestStats_adds_durations_of_phases(mocker):
+    mocker.patch('pyimgbox._observer.time', Mock(monotonic=Mock(side_effect=[1.0, 1.5, 2.0, 2.1, 2.1, 2.4, 2.5, 3.5])))
+    stats = _observer._RequestStats()
+    events = (
+        'connection.connect_tcp.started', 'connection.connect_tcp.complete',
+        'http11.send_request_headers.started', 'http11.send_request_headers.complete',
+        'http11.send_request_body.started', 'http11.send_request_body.complete',
+        'http11.receive_response_headers.started', 'http11.receive_response_headers.complete',
+        'http11.response_closed.started', 'http11.receive_response_body.complete',
+    )
+    for event in events:
+        await stats(event, {})
+    assert stats.phases == {'connect': 0.5, 'send': pytest.approx(0.4), 'wait': 1.0}
@@ -0,0 +1,71 @@
+import io
+import struct
+
+import pytest
+
+from pyimgbox import _image
+
+
+def make_png(width, height):
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR'
+            + struct.pack('>II', width, height) + b'\x08\x02\x00\x00\x00')
+
+def make_gif(width, height):
+    return b'GIF89a' + struct.pack('<HH', width, height) + b'\x00\x00\x00'
+
+def make_jpeg(width, height, exif_size=100):
+    exif = b'\xff\xe1' + struct.pack('>H', exif_size + 2) + b'\x00' * exif_size
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    return b'\xff\xd8' + exif + sof + b'\xff\xda\x00\x02' + b'image data'
+
+
+@pytest.mark.parametrize(
+    argnames='data, exp_info',
+    argvalues=(
+        (make_png(640, 480), _image.ImageInfo('png', 640, 480)),
+        (make_gif(320, 200), _image.ImageInfo('gif', 320, 200)),
+        (make_jpeg(1920, 1080), _image.ImageInfo('jpeg', 1920, 1080)),
+        (make_jpeg(1, 2, exif_size=60000), _image.ImageInfo('jpeg', 1, 2)),
+    ),
+    ids=lambda v: repr(v)[:30],
+)
+def test_sniff_finds_image_info(data, exp_info):
+    fileobj = io.BytesIO(data)
+    fileobj.seek(5)
+    assert _image.sniff(fileobj) == exp_info
+    assert fileobj.tell() == 5
+
+def test_sniff_does_not_read_jpeg_metadata():
+    class File(io.BytesIO):
+        bytes_read = 0
+
+        def read(self, *args, **kwargs):
+            data = super().read(*args, **kwargs)
+            self.bytes_read += len(data)
+            return data
+
+    fileobj = File(make_jpeg(100, 100, exif_size=60000))
+    assert _image.sniff(fileobj) == _image.ImageInfo('jpeg', 100, 100)
+    assert fileobj.bytes_read < 100
+
+@pytest.mark.parametrize(
+    argnames='data, exp_message',
+    argvalues=(
+        (b'', 'Unsupported file type'),
+        (b'BM\x00\x00\x00\x00', 'Unsupported file type'),
+        (b'<html></html>', 'Unsupported file type'),
+        (make_png(640, 480)[:20], 'Invalid PNG header'),
+        (make_png(0, 480), 'Invalid PNG dimensions: 0x480'),
+        (make_gif(320, 200)[:8], 'Invalid GIF header'),
+        (make_gif(320, 0), 'Invalid GIF dimensions: 320x0'),
+        (b'\xff\xd8', 'Invalid JPEG header'),
+        (b'\xff\xd8\x00\x00', 'Invalid JPEG header'),
+        (b'\xff\xd8\xff\xda\x00\x02', 'Invalid JPEG header'),
+        (make_jpeg(100, 100)[:110], 'Invalid JPEG header'),
+        (make_jpeg(0, 0), 'Invalid JPEG dimensions: 0x0'),
+    ),
+    ids=lambda v: repr(v)[:30],
+)
+def test_sniff_raises_ValueError(data, exp_message):
+    with pytest.raises(ValueError, match=rf'^{exp_message}$'):
+        _image.sniff(io.BytesIO(data))
@@ -0,0 +1,59 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+import pyimgbox
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(pyimgbox.__file__)))
+
+# Generous limit for slow CI machines; benchmarks/bench_import.py is stricter
+IMPORT_TIME_BUDGET = 0.1
+
+
+def run_python(*args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (PROJECT_PATH, env.get('PYTHONPATH')) if p)
+    return subprocess.run(
+        [sys.executable, *args],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+@pytest.mark.parametrize(
+    argnames='statement, exp_unloaded',
+    argvalues=(
+        ('import pyimgbox', ('asyncio', 'bs4', 'httpx', 'sqlite3')),
+        ('from pyimgbox import MAX_FILE_SIZE, Submission', ('asyncio', 'bs4', 'httpx', 'sqlite3')),
+        ('from pyimgbox import Gallery', ('bs4', 'httpx')),
+        ('from pyimgbox import Gallery; Gallery()', ('bs4',)),
+    ),
+)
+def test_heavy_dependencies_are_imported_lazily(statement, exp_unloaded):
+    proc = run_python('-c', f'{statement}; import sys; print(sorted(sys.modules))')
+    loaded = set(eval(proc.stdout))
+    for module in exp_unloaded:
+        assert module not in loaded
+
+
+def test_lazy_attributes():
+    assert 'Gallery' in dir(pyimgbox)
+    assert pyimgbox.Gallery is pyimgbox._gallery.Gallery
+    assert pyimgbox.Session is pyimgbox._http.Session
+    assert pyimgbox.RetryPolicy is pyimgbox._http.RetryPolicy
+    assert pyimgbox.DedupCache is pyimgbox._dedup.DedupCache
+    with pytest.raises(AttributeError, match=r"^module 'pyimgbox' has no attribute 'foo'$"):
+        pyimgbox.foo
+
+
+def test_import_time_budget():
+    proc = run_python('-X', 'importtime', '-c', 'import pyimgbox')
+    match = re.search(r'^import time:\s*\d+\s*\|\s*(\d+)\s*\| pyimgbox$', proc.stderr, flags=re.MULTILINE)
+    assert match
+    assert int(match.group(1)) / 1e6 < IMPORT_TIME_BUDGET
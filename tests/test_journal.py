@@ -0,0 +1,82 @@
+import json
+
+from pyimgbox import _journal
+
+
+def read_records(filepath):
+    with open(filepath) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_Journal_without_file(tmp_path):
+    filepath = str(tmp_path / 'journal')
+    journal = _journal.Journal(filepath)
+    assert journal.filepath == filepath
+    assert journal.gallery_token == {}
+    assert journal.get('foo.jpg', 'abc') is None
+    assert not (tmp_path / 'journal').exists()
+    assert repr(journal) == f'Journal({filepath!r})'
+
+
+def test_Journal_writes_records(tmp_path, make_submission):
+    filepath = str(tmp_path / 'journal')
+    journal = _journal.Journal(filepath)
+    journal.add_gallery({'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'})
+    journal.add_submission('foo.jpg', 'abc', make_submission('foo.jpg'))
+    assert journal.gallery_token == {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}
+    assert journal.get('foo.jpg', 'abc') == make_submission('foo.jpg')
+    assert journal.get('foo.jpg', 'def') is None
+    assert journal.get('bar.jpg', 'abc') is None
+    journal.close()
+    journal.close()
+    assert read_records(filepath) == [
+        {'type': 'gallery', 'token': {'token_id': 'a', 'token_secret': 'b', 'gallery_id': 'c', 'gallery_secret': 'd'}},
+        {'type': 'submission', 'filepath': 'foo.jpg', 'hash': 'abc', 'submission': {
+            'filepath': 'foo.jpg',
+            'image_url': 'https://foo/foo.jpg',
+            'thumbnail_url': 'https://foo/foo_t.jpg',
+            'web_url': 'https://foo/foo',
+            'gallery_url': 'https://foo/gallery',
+            'edit_url': 'https://foo/gallery/edit',
+        }},
+    ]
+
+
+def test_Journal_reads_records(tmp_path, make_submission):
+    filepath = str(tmp_path / 'journal')
+    journal = _journal.Journal(filepath)
+    journal.add_gallery({'token_id': 'a'})
+    journal.add_submission('foo.jpg', 'abc', make_submission('foo.jpg'))
+    journal.add_submission('bar.jpg', 'def', make_submission('bar.jpg'))
+    journal.close()
+
+    journal = _journal.Journal(filepath)
+    assert journal.gallery_token == {'token_id': 'a'}
+    assert journal.get('foo.jpg', 'abc') == make_submission('foo.jpg')
+    assert journal.get('bar.jpg', 'def') == make_submission('bar.jpg')
+
+    # New records are appended
+    journal.add_submission('baz.jpg', 'ghi', make_submission('baz.jpg'))
+    journal.close()
+    assert len(read_records(filepath)) == 4
+
+
+def test_Journal_ignores_invalid_records(tmp_path, make_submission):
+    filepath = tmp_path / 'journal'
+    filepath.write_text(
+        json.dumps({'type': 'gallery', 'token': {'token_id': 'a'}}) + '\n'
+        + 'not json\n'
+        + json.dumps({'type': 'foo'}) + '\n'
+        + json.dumps({'type': 'submission'}) + '\n'
+        + json.dumps({'type': 'submission', 'filepath': 'foo.jpg', 'hash': 'abc',
+                      'submission': dict(make_submission('foo.jpg'))})[:-10]
+    )
+    journal = _journal.Journal(str(filepath))
+    assert journal.gallery_token == {'token_id': 'a'}
+    assert journal.get('foo.jpg', 'abc') is None
+
+    # Incomplete last line is terminated before appending
+    journal.add_submission('bar.jpg', 'def', make_submission('bar.jpg'))
+    journal.close()
+    journal = _journal.Journal(str(filepath))
+    assert journal.get('bar.jpg', 'def') == make_submission('bar.jpg')
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from conftest import IMAGE_HEADER
+
+from pyimgbox import Gallery, Session
+
+BENCHMARKS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCHMARKS_PATH)
+import mockserver  # noqa: E402  isort:skip
+
+
+@pytest.mark.asyncio
+async def test_Gallery_uploads_to_MockServer(tmp_path):
+    filepaths = []
+    for i in range(4):
+        filepath = tmp_path / f'{i}.png'
+        filepath.write_bytes(IMAGE_HEADER + os.urandom(100000))
+        filepaths.append(str(filepath))
+
+    async with mockserver.MockServer() as server:
+        transport = mockserver.RedirectTransport(server.url)
+        async with Session(transport=transport) as session:
+            async with Gallery(title='Foo', session=session, concurrency=2) as gallery:
+                submissions = [s async for s in gallery.add(filepaths, ordered=True)]
+
+    assert [(s['filepath'], s['success'], s['error']) for s in submissions] == [
+        (filepath, True, None) for filepath in filepaths
+    ]
+    assert len({s['gallery_url'] for s in submissions}) == 1
+    # CSRF token, gallery token and one request per file
+    assert server.requests == 6
+    assert server.files == 4
+    assert server.bytes_received > 4 * 100000
+    # Connections are reused
+    assert server.connections <= 2
+
+
+@pytest.mark.asyncio
+async def test_MockServer_handles_aborted_upload():
+    errors = []
+    loop = asyncio.get_event_loop()
+    loop.set_exception_handler(lambda loop, context: errors.append(context))
+    try:
+        async with mockserver.MockServer() as server:
+            host, port = server.url.split('//')[1].split(':')
+            reader, writer = await asyncio.open_connection(host, int(port))
+            writer.write(b'POST /upload/process HTTP/1.1\r\nContent-Length: 1000\r\n\r\npartial body')
+            await writer.drain()
+            writer.close()
+            while server.connections < 1:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+    finally:
+        loop.set_exception_handler(None)
+    assert errors == []
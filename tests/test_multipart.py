@@ -0,0 +1,147 @@
+import io
+import re
+
+import pytest
+
+from pyimgbox import _multipart
+
+
+async def read(stream):
+    return b''.join([chunk async for chunk in stream])
+
+
+def test_MultipartStream_boundary():
+    stream = _multipart.MultipartStream()
+    assert re.search(r'^[0-9a-f]{32}$', stream.boundary)
+    assert stream.boundary != _multipart.MultipartStream().boundary
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_without_fields():
+    stream = _multipart.MultipartStream()
+    assert await read(stream) == f'--{stream.boundary}--\r\n'.encode()
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_encodes_data_and_files():
+    stream = _multipart.MultipartStream(
+        data={'foo': 'bar', 'number': 123},
+        files={'files[]': ('asdf.png', io.BytesIO(b'image data'))},
+    )
+    b = stream.boundary
+    assert await read(stream) == (
+        f'--{b}\r\n'
+        'Content-Disposition: form-data; name="foo"\r\n\r\n'
+        'bar\r\n'
+        f'--{b}\r\n'
+        'Content-Disposition: form-data; name="number"\r\n\r\n'
+        '123\r\n'
+        f'--{b}\r\n'
+        'Content-Disposition: form-data; name="files[]"; filename="asdf.png"\r\n'
+        'Content-Type: image/png\r\n\r\n'
+        'image data\r\n'
+        f'--{b}--\r\n'
+    ).encode()
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_gets_sequence_of_files():
+    stream = _multipart.MultipartStream(
+        files=[
+            ('files[]', ('a.jpg', io.BytesIO(b'foo'))),
+            ('files[]', ('b', io.BytesIO(b'bar'), 'image/gif')),
+        ],
+    )
+    b = stream.boundary
+    assert await read(stream) == (
+        f'--{b}\r\n'
+        'Content-Disposition: form-data; name="files[]"; filename="a.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+        'foo\r\n'
+        f'--{b}\r\n'
+        'Content-Disposition: form-data; name="files[]"; filename="b"\r\n'
+        'Content-Type: image/gif\r\n\r\n'
+        'bar\r\n'
+        f'--{b}--\r\n'
+    ).encode()
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_escapes_names():
+    stream = _multipart.MultipartStream(files={'a"b': ('c\\d\n"e".jpg', io.BytesIO(b''))})
+    assert b'name="a%22b"; filename="c\\\\d%0A%22e%22.jpg"' in await read(stream)
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_reads_file_in_chunks(tmp_path):
+    filepath = tmp_path / 'foo.jpg'
+    filepath.write_bytes(b'x' * 1000)
+    with open(filepath, 'rb') as f:
+        stream = _multipart.MultipartStream(files={'files[]': ('foo.jpg', f)}, chunk_size=300)
+        chunks = [chunk async for chunk in stream]
+    assert [len(c) for c in chunks if c == b'x' * len(c)] == [300, 300, 300, 100]
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_length(tmp_path):
+    filepath = tmp_path / 'foo.jpg'
+    filepath.write_bytes(b'x' * 1000)
+    with open(filepath, 'rb') as f:
+        stream = _multipart.MultipartStream(
+            data={'foo': 'bär'},
+            files=[('files[]', ('foo.jpg', f)), ('files[]', ('bar.jpg', io.BytesIO(b'bar')))],
+        )
+        assert len(stream) == len(await read(stream))
+        assert stream.headers == {
+            'Content-Type': f'multipart/form-data; boundary={stream.boundary}',
+            'Content-Length': str(len(stream)),
+        }
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_can_be_read_repeatedly():
+    fileobj = io.BytesIO(b'image data')
+    stream = _multipart.MultipartStream(files={'files[]': ('foo.jpg', fileobj)})
+    assert await read(stream) == await read(stream)
+    assert b'image data' in await read(stream)
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_reports_bytes_sent():
+    calls = []
+    fileobj = io.BytesIO(b'x' * 1000)
+    stream = _multipart.MultipartStream(
+        files={'files[]': ('foo.jpg', fileobj)},
+        chunk_size=400,
+        callback=lambda sent, total: calls.append((sent, total)),
+    )
+    body = await read(stream)
+    total = len(body)
+    assert calls[0] == (0, total)
+    assert calls[-1] == (total, total)
+    assert [sent for sent, _ in calls] == sorted(sent for sent, _ in calls)
+    assert all(t == total for _, t in calls)
+
+    # Reading again starts over
+    calls.clear()
+    await read(stream)
+    assert calls[0] == (0, total)
+    assert calls[-1] == (total, total)
+
+
+@pytest.mark.asyncio
+async def test_MultipartStream_throttles_each_chunk():
+    sizes = []
+
+    async def throttle(nbytes):
+        sizes.append(nbytes)
+
+    fileobj = io.BytesIO(b'x' * 1000)
+    stream = _multipart.MultipartStream(
+        files={'files[]': ('foo.jpg', fileobj)},
+        chunk_size=400,
+        throttle=throttle,
+    )
+    body = await read(stream)
+    assert sum(sizes) == len(body)
+    assert 400 in sizes and 200 in sizes
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from pyimgbox import _pool
+
+
+@pytest.mark.parametrize('concurrency', (0, -1, 1.5, '2', None))
+def test_WorkerPool_gets_invalid_concurrency(concurrency):
+    with pytest.raises(ValueError, match=rf'^Invalid concurrency: {concurrency!r}$'):
+        _pool.WorkerPool(func=None, concurrency=concurrency)
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_limits_concurrency():
+    running = []
+    max_running = 0
+
+    async def func(item):
+        nonlocal max_running
+        running.append(item)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(item)
+        return item * 10
+
+    pool = _pool.WorkerPool(func=func, concurrency=3)
+    results = [r async for r in pool.map(range(10))]
+    assert sorted(results) == [i * 10 for i in range(10)]
+    assert max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_yields_in_completion_order():
+    async def func(item):
+        await asyncio.sleep(item / 100)
+        return item
+
+    pool = _pool.WorkerPool(func=func, concurrency=3)
+    results = [r async for r in pool.map([3, 1, 2])]
+    assert results == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_yields_in_input_order():
+    async def func(item):
+        await asyncio.sleep(item / 100)
+        return item
+
+    pool = _pool.WorkerPool(func=func, concurrency=3)
+    results = [r async for r in pool.map([3, 1, 2], ordered=True)]
+    assert results == [3, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_handles_no_items():
+    async def func(item):
+        return item
+
+    pool = _pool.WorkerPool(func=func, concurrency=3)
+    assert [r async for r in pool.map([])] == []
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_raises_exception_from_func_and_cancels_pending_calls():
+    cancelled = []
+
+    async def func(item):
+        if item == 0:
+            raise RuntimeError('Nope')
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+
+    pool = _pool.WorkerPool(func=func, concurrency=3)
+    with pytest.raises(RuntimeError, match=r'^Nope$'):
+        [r async for r in pool.map(range(10))]
+    assert sorted(cancelled) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_raises_exception_from_items():
+    def items():
+        yield 1
+        raise OSError('No more items')
+
+    async def func(item):
+        await asyncio.sleep(10)
+
+    pool = _pool.WorkerPool(func=func, concurrency=3)
+    with pytest.raises(OSError, match=r'^No more items$'):
+        [r async for r in pool.map(items())]
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_gets_async_iterable():
+    async def items():
+        for i in range(5):
+            yield i
+
+    async def func(item):
+        return item * 10
+
+    pool = _pool.WorkerPool(func=func, concurrency=2)
+    results = [r async for r in pool.map(items(), ordered=True)]
+    assert results == [0, 10, 20, 30, 40]
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_requests_items_lazily():
+    requested = []
+
+    def items():
+        for i in range(10):
+            requested.append(i)
+            yield i
+
+    async def func(item):
+        await asyncio.sleep(0.01)
+        return len(requested) - item
+
+    pool = _pool.WorkerPool(func=func, concurrency=2)
+    results = [r async for r in pool.map(items())]
+    # No item is requested more than `concurrency` items ahead of the
+    # current item
+    assert all(r <= 2 for r in results)
+
+
+@pytest.mark.asyncio
+async def test_WorkerPool_map_follows_concurrency_changes():
+    running = []
+    max_running = []
+
+    async def func(item):
+        running.append(item)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(item)
+        # Raise limit in first half and lower it in the second half
+        pool.concurrency = 4 if item < 10 else 1
+        return item
+
+    pool = _pool.WorkerPool(func=func, concurrency=1)
+    results = [r async for r in pool.map(range(20))]
+    assert sorted(results) == list(range(20))
+    assert max(max_running) == 4
+    assert max_running[-3:] == [1, 1, 1]
@@ -0,0 +1,67 @@
+from unittest.mock import Mock, call
+
+from pyimgbox import _progress
+
+
+def test_FileProgress_repr():
+    f = _progress.FileProgress('foo.jpg', bytes_sent=1, bytes_total=2)
+    assert repr(f) == "FileProgress(filepath='foo.jpg', bytes_sent=1, bytes_total=2)"
+
+
+def test_Progress_tracks_files():
+    p = _progress.Progress()
+    assert p.files == ()
+    f1 = p.start('foo.jpg')
+    f2 = p.start('bar.jpg')
+    assert p.files == (f1, f2)
+    assert p.bytes_sent == 0
+    assert p.bytes_total == 0
+    p.update(f1, 10, 100)
+    p.update(f2, 20, 200)
+    assert p.bytes_sent == 30
+    assert p.bytes_total == 300
+    p.update(f1, 100, 100)
+    p.finish(f1)
+    assert p.files == (f2,)
+    assert p.files_done == 1
+    assert p.bytes_sent == 120
+    assert p.bytes_total == 300
+    p.finish(f1)
+    assert p.files_done == 1
+
+
+def test_Progress_rate_and_eta(mocker):
+    monotonic_mock = mocker.patch('time.monotonic', return_value=100)
+    p = _progress.Progress()
+    assert p.elapsed == 0
+    assert p.rate == 0
+    assert p.eta is None
+    f = p.start('foo.jpg')
+    p.update(f, 0, 1000)
+    assert p.rate == 0
+    assert p.eta is None
+    monotonic_mock.return_value = 102
+    p.update(f, 200, 1000)
+    assert p.elapsed == 2
+    assert p.rate == 100
+    assert p.eta == 8
+
+
+def test_Progress_limits_callback_rate(mocker):
+    monotonic_mock = mocker.patch('time.monotonic', return_value=100)
+    callback = Mock()
+    p = _progress.Progress(callback=callback, interval=1)
+    f = p.start('foo.jpg')
+    for now in (100.0, 100.5, 100.9, 101.0, 101.5, 102.1):
+        monotonic_mock.return_value = now
+        p.update(f, 1, 10)
+    assert callback.call_args_list == [call(p), call(p), call(p)]
+    p.finish(f)
+    assert callback.call_args_list == [call(p), call(p), call(p), call(p)]
+
+
+def test_Progress_repr():
+    p = _progress.Progress()
+    f = p.start('foo.jpg')
+    p.update(f, 1, 2)
+    assert repr(p) == 'Progress(files_done=0, bytes_sent=1, bytes_total=2)'
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+from conftest import AsyncMock
+
+from pyimgbox import RateLimiter, _ratelimit
+
+
+@pytest.mark.parametrize(
+    argnames='kwargs, exp_error',
+    argvalues=(
+        ({'requests_per_second': 0}, 'Invalid requests_per_second: 0'),
+        ({'bytes_per_second': -1}, 'Invalid bytes_per_second: -1'),
+        ({'burst': 0}, 'Invalid burst: 0'),
+        ({'increase': 0}, 'Invalid increase: 0'),
+        ({'decrease': 1}, 'Invalid decrease: 1'),
+        ({'min_fraction': 0}, 'Invalid min_fraction: 0'),
+    ),
+)
+def test_RateLimiter_gets_invalid_argument(kwargs, exp_error):
+    with pytest.raises(ValueError, match=rf'^{exp_error}$'):
+        RateLimiter(**kwargs)
+
+
+def test_RateLimiter_without_limits():
+    limiter = RateLimiter()
+    assert limiter.requests_per_second is None
+    assert limiter.bytes_per_second is None
+    asyncio.run(limiter.request())
+    asyncio.run(limiter.send(10**9))
+
+
+@pytest.mark.asyncio
+async def test_TokenBucket_allows_burst_and_then_waits(mocker):
+    now = [100.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    sleep_mock = mocker.patch('asyncio.sleep', AsyncMock(side_effect=lambda s: now.__setitem__(0, now[0] + s)))
+    bucket = _ratelimit._TokenBucket(rate=10, capacity=20)
+    for _ in range(20):
+        await bucket.acquire(1)
+    assert sleep_mock.call_args_list == []
+    await bucket.acquire(1)
+    assert sleep_mock.call_args_list == [mocker.call(pytest.approx(0.1))]
+    await bucket.acquire(5)
+    assert sleep_mock.call_args_list[-1] == mocker.call(pytest.approx(0.5))
+    now[0] += 100
+    await bucket.acquire(20)
+    assert len(sleep_mock.call_args_list) == 2
+
+
+@pytest.mark.asyncio
+async def test_TokenBucket_accepts_amounts_larger_than_capacity(mocker):
+    now = [0.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    sleep_mock = mocker.patch('asyncio.sleep', AsyncMock(side_effect=lambda s: now.__setitem__(0, now[0] + s)))
+    bucket = _ratelimit._TokenBucket(rate=100, capacity=100)
+    await bucket.acquire(300)
+    assert sleep_mock.call_args_list == [mocker.call(pytest.approx(2.0))]
+
+
+@pytest.mark.asyncio
+async def test_RateLimiter_limits_requests_per_second():
+    limiter = RateLimiter(requests_per_second=50, burst=0.1)
+    start = time.monotonic()
+    await asyncio.gather(*(limiter.request() for _ in range(15)))
+    # 5 requests are sent immediately, 10 more take 0.2 seconds
+    assert 0.18 <= time.monotonic() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_RateLimiter_limits_bytes_per_second():
+    limiter = RateLimiter(bytes_per_second=1000, burst=0.1)
+    start = time.monotonic()
+    for _ in range(4):
+        await limiter.send(100)
+    assert 0.28 <= time.monotonic() - start < 0.6
+
+
+def test_RateLimiter_report_does_nothing_if_not_adaptive():
+    limiter = RateLimiter(requests_per_second=10, adaptive=False)
+    limiter.report(1.0, ConnectionError('foo'))
+    assert limiter.fraction == 1.0
+    assert limiter.requests_per_second == 10
+
+
+def test_RateLimiter_report_decreases_rates_multiplicatively(mocker):
+    now = [0.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    limiter = RateLimiter(requests_per_second=10, bytes_per_second=1000, adaptive=True,
+                          decrease=0.5, min_fraction=0.2)
+    error = ConnectionError('Service unavailable')
+    error.retryable = True
+    limiter.report(1.0, error)
+    assert limiter.fraction == 0.5
+    assert limiter.requests_per_second == 5
+    assert limiter.bytes_per_second == 500
+    # Simultaneous failures count once
+    limiter.report(1.0, error)
+    assert limiter.fraction == 0.5
+    now[0] += limiter.DECREASE_INTERVAL
+    limiter.report(1.0, error)
+    assert limiter.fraction == 0.25
+    now[0] += limiter.DECREASE_INTERVAL
+    limiter.report(1.0, error)
+    assert limiter.fraction == 0.2
+    assert limiter.requests_per_second == 2
+
+
+def test_RateLimiter_report_ignores_errors_that_are_not_retryable():
+    limiter = RateLimiter(requests_per_second=10, adaptive=True)
+    limiter.report(1.0, ConnectionError('File too large'))
+    assert limiter.fraction == 1.0
+
+
+def test_RateLimiter_report_decreases_rates_on_high_latency():
+    limiter = RateLimiter(requests_per_second=10, adaptive=True, max_latency=2)
+    limiter.report(2.0)
+    assert limiter.fraction == 1.0
+    limiter.report(2.1)
+    assert limiter.fraction == 0.5
+
+
+def test_RateLimiter_report_increases_rates_additively(mocker):
+    limiter = RateLimiter(requests_per_second=10, adaptive=True, increase=0.1, decrease=0.5)
+    error = ConnectionError('Timeout')
+    error.retryable = True
+    limiter.report(1.0, error)
+    assert limiter.fraction == 0.5
+    limiter.report(1.0)
+    limiter.report(1.0)
+    assert limiter.fraction == pytest.approx(0.7)
+    assert limiter.requests_per_second == pytest.approx(7)
+    for _ in range(10):
+        limiter.report(1.0)
+    assert limiter.fraction == 1.0
+    assert limiter.requests_per_second == 10
+
+
+def test_RateLimiter_repr():
+    limiter = RateLimiter(requests_per_second=1, bytes_per_second=2, adaptive=True)
+    assert repr(limiter) == 'RateLimiter(requests_per_second=1, bytes_per_second=2, adaptive=True)'
@@ -0,0 +1,34 @@
+import pytest
+
+from pyimgbox import _schedule
+
+
+@pytest.fixture
+def filepaths(tmp_path):
+    filepaths = []
+    for name, size in (('a', 300), ('b', 100), ('c', 500), ('d', 100), ('e', 0), ('f', 200)):
+        filepath = tmp_path / name
+        filepath.write_bytes(b'x' * size)
+        filepaths.append(str(filepath))
+    filepaths.append(str(tmp_path / 'nonexisting'))
+    return filepaths
+
+
+@pytest.mark.parametrize(
+    argnames='policy, exp_indexes',
+    argvalues=(
+        ('largest-first', [2, 0, 5, 1, 3, 4, 6]),
+        ('smallest-first', [4, 6, 1, 3, 5, 0, 2]),
+        ('balanced', [2, 6, 0, 4, 5, 3, 1]),
+    ),
+)
+def test_schedule(policy, exp_indexes, filepaths):
+    assert _schedule.schedule(filepaths, policy) == exp_indexes
+
+@pytest.mark.parametrize('policy', _schedule.POLICIES)
+def test_schedule_gets_no_filepaths(policy):
+    assert _schedule.schedule([], policy) == []
+
+def test_schedule_gets_invalid_policy():
+    with pytest.raises(ValueError, match=r"^Invalid schedule: 'random'$"):
+        _schedule.schedule(['foo'], 'random')
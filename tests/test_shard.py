@@ -0,0 +1,226 @@
+import asyncio
+import concurrent.futures
+import io
+import os
+import pickle
+import threading
+from unittest.mock import Mock
+
+import pytest
+from conftest import AsyncMock
+
+from pyimgbox import (RetryPolicy, Session, ShardedGallery, Submission,
+                      Timeouts, _const, _shard)
+
+
+@pytest.fixture
+def executor():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def mock_create(gallery):
+    async def create():
+        gallery._gallery_token = {'token_id': 'tid', 'token_secret': 'ts',
+                                  'gallery_id': 'gid', 'gallery_secret': 'gs'}
+        gallery._client.headers[_const.CSRF_TOKEN_HEADER] = 'csrf token'
+        gallery._client.cookies = [{'name': 'c', 'value': 'v', 'domain': 'imgbox.com', 'path': '/'}]
+    gallery.create = create
+
+
+def test_ShardedGallery_validates_properties(executor):
+    g = ShardedGallery(executor=executor)
+    assert g.processes == (os.cpu_count() or 1)
+    for name in ('processes', 'chunk_size', 'concurrency'):
+        with pytest.raises(ValueError, match=rf'^Invalid {name}: 0$'):
+            setattr(g, name, 0)
+
+
+def test_ShardedGallery_passes_gallery_arguments(executor):
+    g = ShardedGallery(title='Foo', thumb_width=300, square_thumbs=True, adult=True,
+                       comments_enabled=True, concurrency=3, executor=executor)
+    assert g.gallery.title == 'Foo'
+    assert g.gallery.thumb_width == 300
+    assert g.gallery.square_thumbs is True
+    assert g.gallery.adult is True
+    assert g.gallery.comments_enabled is True
+    assert g.concurrency == g.gallery.concurrency == 3
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_private_executor_is_shut_down():
+    g = ShardedGallery(processes=1)
+    executor = g._executor
+    assert isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+    await g.close()
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_shared_executor_is_not_shut_down(executor):
+    g = ShardedGallery(executor=executor)
+    await g.close()
+    assert executor.submit(int, '1').result() == 1
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_chunk():
+    chunks = [c async for c in _shard._chunk(iter(range(7)), 3)]
+    assert chunks == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_add_yields_submissions_in_input_order(executor, mocker):
+    threads = set()
+
+    async def upload_file(self, filepath):
+        threads.add(threading.current_thread())
+        await asyncio.sleep(0.001 * (hash(filepath) % 5))
+        return Submission(filepath=filepath, error=f'{self._gallery_token["token_id"]}')
+
+    mocker.patch('pyimgbox._gallery.Gallery._upload_file', upload_file)
+    async with ShardedGallery(processes=2, chunk_size=3, concurrency=2, executor=executor) as g:
+        mock_create(g.gallery)
+        filepaths = [f'{i}.jpg' for i in range(20)]
+        submissions = [s async for s in g.add(filepaths)]
+    assert [s['filepath'] for s in submissions] == filepaths
+    assert all(s['error'] == 'tid' for s in submissions)
+    assert threading.current_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_add_creates_gallery_once(executor, mocker):
+    mocker.patch('pyimgbox._gallery.Gallery._upload_file',
+                 AsyncMock(side_effect=lambda fp: Submission(filepath=fp, error='x')))
+    async with ShardedGallery(executor=executor) as g:
+        mock_create(g.gallery)
+        create_spy = mocker.spy(g.gallery, 'create')
+        assert [s['filepath'] async for s in g.add(['a', 'b'])] == ['a', 'b']
+        assert [s['filepath'] async for s in g.add(['c'])] == ['c']
+        assert create_spy.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_add_raises_exception_from_worker(executor, mocker):
+    mocker.patch('pyimgbox._gallery.Gallery._upload_file',
+                 AsyncMock(side_effect=RuntimeError('Unexpected response')))
+    async with ShardedGallery(executor=executor) as g:
+        mock_create(g.gallery)
+        with pytest.raises(RuntimeError, match=r'^Unexpected response$'):
+            [s async for s in g.add(['a', 'b'])]
+
+
+def test_ShardedGallery_worker_reattaches_to_gallery(mocker):
+    config = {
+        'id': 'test',
+        'gallery': {'thumb_width': 300, 'square_thumbs': False, 'adult': True,
+                    'comments_enabled': False, 'concurrency': 2},
+        'gallery_token': {'token_id': 'tid', 'token_secret': 'ts',
+                          'gallery_id': 'gid', 'gallery_secret': 'gs'},
+        'csrf_token': 'csrf token',
+        'cookies': [{'name': 'c', 'value': 'v', 'domain': 'imgbox.com', 'path': '/'}],
+        'session': {},
+    }
+    worker = _shard._Worker(config)
+    gallery = worker._gallery
+    get_mock = mocker.patch.object(gallery._client, 'get', AsyncMock())
+    post_mock = mocker.patch.object(gallery._client, 'post', AsyncMock(
+        return_value={'files': [{'original_url': 'i', 'thumbnail_url': 't', 'url': 'w'}]},
+    ))
+    mocker.patch.object(gallery, '_prepare', lambda fp: (fp, (fp, io.BytesIO(b'GIF89a\x01\x00\x01\x00')), None))
+    submissions = worker.upload(['foo.jpg'])
+    assert [s['image_url'] for s in submissions] == ['i']
+    assert get_mock.call_args_list == []
+    assert post_mock.call_args[1]['data']['token_id'] == 'tid'
+    assert gallery._client.headers[_const.CSRF_TOKEN_HEADER] == 'csrf token'
+    assert gallery._client.cookies == config['cookies']
+    assert gallery.concurrency == 2
+    assert gallery.thumb_width == 300
+    assert gallery.adult is True
+    worker.close()
+    assert gallery._client.session.closed
+    assert worker._loop.is_closed()
+
+
+def test_ShardedGallery_passes_session_settings_to_workers(executor):
+    session = Session(
+        max_connections=3,
+        max_keepalive_connections=2,
+        keepalive_expiry=1.5,
+        retry=RetryPolicy(max_attempts=5, backoff=2, max_delay=10, jitter=0.1, callback=print),
+        timeouts=Timeouts(connect=1, request=2, upload=3, min_throughput=4, stall_interval=5),
+    )
+
+    async def get_worker_config():
+        async with session:
+            async with ShardedGallery(session=session, executor=executor) as g:
+                mock_create(g.gallery)
+                await g.create()
+                return g._get_worker_config()
+
+    config = pickle.loads(pickle.dumps(asyncio.run(get_worker_config())))
+    worker = _shard._Worker(config)
+    worker_session = worker._gallery._client.session
+    try:
+        assert worker_session is not session
+        assert worker_session._options == {
+            'max_connections': 3,
+            'max_keepalive_connections': 2,
+            'keepalive_expiry': 1.5,
+            'http2': False,
+        }
+        retry = worker_session.retry
+        assert (retry.max_attempts, retry.backoff, retry.max_delay, retry.jitter, retry.callback) == (5, 2, 10, 0.1, None)
+        assert repr(worker_session.timeouts) == repr(session.timeouts)
+    finally:
+        worker.close()
+
+
+def test_ShardedGallery_upload_chunk_reuses_worker_per_thread(mocker):
+    mocker.patch('pyimgbox._shard._workers', threading.local())
+    Worker_mock = mocker.patch('pyimgbox._shard._Worker', side_effect=lambda config: Mock(id=config['id']))
+    _shard._upload_chunk({'id': 'a'}, ['1'])
+    worker_a = _shard._workers.worker
+    _shard._upload_chunk({'id': 'a'}, ['2'])
+    assert worker_a.close.call_args_list == []
+    _shard._upload_chunk({'id': 'b'}, ['3'])
+    worker_b = _shard._workers.worker
+    assert Worker_mock.call_args_list == [mocker.call({'id': 'a'}), mocker.call({'id': 'b'})]
+    assert worker_a.upload.call_args_list == [mocker.call(['1']), mocker.call(['2'])]
+    assert worker_b.upload.call_args_list == [mocker.call(['3'])]
+    assert worker_a.close.call_args_list == [mocker.call()]
+    assert worker_b.close.call_args_list == []
+
+
+def test_ShardedGallery_close_worker(mocker):
+    mocker.patch('pyimgbox._shard._workers', threading.local())
+    _shard._close_worker('a')
+    worker = _shard._workers.worker = Mock(id='a')
+    _shard._close_worker('b')
+    assert worker.close.call_args_list == []
+    assert _shard._workers.worker is worker
+    _shard._close_worker('a')
+    assert worker.close.call_args_list == [mocker.call()]
+    assert _shard._workers.worker is None
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_close_closes_workers_in_shared_executor(executor, mocker):
+    close_worker_mock = mocker.patch('pyimgbox._shard._close_worker')
+    mocker.patch('pyimgbox._gallery.Gallery._upload_file',
+                 AsyncMock(side_effect=lambda fp: Submission(filepath=fp, error='x')))
+    async with ShardedGallery(processes=2, executor=executor) as g:
+        mock_create(g.gallery)
+        [s async for s in g.add(['a', 'b'])]
+    assert close_worker_mock.call_args_list == [mocker.call(g._id)] * 2
+    assert not executor._shutdown
+
+
+@pytest.mark.asyncio
+async def test_ShardedGallery_close_does_not_close_unused_workers(executor, mocker):
+    close_worker_mock = mocker.patch('pyimgbox._shard._close_worker')
+    async with ShardedGallery(executor=executor):
+        pass
+    assert close_worker_mock.call_args_list == []
@@ -0,0 +1,114 @@
+import concurrent.futures
+import io
+import os
+
+import pytest
+
+from pyimgbox import Shrinker, _shrink
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def executor():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def make_image(filepath, format, size=(400, 300), **options):
+    # Noise doesn't compress well
+    image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    if format == 'GIF':
+        image = image.convert('P')
+    image.save(filepath, format=format, **options)
+    return os.path.getsize(filepath)
+
+
+def test_Shrinker_validates_properties(executor):
+    s = Shrinker(executor=executor)
+    for name, value in (('max_size', 0), ('max_size', 1.5)):
+        with pytest.raises(ValueError, match=rf'^Invalid {name}: {value}$'):
+            setattr(s, name, value)
+    for value in (0, 96, '80'):
+        with pytest.raises(ValueError, match=rf'^Invalid quality: {value!r}$'):
+            s.qualities = (90, value)
+
+def test_Shrinker_requires_Pillow(mocker):
+    mocker.patch('importlib.util.find_spec', return_value=None)
+    with pytest.raises(ImportError, match=r'^Pillow is required to shrink images: pip install pyimgbox\[shrink\]$'):
+        Shrinker()
+
+def test_Shrinker_private_executor_is_shut_down():
+    s = Shrinker(processes=1)
+    executor = s._executor
+    assert isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+    s.close()
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+def test_Shrinker_shared_executor_is_not_shut_down(executor):
+    s = Shrinker(executor=executor)
+    s.close()
+    assert executor.submit(int, '1').result() == 1
+
+@pytest.mark.asyncio
+async def test_Shrinker_shrink_runs_in_executor(tmp_path, executor, mocker):
+    filepath = str(tmp_path / 'foo.jpg')
+    size = make_image(filepath, 'JPEG', quality=95)
+    s = Shrinker(max_size=size // 2, qualities=(50,), executor=executor)
+    submit_spy = mocker.spy(executor, 'submit')
+    data = await s.shrink(filepath)
+    assert len(data) <= size // 2
+    assert submit_spy.call_args_list == [mocker.call(_shrink.shrink, filepath, size // 2, (50,))]
+
+
+def test_shrink_recompresses_jpeg_without_downscaling(tmp_path):
+    filepath = str(tmp_path / 'foo.jpg')
+    size = make_image(filepath, 'JPEG', quality=95)
+    data = _shrink.shrink(filepath, max_size=size * 2 // 3, qualities=(90, 60, 30))
+    assert len(data) <= size * 2 // 3
+    with Image.open(io.BytesIO(data)) as image:
+        assert (image.format, image.size) == ('JPEG', (400, 300))
+
+@pytest.mark.parametrize('format', ('JPEG', 'PNG', 'GIF'))
+def test_shrink_downscales_image(format, tmp_path):
+    filepath = str(tmp_path / 'foo')
+    size = make_image(filepath, format)
+    data = _shrink.shrink(filepath, max_size=size // 4, qualities=(90,))
+    assert len(data) <= size // 4
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == format
+        assert image.width < 400 and image.height < 300
+
+def test_shrink_keeps_exif(tmp_path):
+    filepath = str(tmp_path / 'foo.jpg')
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation
+    size = make_image(filepath, 'JPEG', quality=95, exif=exif.tobytes())
+    data = _shrink.shrink(filepath, max_size=size // 4)
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.getexif()[0x0112] == 6
+
+def test_shrink_refuses_animated_image(tmp_path):
+    filepath = str(tmp_path / 'foo.gif')
+    frames = [Image.new('RGB', (10, 10), color) for color in ('red', 'blue')]
+    frames[0].save(filepath, save_all=True, append_images=frames[1:])
+    with pytest.raises(ValueError, match=r"^Animated images can't be shrunk$"):
+        _shrink.shrink(filepath, max_size=1)
+
+def test_shrink_refuses_unsupported_format(tmp_path):
+    filepath = str(tmp_path / 'foo.bmp')
+    make_image(filepath, 'BMP')
+    with pytest.raises(ValueError, match=r'^Unsupported file type: BMP$'):
+        _shrink.shrink(filepath, max_size=1)
+
+def test_shrink_gives_up(tmp_path):
+    filepath = str(tmp_path / 'foo.png')
+    make_image(filepath, 'PNG')
+    with pytest.raises(ValueError, match=r'^Unable to shrink image to 10 bytes$'):
+        _shrink.shrink(filepath, max_size=10)
+
+def test_shrink_fails_to_read_file(tmp_path):
+    with pytest.raises(OSError):
+        _shrink.shrink(str(tmp_path / 'nonexisting.jpg'), max_size=1)
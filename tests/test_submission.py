@@ -1,10 +1,13 @@
+import json
+import pickle
+
 import pytest
 
 from pyimgbox import Submission
 
 
 def test_Submission_gets_unknown_key():
-    with pytest.raises(AssertionError, match=r"^Unknown key: 'x'$"):
+    with pytest.raises(TypeError, match=r"unexpected keyword argument 'x'$"):
         Submission(x='y')
 
 
@@ -37,7 +40,8 @@ def test_Submission_no_required_arguments_on_error():
           'thumbnail_url': None,
           'web_url': None,
           'gallery_url': None,
-          'edit_url': None}
+          'edit_url': None,
+          'cached': False}
 
 
 def test_Submission_gets_valid_success_arguments():
@@ -58,6 +62,7 @@ def test_Submission_gets_valid_success_arguments():
         'web_url': 'https://foo.bar/asdf',
         'gallery_url': 'https://foo.bar/fdsa',
         'edit_url': 'https://foo.bar/fdsa/edit',
+        'cached': False,
     }
 
 
@@ -103,6 +108,52 @@ def test_Submission_repr():
         "thumbnail_url='https://foo.bar/asdf_t.jpg', "
         "web_url='https://foo.bar/asdf', "
         "gallery_url='https://foo.bar/fdsa', "
-        "edit_url='https://foo.bar/fdsa/edit'"
+        "edit_url='https://foo.bar/fdsa/edit', "
+        "cached=False"
         ")"
     )
+
+
+def test_Submission_cached():
+    s = Submission(
+        filepath='path/to/Foo.jpg',
+        image_url='https://foo.bar/asdf.jpg',
+        thumbnail_url='https://foo.bar/asdf_t.jpg',
+        web_url='https://foo.bar/asdf',
+        gallery_url='https://foo.bar/fdsa',
+        edit_url='https://foo.bar/fdsa/edit',
+        cached=True,
+    )
+    assert s.cached is True
+    assert s.success is True
+
+
+def test_Submission_is_dict(make_submission):
+    s = make_submission()
+    assert isinstance(s, dict)
+    assert s['filename'] == 'Foo.jpg'
+    assert list(s) == ['success', 'error', 'filepath', 'filename', 'image_url', 'thumbnail_url',
+                       'web_url', 'gallery_url', 'edit_url', 'cached']
+    assert json.loads(json.dumps(s)) == dict(s)
+    s['error'] = 'foo'
+    assert s.error == 'foo'
+    assert not hasattr(s, '__dict__')
+
+
+def test_Submission_from_dict(make_submission):
+    s = make_submission()
+    assert Submission(**dict(s)) == s
+
+
+def test_Submission_shares_gallery_urls(make_submission):
+    s1 = make_submission(gallery_url=''.join(['https://foo.bar/', 'fdsa']))
+    s2 = make_submission(gallery_url=''.join(['https://foo.bar/', 'fdsa']))
+    assert s1.gallery_url is s2.gallery_url
+
+
+def test_Submission_pickle(make_submission):
+    s = make_submission()
+    s_ = pickle.loads(pickle.dumps(s))
+    assert s_ == s
+    assert s_.gallery_url is s.gallery_url
+    assert s_.edit_url is s.edit_url
@@ -0,0 +1,171 @@
+import asyncio
+import io
+import threading
+from unittest.mock import Mock
+
+import pytest
+from conftest import IMAGE_HEADER
+
+from pyimgbox import DedupCache, Gallery, Submission, SyncGallery
+
+
+def test_SyncGallery_passes_arguments_to_Gallery():
+    with SyncGallery(title='Foo', thumb_width=300, concurrency=3) as g:
+        assert isinstance(g.gallery, Gallery)
+        assert g.title == 'Foo'
+        assert g.thumb_width == 300
+        assert g.concurrency == 3
+
+
+def test_SyncGallery_runs_event_loop_in_one_background_thread(mocker):
+    threads = []
+
+    async def upload(self, filepath):
+        threads.append(threading.current_thread())
+        return f'uploaded {filepath}'
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    with SyncGallery() as g:
+        assert g.upload('foo.jpg') == 'uploaded foo.jpg'
+        assert g.upload('bar.jpg') == 'uploaded bar.jpg'
+        assert len(threads) == 2
+        assert threads[0] is threads[1] is g._thread
+        assert threads[0] is not threading.current_thread()
+        assert g._thread.is_alive()
+    assert not g._thread.is_alive()
+    assert g._loop.is_closed()
+
+
+def test_SyncGallery_reuses_client(mocker):
+    clients = []
+
+    async def upload(self, filepath):
+        clients.append(self._client)
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    with SyncGallery() as g:
+        g.upload('foo.jpg')
+        g.upload('bar.jpg')
+    assert clients[0] is clients[1]
+    assert clients[0].session.closed is True
+
+
+def test_SyncGallery_create(mocker):
+    create_mock = mocker.patch('pyimgbox._gallery.Gallery.create', Mock(return_value=asyncio.sleep(0)))
+    with SyncGallery() as g:
+        assert g.create() is None
+    create_mock.assert_called_once_with()
+
+
+def test_SyncGallery_add_yields_submissions(mocker):
+    async def add(self, filepaths, **kwargs):
+        for filepath in filepaths:
+            await asyncio.sleep(0)
+            yield Submission(filepath=filepath, success=False, error=repr(kwargs))
+
+    mocker.patch('pyimgbox._gallery.Gallery.add', add)
+    with SyncGallery() as g:
+        submissions = g.add(['a.jpg', 'b.jpg', 'c.jpg'], concurrency=2)
+        assert [s['filepath'] for s in submissions] == ['a.jpg', 'b.jpg', 'c.jpg']
+        assert all(s['error'] == "{'concurrency': 2}" for s in submissions)
+
+
+def test_SyncGallery_add_closes_async_generator_if_iteration_stops_early(mocker):
+    closed = []
+
+    async def add(self, filepaths, **kwargs):
+        try:
+            for filepath in filepaths:
+                yield filepath
+        finally:
+            closed.append(True)
+
+    mocker.patch('pyimgbox._gallery.Gallery.add', add)
+    with SyncGallery() as g:
+        submissions = g.add(['a.jpg', 'b.jpg', 'c.jpg'])
+        assert next(submissions) == 'a.jpg'
+        submissions.close()
+        assert closed == [True]
+
+
+def test_SyncGallery_drain_and_cancel(mocker):
+    async def drain(self, timeout=None):
+        return f'drained {timeout}'
+
+    async def cancel(self):
+        return 'cancelled'
+
+    mocker.patch('pyimgbox._gallery.Gallery.drain', drain)
+    mocker.patch('pyimgbox._gallery.Gallery.cancel', cancel)
+    with SyncGallery() as g:
+        assert g.drain() == 'drained None'
+        assert g.drain(timeout=3) == 'drained 3'
+        assert g.cancel() == 'cancelled'
+
+
+def test_SyncGallery_drain_from_other_thread_stops_add(mocker):
+    started = threading.Event()
+
+    async def upload_file(self, filepath):
+        started.set()
+        await asyncio.sleep(0.2)
+        return Submission(filepath=filepath, error='mock error')
+
+    mocker.patch('pyimgbox._gallery.Gallery._upload_file', upload_file)
+    with SyncGallery() as g:
+        thread = threading.Thread(target=lambda: started.wait() and g.drain())
+        thread.start()
+        submissions = list(g.add(f'{i}.jpg' for i in range(100)))
+        thread.join()
+    assert [s['filepath'] for s in submissions] == ['0.jpg']
+
+
+def test_SyncGallery_with_DedupCache(mocker):
+    async def upload_images(self, files):
+        return [Submission(filepath=filepath, image_url=f'{filepath}.i', thumbnail_url=f'{filepath}.t',
+                           web_url=f'{filepath}.w', gallery_url='g', edit_url='g.e')
+                for filepath, _ in files]
+
+    mocker.patch('pyimgbox._gallery.Gallery._upload_images', upload_images)
+    mocker.patch('pyimgbox._gallery.Gallery._prepare',
+                 lambda self, fp: (fp, ('foo.png', io.BytesIO(IMAGE_HEADER)), None))
+    dedup = DedupCache()
+    try:
+        with SyncGallery(dedup=dedup) as g:
+            assert g.upload('a.png')['cached'] is False
+            assert g.upload('b.png')['cached'] is True
+    finally:
+        dedup.close()
+
+
+def test_SyncGallery_stops_thread_if_Gallery_raises(mocker):
+    threads = []
+    Thread = threading.Thread
+    mocker.patch('threading.Thread', side_effect=lambda *args, **kwargs: threads.append(Thread(*args, **kwargs)) or threads[-1])
+    with pytest.raises(ValueError, match=r'^Invalid concurrency: 0$'):
+        SyncGallery(concurrency=0)
+    assert [t.name.startswith('SyncGallery-') for t in threads] == [True]
+    assert not threads[0].is_alive()
+
+
+def test_SyncGallery_raises_exceptions_from_Gallery(mocker):
+    async def upload(self, filepath):
+        raise RuntimeError('Unexpected response')
+
+    mocker.patch('pyimgbox._gallery.Gallery.upload', upload)
+    with SyncGallery() as g:
+        with pytest.raises(RuntimeError, match=r'^Unexpected response$'):
+            g.upload('foo.jpg')
+
+
+def test_SyncGallery_close_is_idempotent():
+    g = SyncGallery()
+    g.close()
+    g.close()
+    with pytest.raises(RuntimeError, match=r'^SyncGallery is closed$'):
+        g.upload('foo.jpg')
+
+
+def test_SyncGallery_repr():
+    with SyncGallery(title='Foo') as g:
+        assert repr(g) == repr(g.gallery).replace('Gallery', 'SyncGallery', 1)
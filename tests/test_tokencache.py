@@ -0,0 +1,73 @@
+import json
+import os
+
+from pyimgbox import _tokencache
+
+
+def test_TokenCache_in_memory(mocker):
+    time_mock = mocker.patch('time.time', return_value=1000)
+    cache = _tokencache.TokenCache(ttl=60)
+    assert cache.filepath is None
+    assert cache.ttl == 60
+    assert cache.get() is None
+    cache.set('THE-TOKEN', [{'name': 'a', 'value': 'b', 'domain': 'c', 'path': '/'}])
+    assert cache.get() == {
+        'csrf_token': 'THE-TOKEN',
+        'cookies': [{'name': 'a', 'value': 'b', 'domain': 'c', 'path': '/'}],
+    }
+    time_mock.return_value = 1059
+    assert cache.get()['csrf_token'] == 'THE-TOKEN'
+    time_mock.return_value = 1060
+    assert cache.get() is None
+    time_mock.return_value = 1000
+    assert cache.get() is None
+
+
+def test_TokenCache_invalidate():
+    cache = _tokencache.TokenCache()
+    cache.set('THE-TOKEN')
+    assert cache.get() == {'csrf_token': 'THE-TOKEN', 'cookies': []}
+    cache.invalidate()
+    assert cache.get() is None
+
+
+def test_TokenCache_on_disk(tmp_path, mocker):
+    mocker.patch('time.time', return_value=1000)
+    filepath = str(tmp_path / 'tokens.json')
+    cache = _tokencache.TokenCache(filepath=filepath)
+    cache.set('THE-TOKEN', [{'name': 'a', 'value': 'b', 'domain': 'c', 'path': '/'}])
+    assert os.stat(filepath).st_mode & 0o777 == 0o600
+    with open(filepath) as f:
+        assert json.load(f) == {
+            'csrf_token': 'THE-TOKEN',
+            'cookies': [{'name': 'a', 'value': 'b', 'domain': 'c', 'path': '/'}],
+            'timestamp': 1000,
+        }
+    assert os.listdir(tmp_path) == ['tokens.json']
+
+    cache2 = _tokencache.TokenCache(filepath=filepath)
+    assert cache2.get() == cache.get()
+
+    cache2.invalidate()
+    assert not os.path.exists(filepath)
+    assert _tokencache.TokenCache(filepath=filepath).get() is None
+    cache2.invalidate()
+
+
+def test_TokenCache_ignores_invalid_file(tmp_path):
+    filepath = tmp_path / 'tokens.json'
+    for content in ('not json', '[1, 2, 3]', '{"csrf_token": "foo"}'):
+        filepath.write_text(content)
+        assert _tokencache.TokenCache(filepath=str(filepath)).get() is None
+
+
+def test_TokenCache_ignores_unwritable_file(tmp_path):
+    filepath = str(tmp_path / 'no' / 'such' / 'tokens.json')
+    cache = _tokencache.TokenCache(filepath=filepath)
+    cache.set('THE-TOKEN')
+    assert cache.get()['csrf_token'] == 'THE-TOKEN'
+
+
+def test_TokenCache_repr():
+    cache = _tokencache.TokenCache(filepath='foo.json', ttl=123)
+    assert repr(cache) == "TokenCache(filepath='foo.json', ttl=123)"
@@ -1,3 +1,5 @@
+import pytest
+
 from pyimgbox import _utils
 
 
@@ -9,3 +11,52 @@ def test_find_closest_number():
         assert _utils.find_closest_number(n, numbers) == 20
     for n in range(26, 50):
         assert _utils.find_closest_number(n, numbers) == 30
+
+
+def test_LazyModule():
+    import sys
+    sys.modules.pop('colorsys', None)
+    module = _utils.LazyModule('colorsys')
+    assert 'colorsys' not in sys.modules
+    assert repr(module) == "LazyModule('colorsys')"
+    assert module.rgb_to_hsv(0, 0, 0) == (0, 0, 0)
+    assert 'colorsys' in sys.modules
+
+
+def test_get_content_hash():
+    import io
+    fileobj = io.BytesIO(b'foo' * 100000)
+    fileobj.seek(123)
+    h = _utils.get_content_hash(fileobj, chunk_size=1000)
+    assert fileobj.tell() == 0
+    assert h == _utils.get_content_hash(io.BytesIO(b'foo' * 100000))
+    assert h != _utils.get_content_hash(io.BytesIO(b'foo' * 100001))
+    assert len(h) == 40
+
+
+@pytest.mark.asyncio
+async def test_aiterate():
+    async def agen():
+        for i in range(3):
+            yield i
+
+    assert [i async for i in _utils.aiterate([0, 1, 2])] == [0, 1, 2]
+    assert [i async for i in _utils.aiterate(agen())] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_aiterate_stops_before_requesting_next_item():
+    requested = []
+    stop = False
+
+    def gen():
+        for i in range(10):
+            requested.append(i)
+            yield i
+
+    items = []
+    async for item in _utils.aiterate(gen(), stop=lambda: stop):
+        items.append(item)
+        stop = item == 2
+    assert items == [0, 1, 2]
+    assert requested == [0, 1, 2]